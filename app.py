@@ -7,7 +7,10 @@ import logging
 import logging.handlers
 import signal
 import atexit
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory, make_response, abort
+import multiprocessing
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory, make_response, abort, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SessionBase
 import csv
 from io import StringIO
 
@@ -16,12 +19,32 @@ APP_ROOT = pathlib.Path(__file__).resolve().parent
 if str(APP_ROOT) not in sys.path:
     sys.path.insert(0, str(APP_ROOT))
 from flask_migrate import Migrate
-import pygame
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
-from models import db, Schedule, ScheduleList
-from auth import login_required, init_credentials, check_credentials, set_credentials
+from models import db, Schedule, ScheduleList, DateException, HolidayCalendar, Zone, Site, ExecutionRecord, AudioFile, AudioAnalysis
+import playback
+from zones import zone_manager, check_output as check_zone_output
+from daemon_rpc import DaemonClient
+from leader import LeaderElector, DEFAULT_LOCK_PATH
+from scheduler import SimpleScheduler, ThreadedSink
+from arbitration import Arbiter, request_for, POLICIES as CONFLICT_POLICIES
+import snapshot
+from prerender import Prerenderer
+import silence
+import waveform
+from pcm_cache import pcm_cache
+import recurrence
+import metrics
+import profiling
+from translations import TranslationCatalog
+from assets import AssetManifest, send_variants, IMMUTABLE
+from uploads_catalog import UploadsCatalog
+from audio_store import AudioStore
+from log_pipeline import start_pipeline, JsonLinesFormatter, NameFilter
+from occurrences import OccurrenceCache, MAX_RANGE_DAYS
+from date_exceptions import exception_calendar, ACTIONS as EXCEPTION_ACTIONS, MAX_RANGE_DAYS as MAX_EXCEPTION_DAYS
+from auth import login_required, init_credentials, check_credentials, set_credentials, AuthBusy, RateLimited
 
 # Configure logging
 def setup_logging():
@@ -44,6 +67,8 @@ def setup_logging():
     simple_formatter = logging.Formatter(
         '%(asctime)s - %(levelname)s - %(message)s'
     )
+    if os.environ.get('AUDIO_SCHEDULER_LOG_FORMAT', '').lower() == 'json':
+        detailed_formatter = simple_formatter = JsonLinesFormatter()
     
     # File handler for all logs (with rotation)
     file_handler = logging.handlers.RotatingFileHandler(
@@ -62,17 +87,16 @@ def setup_logging():
     )
     audio_handler.setLevel(logging.INFO)
     audio_handler.setFormatter(simple_formatter)
-    audio_handler.addFilter(lambda record: 'audio' in record.name.lower() or 'playlist' in record.getMessage().lower())
+    audio_handler.addFilter(NameFilter('audio_scheduler.audio', 'audio_scheduler.playlist'))
     
     # Console handler for important messages
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(simple_formatter)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
     
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(audio_handler)
-    logger.addHandler(console_handler)
+    # The handlers run on a listener thread; callers only enqueue the record
+    listener = start_pipeline(logger, [file_handler, audio_handler, console_handler])
+    atexit.register(listener.stop)
     
     # Create specific loggers
     audio_logger = logging.getLogger('audio_scheduler.audio')
@@ -81,215 +105,127 @@ def setup_logging():
     
     return logger, audio_logger, playlist_logger, auth_logger
 
-# Setup logging
-logger, audio_logger, playlist_logger, auth_logger = setup_logging()
+# Loggers; their handlers are attached by setup_logging() in create_app()
+logger = logging.getLogger('audio_scheduler')
+audio_logger = logging.getLogger('audio_scheduler.audio')
+playlist_logger = logging.getLogger('audio_scheduler.playlist')
+auth_logger = logging.getLogger('audio_scheduler.auth')
+
+def current_site_id():
+    """Site the web UI is working on (chosen with /sites/select), None for the default site"""
+    if not has_request_context() or session.get('site_id') is None:
+        return None
+    if db.session.get(Site, session['site_id']) is None:
+        session.pop('site_id')  # Deleted meanwhile
+        return None
+    return session['site_id']
+
+def execute_audio_schedule(schedule_id, claim=None):
+    """Play a single-file schedule (called by the scheduler's playback sink, with its claim on the default output)"""
+    try:
+        file_path = None
+        with app.app_context():
+            schedule = db.session.get(Schedule, schedule_id)
+            if not schedule:
+                audio_logger.error("Schedule not found: %s", schedule_id)
+                return
 
-# Simple Polling-Based Scheduler
-class SimpleScheduler:
-    """
-    Simple polling-based scheduler that checks database every second.
-    Much more reliable than APScheduler for this use case - no job lifecycle issues.
-    """
-    
-    def __init__(self, app_instance, db_instance, schedule_model):
-        self.app = app_instance
-        self.db = db_instance
-        self.Schedule = schedule_model
-        self.running = False
-        self.thread = None
-        self.executed_this_minute = set()  # Track what was executed in current minute
-        self.last_cleanup_minute = None
-        logger.info("SimpleScheduler initialized")
-    
-    def start(self):
-        """Start the scheduler polling thread"""
-        if self.running:
-            logger.warning("Scheduler already running")
-            return
-        
-        self.running = True
-        self.thread = threading.Thread(target=self._schedule_loop, daemon=True, name="SchedulerThread")
-        self.thread.start()
-        logger.info("✅ Simple scheduler started - polling every second")
-    
-    def stop(self):
-        """Stop the scheduler thread"""
-        if not self.running:
-            return
-        
-        logger.info("Stopping scheduler...")
-        self.running = False
-        if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=5)
-        logger.info("✅ Scheduler stopped")
-    
-    def _schedule_loop(self):
-        """Main scheduling loop - checks time every second"""
-        last_minute_check = None
-        consecutive_errors = 0
-        
-        while self.running:
-            try:
-                now = datetime.now()
-                current_minute_key = (now.year, now.month, now.day, now.hour, now.minute)
-                
-                # Clean up executed set when minute changes
-                if current_minute_key != self.last_cleanup_minute:
-                    self.executed_this_minute.clear()
-                    self.last_cleanup_minute = current_minute_key
-                    logger.debug(f"New minute: {now.strftime('%H:%M')} - cleared execution tracker")
-                
-                # Only check schedules once per minute
-                if current_minute_key != last_minute_check:
-                    last_minute_check = current_minute_key
-                    self._check_and_execute_schedules(now)
-                    consecutive_errors = 0  # Reset error counter on success
-                
-                # Sleep for 1 second before next check
-                time.sleep(1)
-                
-            except Exception as e:
-                consecutive_errors += 1
-                logger.error(f"Error in schedule loop (attempt {consecutive_errors}): {e}", exc_info=True)
-                if consecutive_errors > 5:
-                    logger.critical("Too many consecutive errors, scheduler loop stopping")
-                    break
-                time.sleep(5)  # Wait longer on error
-    
-    def _check_and_execute_schedules(self, now):
-        """Check which schedules should run at current time and execute them"""
-        with self.app.app_context():
-            try:
-                from models import ScheduleList
-                
-                # Get active schedule list
-                active_list = ScheduleList.query.filter_by(is_active=True).first()
-                if not active_list:
+            file_path = audio_store.resolve(schedule.filename, schedule.audio_hash)
+            if file_path is not None:
+                volume = schedule.volume if schedule.volume is not None else 1.0
+                start = silence.trim_for(schedule.audio_hash)[0]  # Skip leading silence so the bell sounds on time
+                zones = [zone for zone in schedule.output_zones() if zone.is_enabled]
+                if zones:
+                    for zone in zones:
+                        zone_manager.play(zone, os.path.abspath(file_path), volume, start, request_for(schedule))
+                        audio_logger.info("Routed audio %s to zone %s", schedule.filename, zone.name)
                     return
-                
-                # Get all non-muted schedules for active list
-                schedules = self.Schedule.query.filter_by(
-                    schedule_list_id=active_list.id,
-                    is_muted=False
-                ).all()
-                
-                current_time = now.strftime('%H:%M')
-                current_day = now.weekday()  # 0=Monday, 6=Sunday
-                
-                logger.debug(f"Checking {len(schedules)} schedules for {current_time}")
-                
-                for schedule in schedules:
-                    # Check if schedule time matches
-                    if schedule.time != current_time:
-                        continue
-                    
-                    # Check if schedule day matches
-                    day_active = [
-                        schedule.monday,    # 0
-                        schedule.tuesday,   # 1
-                        schedule.wednesday, # 2
-                        schedule.thursday,  # 3
-                        schedule.friday,    # 4
-                        schedule.saturday,  # 5
-                        schedule.sunday     # 6
-                    ]
-                    
-                    if not day_active[current_day]:
-                        continue
-                    
-                    # Check if already executed this minute
-                    if schedule.id in self.executed_this_minute:
-                        logger.debug(f"Skipping schedule {schedule.id} - already executed this minute")
-                        continue
-                    
-                    # Mark as executed for this minute IMMEDIATELY (before starting thread)
-                    self.executed_this_minute.add(schedule.id)
-                    logger.info(f"🔒 Marked schedule {schedule.id} as executed for minute {current_time}")
-                    
-                    # Execute schedule in separate thread
-                    if schedule.schedule_type == 'playlist':
-                        logger.info(f"▶️  Triggering playlist: {schedule.folder_path} at {current_time}")
-                        threading.Thread(
-                            target=self._execute_playlist,
-                            args=(schedule.id,),
-                            daemon=True,
-                            name=f"Playlist-{schedule.id}"
-                        ).start()
-                    else:
-                        logger.info(f"▶️  Triggering audio: {schedule.filename} at {current_time}")
-                        threading.Thread(
-                            target=self._execute_audio,
-                            args=(schedule.id,),
-                            daemon=True,
-                            name=f"Audio-{schedule.id}"
-                        ).start()
-                
-            except Exception as e:
-                logger.error(f"Error checking schedules: {e}", exc_info=True)
-    
-    def _execute_audio(self, schedule_id):
-        """Execute single audio file playback"""
-        try:
-            with app.app_context():
-                schedule = self.db.session.get(self.Schedule, schedule_id)
-                if not schedule:
-                    audio_logger.error(f"Schedule not found: {schedule_id}")
+                if schedule.output_zones():
+                    audio_logger.info("All zones of schedule %s are disabled, skipping", schedule_id)
                     return
-                
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], schedule.filename)
-                if os.path.exists(file_path):
-                    volume = schedule.volume if schedule.volume is not None else 1.0
-                    play_audio(file_path, volume)
-                else:
-                    audio_logger.error(f"Audio file not found: {file_path}")
-        except Exception as e:
-            audio_logger.error(f"Error playing audio {schedule_id}: {e}", exc_info=True)
-    
-    def _execute_playlist(self, schedule_id):
-        """Execute playlist playback"""
-        try:
-            play_playlist(schedule_id)
-        except Exception as e:
-            playlist_logger.error(f"Error playing playlist {schedule_id}: {e}", exc_info=True)
+            else:
+                audio_logger.error("Audio file not found: %s", schedule.filename)
+                return
+        # Outside the app context: with a claim this blocks until the sound has finished
+        play_audio(file_path, volume, start, claim)
+    except Exception as e:
+        audio_logger.error("Error playing audio %s: %s", schedule_id, e, exc_info=True)
 
-# Load translations
+# Translations; parsed and compiled into per-page JavaScript bundles on first use
 TRANSLATIONS_PATH = APP_ROOT.joinpath('static', 'translations.json')
-with open(TRANSLATIONS_PATH, 'r', encoding='utf-8') as f:
-    TRANSLATIONS = json.load(f)
+translation_catalog = TranslationCatalog(TRANSLATIONS_PATH)
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///schedules.db'
+app.config['UPLOAD_FOLDER'] = os.environ.get('AUDIO_SCHEDULER_UPLOAD_FOLDER', 'uploads')
+# Playlist folders live under APP_ROOT/playlists unless moved (e.g. by bench_http.py)
+PLAYLISTS_FOLDER = pathlib.Path(os.environ.get('AUDIO_SCHEDULER_PLAYLISTS_FOLDER') or APP_ROOT.joinpath('playlists'))
+# Sorted in-memory listing of uploads/, kept current by /upload and a folder watcher
+uploads_catalog = UploadsCatalog(app.config['UPLOAD_FOLDER'])
+# Uploads and playlist files are hard links into a deduplicated, content-addressed blob store
+audio_store = AudioStore(app.config['UPLOAD_FOLDER'], PLAYLISTS_FOLDER)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('AUDIO_SCHEDULER_DATABASE_URL', 'sqlite:///schedules.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.secret_key = 'your-secret-key-here'  # Required for session management
 
+# Fingerprinted, pre-compressed static files; templates link them with asset_url()
+asset_manifest = AssetManifest(app.static_folder)
+app.jinja_env.globals['asset_url'] = asset_manifest.url
+
+# Process role:
+#   'standalone' - web UI, scheduler and playback in one process (default)
+#   'web'        - HTTP only; scheduling and playback live in audio_daemon.py, so Gunicorn may use many workers
+#   'daemon'     - set by audio_daemon.py
+PROCESS_ROLE = os.environ.get('AUDIO_SCHEDULER_ROLE', 'standalone')
+
 # Configure Flask's logging to be less verbose
 if not app.debug:
     # Only log warnings and errors from werkzeug in production
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
-# Initialize pygame mixer - handle gracefully if no audio device available
-try:
-    # Force SDL to use PulseAudio (which works with PipeWire too)
-    # This ensures audio goes to the default audio device, not HDMI
-    os.environ['SDL_AUDIODRIVER'] = 'pulseaudio'
-    
-    pygame.mixer.init()
-    audio_available = True
-    audio_logger.info("Audio system initialized successfully")
-except Exception as e:
-    audio_available = False
-    audio_logger.warning(f"Audio system not available: {str(e)}")
+# Set by init_audio(); False until the mixer has been opened
+audio_available = False
+
+def init_audio():
+    """Initialize pygame mixer - handle gracefully if no audio device available"""
+    global audio_available
+    try:
+        if PROCESS_ROLE == 'web':
+            # The web tier never plays audio; the dummy driver still lets pygame decode files (e.g. durations)
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        else:
+            # Force SDL to use PulseAudio (which works with PipeWire too)
+            # This ensures audio goes to the default audio device, not HDMI
+            os.environ['SDL_AUDIODRIVER'] = 'pulseaudio'
+        
+        import pygame
+        pygame.mixer.init()
+        audio_available = True
+        audio_logger.info("Audio system initialized successfully")
+    except Exception as e:
+        audio_available = False
+        audio_logger.warning("Audio system not available: %s", e)
+    return audio_available
 
 # Initialize database
 db.init_app(app)
 migrate = Migrate(app, db)
 
+# Commit latency per route, measured around every session commit
+@event.listens_for(SessionBase, 'before_commit')
+def _start_commit_timer(session):
+    session.info['commit_started'] = time.perf_counter()
+
+@event.listens_for(SessionBase, 'after_commit')
+def _observe_commit_latency(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        endpoint = (request.endpoint or 'unknown') if has_request_context() else 'background'
+        metrics.DB_COMMIT_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
 # Initialize scheduler only once (not in reloader process)
 # Flask debug mode spawns two processes: main (worker) and reloader
 # WERKZEUG_RUN_MAIN is None in reloader process, 'true' in main worker
 # We only want the scheduler in the main worker process
-import os
 werkzeug_run_main = os.environ.get('WERKZEUG_RUN_MAIN')
 
 # Determine if we should initialize the scheduler
@@ -297,28 +233,57 @@ werkzeug_run_main = os.environ.get('WERKZEUG_RUN_MAIN')
 # In production (Gunicorn/systemd): WERKZEUG_RUN_MAIN is None, but we're NOT the __main__ module
 # The key insight: when running app.py directly, __name__ == '__main__' and Flask spawns reloader
 #                  when running via Gunicorn/wsgi, __name__ != '__main__' and no reloader
+# Never in the web role (the audio daemon owns the scheduler) or in spawned zone workers,
+# which re-import the entry script of their parent process
 should_init_scheduler = (
-    werkzeug_run_main == 'true' or  # Flask debug worker process
-    (werkzeug_run_main is None and __name__ != '__main__')  # Production via Gunicorn/wsgi
+    PROCESS_ROLE != 'web' and
+    multiprocessing.parent_process() is None and
+    (
+        werkzeug_run_main == 'true' or  # Flask debug worker process
+        (werkzeug_run_main is None and __name__ != '__main__')  # Production via Gunicorn/wsgi
+    )
 )
 
-if should_init_scheduler:
-    # Main worker process or production mode - initialize scheduler
-    from models import Schedule
-    scheduler = SimpleScheduler(app, db, Schedule)
-    scheduler.start()
-    logger.info("✅ Simple polling scheduler initialized and started")
-    
-    # Register cleanup handlers to ensure scheduler shuts down properly
-    def cleanup_scheduler():
-        """Clean up scheduler on application exit"""
-        if scheduler is not None:
-            logger.info("Cleaning up scheduler on exit...")
-            try:
-                scheduler.stop()
-                logger.info("Scheduler shutdown complete")
-            except Exception as e:
-                logger.error(f"Error during scheduler shutdown: {e}")
+# Candidates elect one leader through this lock file; only the leader runs the scheduler
+SCHEDULER_LOCK_PATH = DEFAULT_LOCK_PATH
+scheduler = None
+elector = None
+
+def init_scheduler(handoff=(), lock_fd=None):
+    """
+    Create the scheduler, contend for leadership and install the shutdown handlers.
+    handoff and lock_fd come from a stopped snapshot fast path: the bells it already
+    fired and the leader lock it holds.
+    """
+    global scheduler, elector
+    handoff = list(handoff)
+    scheduler = SimpleScheduler(app, db, Schedule, ThreadedSink(execute_audio_schedule, play_playlist, play_snapshot_entry,
+                                                                  arbiter=output_arbiter),
+                                catchup_seconds=int(os.environ.get('AUDIO_SCHEDULER_CATCHUP_SECONDS', 120)),
+                                snapshot=snapshot_file)
+    def on_elected():
+        scheduler.start(handoff=handoff)
+        handoff.clear()  # Only the first election takes over the fast path's bells
+        audio_store.start_maintenance(app, after_sync=silence_analyzer.backfill)
+        prerenderer.start()
+
+    def on_demoted():
+        scheduler.stop()
+        audio_store.stop_maintenance()
+        prerenderer.stop()
+
+    elector = LeaderElector(
+        SCHEDULER_LOCK_PATH,
+        on_elected=on_elected,
+        on_demoted=on_demoted,
+        is_healthy=lambda: scheduler.thread is not None and scheduler.thread.is_alive(),
+        lock_fd=lock_fd
+    )
+    elector.start()
+    if elector.is_leader:
+        logger.info("✅ Simple polling scheduler initialized and started")
+    else:
+        logger.info("Another process owns the scheduler - this process serves HTTP and stands by for failover")
     
     # Register cleanup for normal exit
     atexit.register(cleanup_scheduler)
@@ -326,21 +291,126 @@ if should_init_scheduler:
     # Register cleanup for signal interrupts (Ctrl+C, kill, etc.)
     def signal_handler(signum, frame):
         """Handle shutdown signals"""
-        logger.info(f"Received signal {signum}, shutting down gracefully...")
+        logger.info("Received signal %s, shutting down gracefully...", signum)
         cleanup_scheduler()
         sys.exit(0)
     
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-else:
-    # Reloader process - skip scheduler initialization
-    scheduler = None
-    logger.info("Skipping scheduler in reloader process")
 
-# Initialize default credentials
-auth_logger.info("Initializing credentials...")
-init_credentials()
-auth_logger.info("Credentials initialization completed")
+def cleanup_scheduler():
+    """Clean up scheduler on application exit"""
+    if elector is not None:
+        logger.info("Cleaning up scheduler on exit...")
+        try:
+            elector.stop()
+            prerenderer.stop()
+            silence_analyzer.shutdown()
+            zone_manager.shutdown_all()
+            logger.info("Scheduler shutdown complete")
+        except Exception as e:
+            logger.error("Error during scheduler shutdown: %s", e)
+
+metrics.registry.gauge(
+    'audio_scheduler_active_playback_threads', 'Threads currently starting or running playback',
+    callback=lambda: sum(1 for t in threading.enumerate() if t.name.startswith(('Audio-', 'Playlist-')))
+)
+metrics.registry.gauge(
+    'audio_scheduler_is_leader', '1 if this process owns the scheduler',
+    callback=lambda: 1 if elector is not None and elector.is_leader else 0
+)
+
+# Each worker writes its metrics to metrics.METRICS_DIR for whichever worker answers /metrics
+# (the daemon's are fetched over RPC instead); started by create_app() only where another
+# process may answer: in the web role or with several Gunicorn workers. Gunicorn takes its
+# default worker count from WEB_CONCURRENCY, which run_gunicorn.sh sets.
+metrics_exporter = metrics.Exporter(metrics.registry, {'process': PROCESS_ROLE})
+EXPORT_METRICS = PROCESS_ROLE == 'web' or (PROCESS_ROLE == 'standalone' and int(os.environ.get('WEB_CONCURRENCY') or 1) > 1)
+
+# Opt-in sampled request profiling (AUDIO_SCHEDULER_PROFILING=1), served under /profiling
+profile_sampler = profiling.install(app)
+
+daemon_client = DaemonClient()
+
+# Compiled copy of the playable schedules (see snapshot.py): written after every change,
+# read by the boot-time fast path and by the scheduler while the database is unreadable
+snapshot_compiler = snapshot.SnapshotCompiler(app)
+snapshot_file = snapshot.SnapshotFile()
+
+# Render-ahead playlist blocks, mixed into single files during the idle window (see prerender.py)
+prerenderer = Prerenderer(app, PLAYLISTS_FOLDER)
+
+# Decides which sound owns the default output when schedules overlap (see arbitration.py); zones have their own
+output_arbiter = Arbiter('default', playback.MixerOutput())
+
+# Leading/trailing silence of every stored file, analysed at upload and by a backfill (see silence.py)
+silence_analyzer = silence.SilenceAnalyzer(app, audio_store)
+
+def play_snapshot_entry(entry, claim=None):
+    """Play a single-file bell from the snapshot (no database access)"""
+    if not audio_available:
+        audio_logger.warning("Audio playback skipped (no audio device): %s", entry.filename)
+        return
+    snapshot.play_entry(entry, app.config['UPLOAD_FOLDER'], lambda path, volume: play_audio(path, volume, claim=claim))
+
+_services_started = False
+
+def create_app(start_scheduler=None, open_audio=True, fast_path=None):
+    """
+    Start this process's subsystems and return the Flask app.
+
+    Importing this module only defines the app and its routes, so migrations and
+    CLI tools never open the audio device or start threads. Servers call this once:
+    it configures logging, creates the default credentials, opens the mixer, keeps
+    the schedule snapshot compiled and - unless start_scheduler says otherwise -
+    starts the scheduler where should_init_scheduler allows it, taking over from
+    fast_path (snapshot.start_fast_path()) if given. Calling it again is a no-op.
+    """
+    global _services_started
+    if _services_started:
+        return app
+    _services_started = True
+
+    # The fast path fired bells while this module was imported; the scheduler takes over from here
+    handoff, lock_fd = fast_path.stop() if fast_path is not None else ((), None)
+
+    setup_logging()
+
+    # Initialize default credentials
+    auth_logger.info("Initializing credentials...")
+    init_credentials()
+    auth_logger.info("Credentials initialization completed")
+
+    if open_audio:
+        init_audio()
+
+    if PROCESS_ROLE == 'web':
+        # Web workers tell the audio daemon to drop its compiled date exceptions after a change
+        exception_calendar.listeners.append(
+            lambda: threading.Thread(target=daemon_client.notify, args=('invalidate',), daemon=True).start()
+        )
+
+    snapshot_compiler.start()
+
+    if EXPORT_METRICS:
+        metrics_exporter.start()
+        atexit.register(metrics_exporter.stop)
+
+    if start_scheduler is None:
+        start_scheduler = should_init_scheduler
+    if start_scheduler:
+        # Main worker process or production mode - initialize scheduler
+        init_scheduler(handoff, lock_fd)
+    else:
+        if lock_fd is not None:
+            # Not the scheduler process after all: release the leader lock the fast path took
+            os.close(lock_fd)
+        if PROCESS_ROLE == 'web':
+            # Web tier - skip scheduler initialization
+            logger.info("Web role - scheduling and playback are handled by the audio daemon")
+        else:
+            logger.info("Skipping scheduler in reloader process")
+    return app
 
 def init_schedules():
     """Initialize schedules from database"""
@@ -351,11 +421,11 @@ def init_schedules():
             logger.info("✅ SimpleScheduler will automatically load schedules from database")
         
         # Get active schedule list
-        active_list = ScheduleList.query.filter_by(is_active=True).first()
+        active_list = ScheduleList.query.filter_by(is_active=True, site_id=current_site_id()).first()
         
         # Create default list if none exists
         if not active_list:
-            active_list = ScheduleList(name='Default', is_active=True)
+            active_list = ScheduleList(name='Default', is_active=True, site_id=current_site_id())
             db.session.add(active_list)
             db.session.commit()
         
@@ -365,7 +435,7 @@ def init_schedules():
         for schedule in schedules:
             if add_job_to_scheduler(schedule):
                 jobs_added += 1
-        logger.info(f"Initialized {jobs_added} schedule jobs from database")
+        logger.info("Initialized %s schedule jobs from database", jobs_added)
 
 def reload_all_schedules():
     """
@@ -377,20 +447,59 @@ def reload_all_schedules():
         return
     logger.info("✅ Schedules will be automatically reloaded from database by SimpleScheduler")
 
-def play_audio(file_path, volume=1.0):
+def play_audio(file_path, volume=1.0, start=0.0, claim=None):
     try:
         if not audio_available:
-            audio_logger.warning(f"Audio playback skipped (no audio device): {file_path}")
+            audio_logger.warning("Audio playback skipped (no audio device): %s", file_path)
             return
-        pygame.mixer.music.load(file_path)
-        pygame.mixer.music.set_volume(volume)
-        pygame.mixer.music.play()
-        audio_logger.info(f"Playing audio: {file_path} at volume {volume}")
+        if claim is not None:
+            playback.play_claimed(output_arbiter, claim, file_path, volume, start)
+        else:
+            playback.play_file(file_path, volume, start)
+    except Exception as e:
+        audio_logger.error("Error playing audio: %s", e)
+
+# Audio durations keyed by content hash, or (path, mtime) - decoding a file to measure it is expensive
+_duration_cache = {}
+
+def get_audio_duration(file_path, content_hash=None):
+    """Return the length of an audio file in seconds, or None if it can't be determined"""
+    try:
+        key = content_hash or (str(file_path), os.path.getmtime(file_path))
+    except OSError:
+        return None
+    if key in _duration_cache:
+        return _duration_cache[key]
+
+    duration = None
+    try:
+        if audio_available:
+            duration = pcm_cache.duration(file_path, content_hash)
+        elif str(file_path).lower().endswith('.wav'):
+            import wave
+            with wave.open(str(file_path), 'rb') as wav:
+                duration = wav.getnframes() / float(wav.getframerate())
     except Exception as e:
-        audio_logger.error(f"Error playing audio: {str(e)}")
+        audio_logger.debug("Could not determine duration of %s: %s", file_path, e)
+    _duration_cache[key] = duration
+    return duration
 
-def play_playlist(schedule_id):
-    """Play a playlist based on schedule configuration"""
+def get_schedule_duration(schedule):
+    """Expected playback length of a schedule in seconds (None if unknown)"""
+    if schedule.schedule_type == 'playlist':
+        return (schedule.playlist_duration or 60) * 60
+    if not schedule.filename:
+        return None
+    file_path = audio_store.resolve(schedule.filename, schedule.audio_hash)
+    if file_path is None:
+        return None
+    return get_audio_duration(file_path, schedule.audio_hash)
+
+def play_playlist(schedule_id, claim=None):
+    """
+    Play a playlist based on schedule configuration. With a claim on the default
+    output (from the scheduler's sink) it plays on the calling thread until done.
+    """
     
     try:
         # Ensure we're in an application context for database access
@@ -398,176 +507,86 @@ def play_playlist(schedule_id):
             # Get the schedule
             schedule = db.session.get(Schedule, schedule_id)
             if not schedule or schedule.schedule_type != 'playlist':
-                playlist_logger.error(f"Invalid playlist schedule ID: {schedule_id}")
+                playlist_logger.error("Invalid playlist schedule ID: %s", schedule_id)
                 return
                 
             # Check if muted
             if schedule.is_muted:
-                playlist_logger.info(f"Playlist schedule {schedule_id} is muted, skipping")
+                playlist_logger.info("Playlist schedule %s is muted, skipping", schedule_id)
                 return
             
             # Get folder path and validate
             folder_path = APP_ROOT.joinpath(schedule.folder_path)
             if not folder_path.exists() or not folder_path.is_dir():
-                playlist_logger.error(f"Playlist folder not found: {folder_path}")
+                playlist_logger.error("Playlist folder not found: %s", folder_path)
                 return
             
-            # Get audio files
-            audio_files = []
-            for ext in ['*.mp3', '*.wav', '*.ogg', '*.m4a', '*.flac']:
-                audio_files.extend(list(folder_path.glob(ext)))
-                audio_files.extend(list(folder_path.glob(ext.upper())))
+            # Get audio files, sorted alphabetically to ensure consistent order
+            audio_files = playback.playlist_files(folder_path)
             
             if not audio_files:
-                playlist_logger.warning(f"No audio files found in playlist folder: {folder_path}")
+                playlist_logger.warning("No audio files found in playlist folder: %s", folder_path)
                 return
             
-            # Sort alphabetically first to ensure consistent order
-            audio_files.sort(key=lambda f: f.name.lower())
+            # Audible part of each track, and a block mixed ahead of time plays as a single stream
+            trims = silence.trims_for_files(audio_files, PLAYLISTS_FOLDER)
+            rendered = prerenderer.lookup(schedule, audio_files, trims) if schedule.render_ahead else None
             
             # Shuffle if enabled
             if schedule.shuffle_mode:
                 random.shuffle(audio_files)
             
-            playlist_logger.info(f"Starting playlist: {schedule.folder_path}, Duration: {schedule.playlist_duration or 60}min, Interval: {schedule.track_interval}sec, Volume: {schedule.volume or 1.0}")
+            playlist_logger.info("Starting playlist: %s, Duration: %smin, Interval: %ssec, Volume: %s", schedule.folder_path, schedule.playlist_duration or 60, schedule.track_interval, schedule.volume or 1.0)
             
             # Get volume
             volume = schedule.volume if schedule.volume is not None else 1.0
             
-            # Start playlist in a separate thread
-            playlist_thread = threading.Thread(
-                target=_run_playlist,
-                args=(audio_files, schedule.playlist_duration or 60, schedule.track_interval, schedule.max_tracks, schedule.shuffle_mode, volume),
-                daemon=True
-            )
-            playlist_thread.start()
+            playlist_args = (audio_files, schedule.playlist_duration or 60, schedule.track_interval, schedule.max_tracks, schedule.shuffle_mode, volume, trims)
+            
+            # Zoned playlists run inside each zone's engine
+            zones = [zone for zone in schedule.output_zones() if zone.is_enabled]
+            if zones:
+                for zone in zones:
+                    if rendered is not None:
+                        zone_manager.play(zone, rendered, request=request_for(schedule))
+                    else:
+                        zone_manager.play_playlist(zone, *playlist_args, request=request_for(schedule))
+                    playlist_logger.info("Routed playlist %s to zone %s", schedule.folder_path, zone.name)
+                return
+            if schedule.output_zones():
+                playlist_logger.info("All zones of playlist schedule %s are disabled, skipping", schedule_id)
+                return
+            
+            if rendered is not None:
+                playlist_logger.info("Playing pre-rendered block %s", rendered.name)
+            elif claim is None:
+                # Start playlist in a separate thread
+                playlist_thread = threading.Thread(
+                    target=_run_playlist,
+                    args=playlist_args,
+                    daemon=True
+                )
+                playlist_thread.start()
+                return
+        
+        # Outside the app context, on the sink's playback thread
+        if rendered is not None:
+            play_audio(rendered, claim=claim)
+        else:
+            _run_playlist(*playlist_args, claim=claim)
         
     except Exception as e:
-        playlist_logger.error(f"Error starting playlist {schedule_id}: {str(e)}")
+        playlist_logger.error("Error starting playlist %s: %s", schedule_id, e)
 
-def _run_playlist(audio_files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume=1.0):
+def _run_playlist(audio_files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume=1.0, trims=None, claim=None):
     """Run the playlist in a separate thread"""
     
     if not audio_available:
         playlist_logger.warning("Audio playback skipped (no audio device)")
         return
     
-    start_time = time.time()
-    # Handle None duration by setting a default of 60 minutes
-    if duration_minutes is None:
-        duration_minutes = 60
-        playlist_logger.warning("No duration specified, using default of 60 minutes")
-    end_time = start_time + (duration_minutes * 60)
-    tracks_played = 0
-    file_list = list(audio_files)  # Make a copy
-    
-    # Fade out settings
-    fade_duration = 5.0  # Fade out over 5 seconds
-    
-    while time.time() < end_time and (max_tracks is None or tracks_played < max_tracks):
-        # If we've played all files and shuffle is enabled, reshuffle
-        if not file_list and shuffle_mode:
-            file_list = list(audio_files)
-            random.shuffle(file_list)
-        elif not file_list:
-            # If no shuffle, reset to original list
-            file_list = list(audio_files)
-        
-        # Get next file
-        audio_file = file_list.pop(0)
-        
-        # Check if this will be the last track
-        is_last_track = (
-            (max_tracks is not None and tracks_played + 1 >= max_tracks) or
-            (time.time() + fade_duration >= end_time) or
-            (not file_list and (max_tracks is None or tracks_played + 1 < max_tracks))
-        )
-        
-        try:
-            playlist_logger.info(f"Playing playlist track: {audio_file.name} at volume {volume}{' (LAST TRACK - will fade out)' if is_last_track else ''}")
-            pygame.mixer.music.load(str(audio_file))
-            pygame.mixer.music.set_volume(volume)
-            pygame.mixer.music.play()
-            
-            # Wait for the track to finish playing completely
-            track_start = time.time()
-            fade_started = False
-            
-            # Wait for track to finish playing naturally
-            while pygame.mixer.music.get_busy():
-                current_time = time.time()
-                
-                # Check if we've exceeded the total playlist duration while playing
-                if current_time >= end_time:
-                    pygame.mixer.music.stop()
-                    playlist_logger.info("Track stopped due to playlist duration limit")
-                    break
-                
-                # Apply fade out for last track
-                if is_last_track and not fade_started:
-                    # Calculate when to start fading based on track length estimation
-                    time_remaining = end_time - current_time
-                    if max_tracks is not None and tracks_played + 1 >= max_tracks:
-                        # For max_tracks limit, start fading after a reasonable time
-                        if current_time - track_start > 10:  # After 10 seconds, start checking
-                            time_remaining = fade_duration
-                    
-                    # Start fade if we're within fade_duration seconds of the end
-                    if time_remaining <= fade_duration:
-                        fade_started = True
-                        fade_start_time = current_time
-                        playlist_logger.info(f"Starting fade-out for last track (remaining: {time_remaining:.1f}s)")
-                
-                # Apply gradual volume reduction during fade
-                if fade_started:
-                    elapsed_fade = current_time - fade_start_time
-                    if elapsed_fade < fade_duration:
-                        # Linear fade from volume to 0
-                        fade_progress = elapsed_fade / fade_duration
-                        current_volume = volume * (1.0 - fade_progress)
-                        pygame.mixer.music.set_volume(max(0.0, current_volume))
-                    else:
-                        # Fade complete, stop the music
-                        pygame.mixer.music.fadeout(100)  # Quick final fadeout
-                        playlist_logger.info("Fade-out complete, stopping track")
-                        time.sleep(0.2)
-                        break
-                
-                time.sleep(0.1)
-            
-            track_end = time.time()
-            track_duration = track_end - track_start
-            playlist_logger.info(f"Track '{audio_file.name}' finished after {track_duration:.1f}s")
-            
-            tracks_played += 1
-            
-            # Check if we've exceeded the total playlist duration
-            if time.time() >= end_time:
-                break
-                
-            # If this was the last track, exit the loop
-            if is_last_track:
-                playlist_logger.info("Last track completed, ending playlist")
-                break
-                
-            # Wait for the interval time before starting the next track
-            if track_interval_seconds and track_interval_seconds > 0:
-                # Check if we have enough time left for the full interval
-                if time.time() + track_interval_seconds < end_time:
-                    playlist_logger.debug(f"Waiting {track_interval_seconds}s interval before next track")
-                    time.sleep(track_interval_seconds)
-                else:
-                    # Wait only for the remaining time if playlist duration is about to end
-                    remaining_time = end_time - time.time()
-                    if remaining_time > 0:
-                        playlist_logger.debug(f"Waiting {remaining_time:.1f}s (shortened interval due to playlist duration limit)")
-                        time.sleep(remaining_time)
-                
-        except Exception as e:
-            playlist_logger.error(f"Error playing playlist track {audio_file}: {str(e)}")
-            tracks_played += 1  # Count failed attempts to prevent infinite loops
-    
-    playlist_logger.info(f"Playlist finished. Played {tracks_played} tracks in {(time.time() - start_time) / 60:.1f} minutes")
+    playback.run_playlist(audio_files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume, trims,
+                          arbiter=output_arbiter, claim=claim)
 
 @app.route('/audio/<path:filename>')
 @login_required
@@ -575,51 +594,111 @@ def serve_audio(filename):
     """Serve audio files for preview"""
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
+@app.route('/waveform/<path:filename>')
+@login_required
+def serve_waveform(filename):
+    """
+    Waveform peaks of an upload (or of a playlist file with ?root=playlists) in the
+    binary layout of waveform.py; ?width= returns only the level that suits that many
+    pixels. The trim offsets come along as X-Trim-Start/X-Trim-End headers.
+    """
+    root = request.args.get('root', 'uploads')
+    width = request.args.get('width', type=int)
+    audio_file = AudioFile.query.filter_by(root=root, name=filename).first()
+    if audio_file is None:
+        abort(404)
+    analysis = AudioAnalysis.query.filter_by(blob_hash=audio_file.blob_hash).first()
+    if analysis is None or analysis.peaks is None:
+        if waveform.numpy is None:
+            return jsonify({'error': 'Waveforms need NumPy'}), 404
+        if analysis is not None and analysis.duration is None:
+            return jsonify({'error': 'The file could not be decoded'}), 404
+        path = audio_store.content_path(audio_file.blob_hash)
+        if path is None:
+            abort(404)
+        silence_analyzer.submit(audio_file.blob_hash, path)
+        response = jsonify({'status': 'analysing'})
+        response.status_code = 202
+        response.headers['Retry-After'] = '2'
+        return response
+
+    peaks = waveform.for_width(analysis.peaks, width) if width else analysis.peaks
+    # Names can be relinked to other content, so revalidate; the ETag changes with the blob
+    response = send_variants(request, {'identity': peaks}, 'application/octet-stream',
+                             f'"{audio_file.blob_hash[:16]}-{width or 0}"', 'no-cache')
+    response.headers['X-Trim-Start'] = str(analysis.trim_start or 0.0)
+    response.headers['X-Trim-End'] = '' if analysis.trim_end is None else str(analysis.trim_end)
+    return response
+
 @app.route('/set-language/<lang>')
 def set_language(lang):
     """Set UI language in session.
-    If the requested language isn't currently loaded, attempt to reload translations from disk
-    so newly added languages in translations.json are recognized without restarting the server.
+    If the requested language isn't currently loaded, check translations.json for changes
+    so newly added languages are recognized without restarting the server.
     """
-    global TRANSLATIONS
-    if lang not in TRANSLATIONS:
-        try:
-            with open(TRANSLATIONS_PATH, 'r', encoding='utf-8') as f:
-                TRANSLATIONS = json.load(f)
-        except Exception:
-            # If reload fails, still set the session; views will fallback to English
-            pass
+    if not translation_catalog.has_language(lang):
+        # If reload fails, still set the session; views will fallback to English
+        translation_catalog.refresh(force=True)
     session['lang'] = lang
     return jsonify({'success': True})
 
+@app.route('/i18n/<lang>/<page>.<fingerprint>.js')
+def translation_bundle(lang, page, fingerprint):
+    """Precompiled translations for one page; immutable because the URL carries the content hash"""
+    bundle = translation_catalog.bundle(lang, page)
+    if bundle is None:
+        abort(404)
+    # A page rendered before translations.json changed gets the current strings, revalidated next time
+    return send_variants(request, bundle.variants, 'application/javascript; charset=utf-8', bundle.etag,
+                         IMMUTABLE if fingerprint == bundle.fingerprint else 'no-cache')
+
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    """Fingerprinted, pre-compressed static files (see assets.py)"""
+    asset, exact = asset_manifest.lookup(filename)
+    if asset is None:
+        abort(404)
+    return send_variants(request, asset.variants, asset.content_type, asset.etag,
+                         IMMUTABLE if exact else 'no-cache')
+
+def translations_url(lang, page):
+    return '/' + translation_catalog.bundle_path(lang, page)
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'GET':
         if 'logged_in' in session:
             return redirect(url_for('index'))
         current_lang = session.get('lang', 'en')
-        translations = TRANSLATIONS.get(current_lang, TRANSLATIONS['en'])
-        js_translations = json.dumps({
-            'login': translations.get('login', {})
-        })
+        translations = translation_catalog.get(current_lang)
         return render_template('login.html', 
                                translations=translations,
                                current_lang=current_lang,
-                               js_translations=js_translations)
+                               translations_url=translations_url(current_lang, 'login'))
 
     auth_logger.info("Login attempt received")
     data = request.get_json()
-    auth_logger.debug(f"Received login data from user")
     username = data.get('username')
     password = data.get('password')
-    auth_logger.debug(f"Login attempt for username: {username}")
+    auth_logger.debug("Login attempt for username: %s", username)
 
-    if check_credentials(username, password):
+    try:
+        valid = check_credentials(username, password, client=request.remote_addr)
+    except RateLimited as e:
+        auth_logger.warning("Login rate limit hit for %s", request.remote_addr)
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    except AuthBusy:
+        auth_logger.warning("Login rejected - password verification pool is busy")
+        return jsonify({'success': False, 'error': 'Server busy, please try again'}), 503
+
+    if valid:
         session['logged_in'] = True
         session['username'] = username
-        auth_logger.info(f"Successful login for user: {username}")
+        auth_logger.info("Successful login for user: %s", username)
         return jsonify({'success': True})
-    auth_logger.warning(f"Failed login attempt for username: {username}")
+    auth_logger.warning("Failed login attempt for username: %s", username)
     return jsonify({'success': False, 'error': 'Invalid username or password'})
 
 @app.route('/manual')
@@ -627,7 +706,7 @@ def login():
 def manual():
     # Render the manual page with current language translations
     current_lang = session.get('lang', 'en')
-    translations = TRANSLATIONS.get(current_lang, TRANSLATIONS['en'])
+    translations = translation_catalog.get(current_lang)
     return render_template('manual.html', 
                            translations=translations,
                            current_lang=current_lang)
@@ -642,14 +721,11 @@ def logout():
 @login_required
 def settings():
     current_lang = session.get('lang', 'en')
-    translations = TRANSLATIONS.get(current_lang, TRANSLATIONS['en'])
-    js_translations = json.dumps({
-        'settings': translations.get('settings', {})
-    })
+    translations = translation_catalog.get(current_lang)
     return render_template('settings.html', 
                            translations=translations,
                            current_lang=current_lang,
-                           js_translations=js_translations)
+                           translations_url=translations_url(current_lang, 'settings'))
 
 @app.route('/settings/update', methods=['POST'])
 @login_required
@@ -660,8 +736,11 @@ def update_settings():
     new_password = data.get('newPassword')
 
     # Verify current password
-    if not check_credentials(session.get('username'), current_password):
-        return jsonify({'success': False, 'error': 'Invalid current password'})
+    try:
+        if not check_credentials(session.get('username'), current_password, client=request.remote_addr):
+            return jsonify({'success': False, 'error': 'Invalid current password'})
+    except (RateLimited, AuthBusy) as e:
+        return jsonify({'success': False, 'error': str(e)}), 429 if isinstance(e, RateLimited) else 503
 
     # Update credentials
     try:
@@ -678,7 +757,7 @@ def update_settings():
 def export_schedules_csv():
     try:
         # Get the active schedule list
-        active_list = ScheduleList.query.filter_by(is_active=True).first()
+        active_list = ScheduleList.query.filter_by(is_active=True, site_id=current_site_id()).first()
         if not active_list:
             return jsonify({'success': False, 'error': 'No active schedule list found'})
         
@@ -696,7 +775,8 @@ def export_schedules_csv():
             'Time',
             'Days',
             'Is Muted',
-            'Created Date'
+            'Created Date',
+            'Recurrence'
         ])
         
         # Write schedule data
@@ -723,7 +803,8 @@ def export_schedules_csv():
                 schedule.time,
                 days_str,
                 'Yes' if schedule.is_muted else 'No',
-                schedule.created_at.strftime('%Y-%m-%d %H:%M:%S') if hasattr(schedule, 'created_at') and schedule.created_at else 'Unknown'
+                schedule.created_at.strftime('%Y-%m-%d %H:%M:%S') if hasattr(schedule, 'created_at') and schedule.created_at else 'Unknown',
+                schedule.recurrence or ''
             ])
         
         # Create response
@@ -760,7 +841,7 @@ def import_schedules_csv():
             return jsonify({'success': False, 'error': 'File must be a CSV file'})
         
         # Get the active schedule list
-        active_list = ScheduleList.query.filter_by(is_active=True).first()
+        active_list = ScheduleList.query.filter_by(is_active=True, site_id=current_site_id()).first()
         if not active_list:
             return jsonify({'success': False, 'error': 'No active schedule list found'})
         
@@ -816,11 +897,20 @@ def import_schedules_csv():
                     muted_str = row['Is Muted'].strip().lower()
                     is_muted = muted_str in ['yes', 'true', '1']
                 
+                # Optional recurrence rule (JSON, see recurrence.py)
+                rule = None
+                if (row.get('Recurrence') or '').strip():
+                    try:
+                        rule = recurrence.parse(row['Recurrence'].strip(), time_str)
+                    except ValueError as e:
+                        return jsonify({'success': False, 'error': f'Row {row_num}: Invalid recurrence: {e}'})
+                
                 new_schedules.append({
                     'filename': audio_file,
                     'time': time_str,
                     'days': schedule_days,
-                    'is_muted': is_muted
+                    'is_muted': is_muted,
+                    'recurrence': rule
                 })
                 
             except Exception as e:
@@ -851,6 +941,7 @@ def import_schedules_csv():
                     saturday=schedule_data['days']['saturday'],
                     sunday=schedule_data['days']['sunday'],
                     is_muted=schedule_data['is_muted'],
+                    recurrence=schedule_data['recurrence'],
                     schedule_list_id=active_list.id
                 )
                 db.session.add(new_schedule)
@@ -876,32 +967,16 @@ def import_schedules_csv():
 @app.route('/')
 @login_required
 def index():
-    # Get list of uploaded files
-    uploaded_files = []
-    if os.path.exists(app.config['UPLOAD_FOLDER']):
-        uploaded_files = [f for f in os.listdir(app.config['UPLOAD_FOLDER']) 
-                        if os.path.isfile(os.path.join(app.config['UPLOAD_FOLDER'], f))
-                        and f != '.gitkeep']  # Exclude .gitkeep file
-    
+    # The file picker loads uploaded files from /uploads, so render cost doesn't grow with the library
     # Get current language from session or default to English
     current_lang = session.get('lang', 'en')
-    translations = TRANSLATIONS.get(current_lang, TRANSLATIONS['en'])
-    
-    # Pre-serialize the translations data needed for JavaScript
-    js_translations = json.dumps({
-           'navigation': translations['navigation'],
-        'days_list': translations['schedule']['days_list'],
-           'current_schedules': translations['current_schedules'],
-           'schedule_lists': translations.get('schedule_lists', {}),
-           'playlist': translations.get('playlist', {}),
-           'modals': translations['modals']
-    })
+    translations = translation_catalog.get(current_lang)
     
+    # The JavaScript strings come from a precompiled, browser-cached bundle
     return render_template('index.html', 
-                           uploaded_files=uploaded_files,
                            translations=translations,
                            current_lang=current_lang,
-                           js_translations=js_translations)
+                           translations_url=translations_url(current_lang, 'index'))
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -913,11 +988,44 @@ def upload_file():
         return jsonify({'error': 'No selected file'}), 400
 
     if file:
-        filename = file.filename
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        logger.info(f"Audio file uploaded successfully: {filename}")
-        return jsonify({'success': True, 'filename': filename})
+        try:
+            filename, blob_hash, deduplicated = audio_store.store_upload(file.stream, file.filename)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        uploads_catalog.add(filename)
+        silence_analyzer.submit(blob_hash, audio_store.content_path(blob_hash))
+        logger.info(f"Audio file uploaded successfully: {filename}{' (content already stored)' if deduplicated else ''}")
+        return jsonify({
+            'success': True,
+            'filename': filename,
+            'renamed': filename != file.filename,
+            'hash': blob_hash,
+            'deduplicated': deduplicated
+        })
+
+@app.route('/audio_store', methods=['GET'])
+@login_required
+def audio_store_stats():
+    """Blob count, disk use and deduplication savings of the audio store"""
+    return jsonify(audio_store.stats())
+
+@app.route('/audio_store/gc', methods=['POST'])
+@login_required
+def audio_store_gc():
+    """Sync the store with uploads/ and playlists/, then delete unreferenced blobs"""
+    synced = audio_store.sync()
+    collected = audio_store.collect_garbage()
+    return jsonify({'status': 'success', **synced, **collected})
+
+@app.route('/uploads', methods=['GET'])
+@login_required
+def list_uploads():
+    """Uploaded audio files, filtered by ?q= and paginated with ?page=&per_page="""
+    return jsonify(uploads_catalog.query(
+        q=request.args.get('q', '').strip(),
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', 50, type=int)
+    ))
 
 def add_job_to_scheduler(schedule):
     """
@@ -943,9 +1051,8 @@ def add_single_file_job_to_scheduler(schedule):
     Validate single file schedule.
     With SimpleScheduler, no job registration needed - schedules loaded from DB automatically.
     """
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], schedule.filename)
-    if not os.path.exists(file_path):
-        logger.warning(f"Audio file not found for schedule {schedule.id}: {file_path}")
+    if audio_store.resolve(schedule.filename, schedule.audio_hash) is None:
+        logger.warning(f"Audio file not found for schedule {schedule.id}: {schedule.filename}")
         return False
     return True
 
@@ -972,6 +1079,18 @@ def add_playlist_job_to_scheduler(schedule):
     
     return True
 
+def parse_recurrence(value, time, days):
+    """
+    Validate a request's recurrence rule; returns (rule text, time, days).
+    A cron rule supplies the time and, if none were given, the days. Raises ValueError.
+    """
+    rule = recurrence.parse(value, time or None)
+    defaults = recurrence.cron_defaults(rule)
+    if defaults is not None:
+        time, cron_days = defaults
+        days = days or cron_days
+    return rule, time, days
+
 @app.route('/schedule', methods=['POST'])
 def schedule_audio():
     data = request.json
@@ -983,16 +1102,20 @@ def schedule_audio():
 
     time = schedule_data.get('time')
     days = schedule_data.get('days', [])
+    try:
+        rule, time, days = parse_recurrence(schedule_data.get('recurrence'), time, days)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid recurrence: {e}'}), 400
 
     if not time or not days:
         return jsonify({'error': 'Missing time or days'}), 400
 
     # Get active schedule list
-    active_list = ScheduleList.query.filter_by(is_active=True).first()
+    active_list = ScheduleList.query.filter_by(is_active=True, site_id=current_site_id()).first()
     
     # Create default list if none exists
     if not active_list:
-        active_list = ScheduleList(name='Default', is_active=True)
+        active_list = ScheduleList(name='Default', is_active=True, site_id=current_site_id())
         db.session.add(active_list)
         db.session.commit()
 
@@ -1001,6 +1124,7 @@ def schedule_audio():
         schedule_list_id=active_list.id,
         filename=filename,
         time=time,
+        recurrence=rule,
         monday=0 in days,
         tuesday=1 in days,
         wednesday=2 in days,
@@ -1036,6 +1160,11 @@ def add_playlist_schedule():
         max_tracks = data.get('max_tracks')
         track_interval = data.get('track_interval', 10)
         shuffle_mode = data.get('shuffle_mode', True)
+        render_ahead = bool(data.get('render_ahead', False))
+        try:
+            rule, time, days = parse_recurrence(data.get('recurrence'), time, days)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid recurrence: {e}'}), 400
         
         # Set default duration if not provided or None
         if playlist_duration is None or playlist_duration == '':
@@ -1066,9 +1195,9 @@ def add_playlist_schedule():
             return jsonify({'error': 'No audio files found in the selected folder'}), 400
         
         # Get active schedule list
-        active_list = ScheduleList.query.filter_by(is_active=True).first()
+        active_list = ScheduleList.query.filter_by(is_active=True, site_id=current_site_id()).first()
         if not active_list:
-            active_list = ScheduleList(name='Default', is_active=True)
+            active_list = ScheduleList(name='Default', is_active=True, site_id=current_site_id())
             db.session.add(active_list)
             db.session.commit()
         
@@ -1078,6 +1207,7 @@ def add_playlist_schedule():
             schedule_type='playlist',
             folder_path=folder_path,
             time=time,
+            recurrence=rule,
             monday=0 in days,
             tuesday=1 in days,
             wednesday=2 in days,
@@ -1088,7 +1218,8 @@ def add_playlist_schedule():
             playlist_duration=playlist_duration,
             max_tracks=max_tracks,
             track_interval=track_interval,
-            shuffle_mode=shuffle_mode
+            shuffle_mode=shuffle_mode,
+            render_ahead=render_ahead
         )
         
         db.session.add(schedule)
@@ -1111,11 +1242,11 @@ def add_playlist_schedule():
 @app.route('/get_schedules', methods=['GET'])
 def get_schedules():
     # Get active schedule list
-    active_list = ScheduleList.query.filter_by(is_active=True).first()
+    active_list = ScheduleList.query.filter_by(is_active=True, site_id=current_site_id()).first()
     
     if not active_list:
         # Create default list if none exists
-        active_list = ScheduleList(name='Default', is_active=True)
+        active_list = ScheduleList(name='Default', is_active=True, site_id=current_site_id())
         db.session.add(active_list)
         db.session.commit()
     
@@ -1123,12 +1254,55 @@ def get_schedules():
     schedules = Schedule.query.filter_by(schedule_list_id=active_list.id).order_by(Schedule.time.asc()).all()
     return jsonify([schedule.to_dict() for schedule in schedules])
 
+# Occurrence expansions, invalidated automatically through ScheduleList.revision
+occurrence_cache = OccurrenceCache()
+
+@app.route('/occurrences', methods=['GET'])
+@app.route('/schedule_lists/<int:list_id>/occurrences', methods=['GET'])
+@login_required
+def get_occurrences(list_id=None):
+    """
+    Expand a schedule list (the active one by default) into concrete occurrences.
+    Query parameters: start=YYYY-MM-DD (default today), days=N (default 7, max 31),
+    include_muted=1 to also list muted schedules.
+    """
+    if list_id is None:
+        schedule_list = ScheduleList.query.filter_by(is_active=True, site_id=current_site_id()).first()
+        if not schedule_list:
+            return jsonify({'error': 'No active schedule list found'}), 404
+    else:
+        schedule_list = db.session.get(ScheduleList, list_id) or abort(404)
+
+    try:
+        start_arg = request.args.get('start')
+        start_date = datetime.strptime(start_arg, '%Y-%m-%d').date() if start_arg else datetime.now().date()
+        days = int(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({'error': 'Invalid start date or days'}), 400
+    if not 1 <= days <= MAX_RANGE_DAYS:
+        return jsonify({'error': f'days must be between 1 and {MAX_RANGE_DAYS}'}), 400
+    include_muted = request.args.get('include_muted') in ('1', 'true', 'yes')
+
+    expansion = occurrence_cache.expand(schedule_list, start_date, days, get_schedule_duration, include_muted)
+    exceptions = {
+        day.isoformat(): {'action': rule.action, 'override_list_id': rule.override_list_id, 'name': rule.name}
+        for day, rule in exception_calendar.rules_between(start_date, days).items()
+    }
+    return jsonify({
+        'list': schedule_list.to_dict(),
+        'start': start_date.isoformat(),
+        'days': days,
+        'occurrences': expansion['occurrences'],
+        'conflicts': expansion['conflicts'],
+        'exceptions': exceptions
+    })
+
 @app.route('/get_playlist_folders', methods=['GET'])
 @login_required
 def get_playlist_folders():
     """Get list of available playlist folders"""
     try:
-        playlists_dir = APP_ROOT.joinpath('playlists')
+        playlists_dir = PLAYLISTS_FOLDER
         
         # Create playlists directory if it doesn't exist
         if not playlists_dir.exists():
@@ -1146,7 +1320,7 @@ def get_playlist_folders():
                 
                 folders.append({
                     'name': item.name,
-                    'path': str(item.relative_to(APP_ROOT)),
+                    'path': str(item.relative_to(APP_ROOT)) if item.is_relative_to(APP_ROOT) else str(item),
                     'file_count': len(audio_files),
                     'files': [f.name for f in audio_files[:5]]  # Show first 5 files as preview
                 })
@@ -1175,13 +1349,19 @@ def delete_schedule(schedule_id):
 
 @app.route('/update_schedule/<int:schedule_id>', methods=['POST'])
 def update_schedule(schedule_id):
-    """Update an existing schedule's time and days, then refresh its job."""
+    """Update an existing schedule's time and days (and recurrence rule, if given), then refresh its job."""
     schedule = db.session.get(Schedule, schedule_id) or abort(404)
     data = request.get_json() or {}
 
     # Extract fields
     new_time = data.get('time')
     new_days = data.get('days', [])  # expects list of indices 0..6
+    new_rule = schedule.recurrence
+    if 'recurrence' in data:
+        try:
+            new_rule, new_time, new_days = parse_recurrence(data['recurrence'], new_time, new_days)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid recurrence: {e}'}), 400
 
     # Basic validation
     if not new_time or not isinstance(new_days, list):
@@ -1189,6 +1369,7 @@ def update_schedule(schedule_id):
 
     # Update fields
     schedule.time = new_time
+    schedule.recurrence = new_rule
     schedule.monday = 0 in new_days
     schedule.tuesday = 1 in new_days
     schedule.wednesday = 2 in new_days
@@ -1244,10 +1425,230 @@ def update_volume(schedule_id):
     
     return jsonify({'success': True, 'volume': schedule.volume})
 
+@app.route('/update_priority/<int:schedule_id>', methods=['POST'])
+@login_required
+def update_priority(schedule_id):
+    """Set how a schedule competes for its output (None for either resets it to the type's default)"""
+    schedule = db.session.get(Schedule, schedule_id) or abort(404)
+    data = request.json or {}
+    priority = data.get('priority')
+    conflict_policy = data.get('conflict_policy')
+    
+    if priority is not None and (not isinstance(priority, int) or isinstance(priority, bool) or not (-100 <= priority <= 100)):
+        return jsonify({'success': False, 'error': 'Priority must be a whole number between -100 and 100'}), 400
+    if conflict_policy is not None and conflict_policy not in CONFLICT_POLICIES:
+        return jsonify({'success': False, 'error': f"Conflict policy must be one of: {', '.join(CONFLICT_POLICIES)}"}), 400
+    
+    schedule.priority = priority
+    schedule.conflict_policy = conflict_policy
+    db.session.commit()
+    
+    schedule_info = f"ID:{schedule_id}, File:{schedule.filename if schedule.schedule_type != 'playlist' else schedule.folder_path}"
+    logger.info(f"Schedule priority updated to {priority}, conflict policy {conflict_policy}: {schedule_info}")
+    
+    return jsonify({'success': True, 'priority': schedule.priority, 'conflict_policy': schedule.conflict_policy})
+
+@app.route('/update_zones/<int:schedule_id>', methods=['POST'])
+@login_required
+def update_zones(schedule_id):
+    """Route a schedule to a set of zones (an empty list means the default output)"""
+    schedule = db.session.get(Schedule, schedule_id) or abort(404)
+    zone_ids = (request.json or {}).get('zones', [])
+    
+    if not isinstance(zone_ids, list):
+        return jsonify({'success': False, 'error': 'zones must be a list of zone ids'}), 400
+    
+    zones = Zone.query.filter(Zone.id.in_(zone_ids)).all() if zone_ids else []
+    if len(zones) != len(set(zone_ids)):
+        return jsonify({'success': False, 'error': 'Unknown zone id'}), 404
+    
+    schedule.zones = zones
+    db.session.commit()
+    
+    logger.info(f"Schedule {schedule_id} routed to zones: {[zone.name for zone in zones] or 'default output'}")
+    return jsonify({'success': True, 'zones': [zone.id for zone in zones]})
+
+@app.route('/toggle_render_ahead/<int:schedule_id>', methods=['POST'])
+@login_required
+def toggle_render_ahead(schedule_id):
+    """Switch a playlist schedule between live playback and pre-rendered blocks"""
+    schedule = db.session.get(Schedule, schedule_id) or abort(404)
+    if schedule.schedule_type != 'playlist':
+        return jsonify({'success': False, 'error': 'Only playlist schedules can be rendered ahead'}), 400
+    
+    schedule.render_ahead = not schedule.render_ahead
+    db.session.commit()
+    
+    logger.info(f"Render-ahead {'enabled' if schedule.render_ahead else 'disabled'} for playlist schedule {schedule_id}")
+    return jsonify({'success': True, 'render_ahead': schedule.render_ahead})
+
+@app.route('/prerender', methods=['GET'])
+@login_required
+def get_prerenders():
+    """Pre-rendered playlist blocks on disk, with their track lists"""
+    return jsonify(prerenderer.renders())
+
+@app.route('/prerender/<int:schedule_id>', methods=['POST'])
+@login_required
+def prerender_schedule(schedule_id):
+    """Render a playlist schedule's upcoming blocks now instead of waiting for the idle window"""
+    schedule = db.session.get(Schedule, schedule_id) or abort(404)
+    if not schedule.render_ahead:
+        return jsonify({'success': False, 'error': 'Render-ahead is not enabled for this schedule'}), 400
+    prerenderer.render_schedule(schedule_id)
+    return jsonify({'success': True}), 202
+
+@app.route('/prerender/<path:filename>')
+@login_required
+def serve_prerender(filename):
+    """Audition a pre-rendered block (or read its JSON sidecar) before it airs"""
+    return send_from_directory(prerenderer.folder, filename)
+
+@app.route('/zones', methods=['GET'])
+@login_required
+def get_zones():
+    zones = Zone.query.order_by(Zone.name.asc()).all()
+    return jsonify([dict(zone.to_dict(), engine=zone_manager.status(zone.id)) for zone in zones])
+
+@app.route('/zones', methods=['POST'])
+@login_required
+def create_zone():
+    data = request.json or {}
+    name = data.get('name')
+    
+    if not name:
+        return jsonify({'error': 'Name is required'}), 400
+    if Zone.query.filter_by(name=name).first():
+        return jsonify({'error': 'A zone with this name already exists'}), 400
+    try:
+        driver, sink = check_zone_output(data.get('driver') or 'pulseaudio', data.get('sink') or None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    zone = Zone(
+        name=name,
+        driver=driver,
+        sink=sink,
+        is_enabled=data.get('is_enabled', True)
+    )
+    db.session.add(zone)
+    db.session.commit()
+    
+    logger.info(f"Zone created: {zone.name} ({zone.driver}, sink={zone.sink})")
+    return jsonify({'success': True, 'zone': zone.to_dict()})
+
+@app.route('/zones/<int:zone_id>', methods=['POST'])
+@login_required
+def update_zone(zone_id):
+    """Update a zone's output; its engine restarts on the next playback"""
+    zone = db.session.get(Zone, zone_id) or abort(404)
+    data = request.json or {}
+    try:
+        zone.driver, zone.sink = check_zone_output(data.get('driver', zone.driver) or 'pulseaudio',
+                                                   data.get('sink', zone.sink) or None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    for field in ('name', 'is_enabled'):
+        if field in data:
+            setattr(zone, field, data[field])
+    db.session.commit()
+    
+    if not zone.is_enabled:
+        zone_manager.remove(zone.id)
+    return jsonify({'success': True, 'zone': zone.to_dict()})
+
+@app.route('/zones/<int:zone_id>', methods=['DELETE'])
+@login_required
+def delete_zone(zone_id):
+    zone = db.session.get(Zone, zone_id) or abort(404)
+    zone_manager.remove(zone.id)
+    Site.query.filter_by(zone_id=zone.id).update({Site.zone_id: None})  # Those sites fall back to the in-process mixer
+    db.session.delete(zone)
+    db.session.commit()
+    
+    logger.info(f"Deleted zone: {zone.name}")
+    return jsonify({'success': True})
+
+@app.route('/sites', methods=['GET'])
+@login_required
+def get_sites():
+    sites = Site.query.order_by(Site.name.asc()).all()
+    return jsonify({'current': current_site_id(), 'sites': [site.to_dict() for site in sites]})
+
+@app.route('/sites', methods=['POST'])
+@login_required
+def create_site():
+    """Create a site with an empty active list; zone_id is its audio output (none: the in-process mixer)"""
+    data = request.json or {}
+    name = data.get('name')
+    zone_id = data.get('zone_id')
+    
+    if not name:
+        return jsonify({'error': 'Name is required'}), 400
+    if Site.query.filter_by(name=name).first():
+        return jsonify({'error': 'A site with this name already exists'}), 400
+    if zone_id is not None and db.session.get(Zone, zone_id) is None:
+        return jsonify({'error': 'Unknown zone id'}), 404
+    
+    site = Site(name=name, zone_id=zone_id, is_enabled=data.get('is_enabled', True))
+    site.schedule_lists.append(ScheduleList(name='Default', is_active=True))
+    db.session.add(site)
+    db.session.commit()
+    
+    logger.info(f"Site created: {site.name} (zone {site.zone_id})")
+    return jsonify({'success': True, 'site': site.to_dict()})
+
+@app.route('/sites/<int:site_id>', methods=['POST'])
+@login_required
+def update_site(site_id):
+    site = db.session.get(Site, site_id) or abort(404)
+    data = request.json or {}
+    
+    if data.get('zone_id') is not None and db.session.get(Zone, data['zone_id']) is None:
+        return jsonify({'error': 'Unknown zone id'}), 404
+    for field in ('name', 'zone_id', 'is_enabled'):
+        if field in data:
+            setattr(site, field, data[field])
+    db.session.commit()
+    
+    return jsonify({'success': True, 'site': site.to_dict()})
+
+@app.route('/sites/<int:site_id>', methods=['DELETE'])
+@login_required
+def delete_site(site_id):
+    """Delete a site together with its schedule lists"""
+    site = db.session.get(Site, site_id) or abort(404)
+    
+    # Date exceptions overriding to its lists fall back to the active list
+    list_ids = [schedule_list.id for schedule_list in site.schedule_lists]
+    if list_ids:
+        DateException.query.filter(DateException.override_list_id.in_(list_ids)).update(
+            {DateException.override_list_id: None}, synchronize_session=False)
+        db.session.info['date_exceptions_changed'] = True  # Bulk updates bypass the flush hook
+    
+    db.session.delete(site)
+    db.session.commit()
+    
+    logger.info(f"Deleted site: {site.name}")
+    return jsonify({'success': True})
+
+@app.route('/sites/select', methods=['POST'])
+@login_required
+def select_site():
+    """Choose the site the web UI works on: its lists, schedules and CSV import/export (null: the default site)"""
+    site_id = (request.json or {}).get('site_id')
+    if site_id is None:
+        session.pop('site_id', None)
+    else:
+        site = db.session.get(Site, site_id) or abort(404)
+        session['site_id'] = site.id
+    return jsonify({'success': True, 'current': current_site_id()})
+
 @app.route('/schedule_lists', methods=['GET'])
 @login_required
 def get_schedule_lists():
-    lists = ScheduleList.query.all()
+    lists = ScheduleList.query.filter_by(site_id=current_site_id()).all()
     return jsonify([list.to_dict() for list in lists])
 
 @app.route('/schedule_lists', methods=['POST'])
@@ -1260,7 +1661,7 @@ def create_schedule_list():
         return jsonify({'error': 'Name is required'}), 400
     
     # Create new schedule list
-    schedule_list = ScheduleList(name=name, is_active=False)
+    schedule_list = ScheduleList(name=name, is_active=False, site_id=current_site_id())
     db.session.add(schedule_list)
     db.session.commit()
     
@@ -1269,11 +1670,12 @@ def create_schedule_list():
 @app.route('/schedule_lists/<int:list_id>/activate', methods=['POST'])
 @login_required
 def activate_schedule_list(list_id):
-    # Deactivate all lists
-    db.session.query(ScheduleList).update({ScheduleList.is_active: False})
+    schedule_list = db.session.get(ScheduleList, list_id) or abort(404)
+    
+    # Deactivate all lists of the list's site
+    ScheduleList.query.filter_by(site_id=schedule_list.site_id).update({ScheduleList.is_active: False})
     
     # Activate the selected list
-    schedule_list = db.session.get(ScheduleList, list_id) or abort(404)
     schedule_list.is_active = True
     db.session.commit()
     
@@ -1288,16 +1690,21 @@ def activate_schedule_list(list_id):
 def delete_schedule_list(list_id):
     schedule_list = db.session.get(ScheduleList, list_id) or abort(404)
     
-    # Don't allow deleting the active list if it's the only one
-    if schedule_list.is_active and ScheduleList.query.count() == 1:
+    # Don't allow deleting the active list if it's the only one of its site
+    site_lists = ScheduleList.query.filter_by(site_id=schedule_list.site_id)
+    if schedule_list.is_active and site_lists.count() == 1:
         return jsonify({'error': 'Cannot delete the last schedule list'}), 400
     
     # If deleting active list, activate another one
     if schedule_list.is_active:
-        other_list = ScheduleList.query.filter(ScheduleList.id != list_id).first()
+        other_list = site_lists.filter(ScheduleList.id != list_id).first()
         if other_list:
             other_list.is_active = True
     
+    # Date exceptions overriding to this list fall back to the active list
+    DateException.query.filter_by(override_list_id=list_id).update({DateException.override_list_id: None})
+    db.session.info['date_exceptions_changed'] = True  # Bulk updates bypass the flush hook
+    
     db.session.delete(schedule_list)
     db.session.commit()
     
@@ -1307,6 +1714,199 @@ def delete_schedule_list(list_id):
     logger.info(f"Deleted schedule list: {schedule_list.name}")
     return jsonify({'success': True})
 
+@app.route('/date_exceptions', methods=['GET'])
+@login_required
+def get_date_exceptions():
+    exceptions = DateException.query.order_by(DateException.start_date.asc()).all()
+    return jsonify([exception.to_dict() for exception in exceptions])
+
+@app.route('/date_exceptions', methods=['POST'])
+@login_required
+def create_date_exception():
+    """Create a skip or override exception for a date or an inclusive date range"""
+    data = request.json or {}
+    action = data.get('action', 'skip')
+    override_list_id = data.get('override_list_id')
+    calendar_id = data.get('calendar_id')
+
+    try:
+        start_date = datetime.strptime(data.get('start_date') or '', '%Y-%m-%d').date()
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+    except ValueError:
+        return jsonify({'error': 'Dates must use the YYYY-MM-DD format'}), 400
+
+    if end_date is not None and end_date < start_date:
+        return jsonify({'error': 'End date must not be before start date'}), 400
+    if end_date is not None and (end_date - start_date).days > MAX_EXCEPTION_DAYS:
+        return jsonify({'error': f'A date range can span at most {MAX_EXCEPTION_DAYS} days; split longer periods'}), 400
+    if action not in EXCEPTION_ACTIONS:
+        return jsonify({'error': f'Action must be one of: {", ".join(EXCEPTION_ACTIONS)}'}), 400
+    if action == 'override' and not (override_list_id and db.session.get(ScheduleList, override_list_id)):
+        return jsonify({'error': 'Override exceptions need an existing schedule list'}), 400
+    if calendar_id is not None and not db.session.get(HolidayCalendar, calendar_id):
+        return jsonify({'error': 'Holiday calendar not found'}), 404
+
+    exception = DateException(
+        name=data.get('name'),
+        start_date=start_date,
+        end_date=end_date,
+        action=action,
+        override_list_id=override_list_id if action == 'override' else None,
+        calendar_id=calendar_id
+    )
+    db.session.add(exception)
+    db.session.commit()
+
+    logger.info(f"Date exception added: {action} {start_date} - {end_date or start_date} ({exception.name})")
+    return jsonify({'success': True, 'exception': exception.to_dict()})
+
+@app.route('/date_exceptions/<int:exception_id>', methods=['DELETE'])
+@login_required
+def delete_date_exception(exception_id):
+    exception = db.session.get(DateException, exception_id) or abort(404)
+    db.session.delete(exception)
+    db.session.commit()
+    logger.info(f"Date exception deleted: ID:{exception_id}")
+    return jsonify({'success': True})
+
+@app.route('/date_exceptions/today', methods=['GET'])
+@login_required
+def get_today_exception():
+    """Report whether today is a skip or override date"""
+    rule = exception_calendar.lookup(datetime.now().date())
+    if rule is None:
+        return jsonify({'exception': None})
+    return jsonify({'exception': {'action': rule.action, 'override_list_id': rule.override_list_id, 'name': rule.name}})
+
+@app.route('/holiday_calendars', methods=['GET'])
+@login_required
+def get_holiday_calendars():
+    calendars = HolidayCalendar.query.all()
+    return jsonify([calendar.to_dict() for calendar in calendars])
+
+@app.route('/holiday_calendars', methods=['POST'])
+@login_required
+def create_holiday_calendar():
+    data = request.json or {}
+    name = data.get('name')
+
+    if not name:
+        return jsonify({'error': 'Name is required'}), 400
+
+    calendar = HolidayCalendar(name=name, is_enabled=data.get('is_enabled', True))
+    db.session.add(calendar)
+    db.session.commit()
+
+    return jsonify({'success': True, 'calendar': calendar.to_dict()})
+
+@app.route('/holiday_calendars/<int:calendar_id>/toggle', methods=['POST'])
+@login_required
+def toggle_holiday_calendar(calendar_id):
+    calendar = db.session.get(HolidayCalendar, calendar_id) or abort(404)
+    calendar.is_enabled = not calendar.is_enabled
+    db.session.commit()
+
+    logger.info(f"Holiday calendar {'enabled' if calendar.is_enabled else 'disabled'}: {calendar.name}")
+    return jsonify({'success': True, 'is_enabled': calendar.is_enabled})
+
+@app.route('/holiday_calendars/<int:calendar_id>', methods=['DELETE'])
+@login_required
+def delete_holiday_calendar(calendar_id):
+    calendar = db.session.get(HolidayCalendar, calendar_id) or abort(404)
+    db.session.delete(calendar)
+    db.session.commit()
+
+    logger.info(f"Deleted holiday calendar: {calendar.name}")
+    return jsonify({'success': True})
+
+@app.route('/journal', methods=['GET'])
+@login_required
+def get_journal():
+    """Most recent execution journal entries, optionally for one schedule"""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    query = ExecutionRecord.query
+    schedule_id = request.args.get('schedule_id', type=int)
+    if schedule_id is not None:
+        query = query.filter_by(schedule_id=schedule_id)
+    records = query.order_by(ExecutionRecord.scheduled_at.desc()).limit(limit).all()
+    return jsonify([record.to_dict() for record in records])
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Prometheus text exposition of every process: this one, the other workers and zone
+    engines (their exported files) and, in the web role, the audio daemon
+    """
+    collections = [metrics.registry.collect(metrics_exporter.labels()),
+                   metrics.collect_exported(exclude_pid=os.getpid())]
+    if PROCESS_ROLE == 'web':
+        collections.append(daemon_client.notify('metrics') or [])
+    body = metrics.render(*collections)
+    response = make_response(body)
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+@app.route('/profiling', methods=['GET'])
+@login_required
+def get_profiling():
+    """Summary of sampled request profiles, merged across worker processes"""
+    if profile_sampler is None:
+        return jsonify({'enabled': False}), 404
+    routes = profile_sampler.load_all()
+    return jsonify({
+        'enabled': True,
+        'routes': {
+            route: {
+                'requests': entry['requests'],
+                'samples': sum(entry['stacks'].values()),
+                'avg_ms': round(entry['wall_seconds'] * 1000 / entry['requests'], 2) if entry['requests'] else None
+            }
+            for route, entry in sorted(routes.items())
+        }
+    })
+
+@app.route('/profiling/<path:route>.folded', methods=['GET'])
+@login_required
+def download_profile(route):
+    """Collapsed stacks for one endpoint, or 'all' with the endpoint as root frame"""
+    if profile_sampler is None:
+        abort(404)
+    routes = profile_sampler.load_all()
+    if route == 'all':
+        body = ''.join(profiling.collapsed_text(entry['stacks'], root=name) for name, entry in sorted(routes.items()))
+    elif route in routes:
+        body = profiling.collapsed_text(routes[route]['stacks'])
+    else:
+        abort(404)
+    response = make_response(body)
+    response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    response.headers['Content-Disposition'] = f'attachment; filename="{route}.folded"'
+    return response
+
+@app.route('/profiling', methods=['DELETE'])
+@login_required
+def reset_profiling():
+    if profile_sampler is None:
+        return jsonify({'enabled': False}), 404
+    profile_sampler.reset()
+    return jsonify({'status': 'success'})
+
+@app.route('/daemon/status')
+@login_required
+def daemon_status():
+    """Report where scheduling runs and whether the audio daemon is reachable"""
+    if PROCESS_ROLE != 'web':
+        return jsonify({
+            'role': PROCESS_ROLE,
+            'scheduler_running': bool(scheduler and scheduler.running),
+            'audio_available': audio_available,
+            'leader': elector.status() if elector else None
+        })
+    try:
+        return jsonify({'role': PROCESS_ROLE, 'daemon': daemon_client.call('status')})
+    except (ConnectionError, RuntimeError) as e:
+        return jsonify({'role': PROCESS_ROLE, 'daemon': None, 'error': str(e)}), 503
+
 @app.route('/get_server_ip')
 @login_required
 def get_server_ip():
@@ -1344,6 +1944,7 @@ def rename_schedule_list(list_id):
     return jsonify({'success': True})
 
 if __name__ == '__main__':
+    create_app()
     logger.info("Starting Audio Scheduler application...")
     
     # Create database tables
@@ -1360,8 +1961,5 @@ if __name__ == '__main__':
     try:
         app.run(debug=True, host='0.0.0.0', port=5000)
     finally:
-        # Ensure scheduler is properly shut down on exit
-        if scheduler is not None:
-            logger.info("Shutting down scheduler...")
-            scheduler.stop()
-            logger.info("Scheduler shut down complete")
\ No newline at end of file
+        # Ensure scheduler is properly shut down (and leadership released) on exit
+        cleanup_scheduler()
\ No newline at end of file
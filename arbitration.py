@@ -0,0 +1,226 @@
+"""
+Output arbitration for overlapping schedules.
+
+Every output - the in-process mixer and each zone engine - has one Arbiter that
+decides which sound owns it. Without one, a bell landing in a playlist block or
+two bells in the same minute raced on pygame.mixer.music, and whichever playback
+thread happened to run last won.
+
+Each schedule has a priority (bells 10 and playlists 0 unless set) and a conflict
+policy that applies when its output is busy:
+
+    preempt  stop what is playing and take the output
+    duck     play on top of it on a mixer channel, with the music lowered to DUCK_GAIN
+    queue    wait until the output is free (at most QUEUE_MAX_WAIT), highest priority first
+    skip     don't play
+
+Preempting and ducking need a strictly higher priority than the sound playing; a
+request that doesn't outrank it is queued instead. So a sound is never interrupted
+by a lesser one, and bells due in the same minute play one after another. Each
+decision compares the request with the current owner under one lock, is taken
+when the schedule fires (not when its playback thread gets to run) and is logged.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger('audio_scheduler.audio')
+
+POLICIES = ('preempt', 'duck', 'queue', 'skip')
+DEFAULT_PRIORITY = {'bell': 10, 'playlist': 0}
+DEFAULT_POLICY = {'bell': 'duck', 'playlist': 'queue'}
+DUCK_GAIN = 0.25  # Music volume factor while a ducking sound plays over it
+QUEUE_MAX_WAIT = 600  # Seconds a queued sound may wait for its output before it is dropped
+
+# Decision -> how it reads in the log
+DECISIONS = {
+    'play': 'plays',
+    'preempt': 'preempts',
+    'duck': 'ducks',
+    'queue': 'is queued behind',
+    'skip': 'is skipped - output busy with',
+    'dequeue': 'plays after waiting',
+    'expire': 'gave up waiting for the output',
+}
+
+
+def kind_of(schedule):
+    return 'playlist' if schedule.schedule_type == 'playlist' else 'bell'
+
+
+def priority_of(schedule):
+    """Effective priority of a schedule (or snapshot entry, which always has the default)"""
+    priority = getattr(schedule, 'priority', None)
+    return priority if priority is not None else DEFAULT_PRIORITY[kind_of(schedule)]
+
+
+def policy_of(schedule):
+    policy = getattr(schedule, 'conflict_policy', None)
+    return policy if policy in POLICIES else DEFAULT_POLICY[kind_of(schedule)]
+
+
+def request_for(schedule):
+    """Arbiter.request() arguments of a schedule; plain values, so they can be sent to a zone engine"""
+    return schedule.id, kind_of(schedule), priority_of(schedule), policy_of(schedule)
+
+
+class Claim:
+    """One sound's claim on an output, from request() until release()"""
+
+    def __init__(self, schedule_id, kind, priority, policy, seq):
+        self.schedule_id = schedule_id
+        self.kind = kind
+        self.priority = priority
+        self.policy = policy
+        self.seq = seq
+        self.decision = None
+        self.granted = False
+        self.overlay = False  # Plays on a mixer channel over the ducked owner instead of the music stream
+        self.volume = 1.0  # Set by the player; the music volume is volume * gain
+        self.gain = 1.0
+        self.deadline = None
+        self.ready = threading.Event()  # Set once the claim is granted or dropped
+        self.cancelled = threading.Event()  # Set when preempted or stopped: the player must let go
+
+    def __lt__(self, other):
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+    def describe(self):
+        return f"schedule {self.schedule_id} ({self.kind}, priority {self.priority}, {self.policy})"
+
+
+class Arbiter:
+    """Decides which claim owns one output; output provides stop() and set_music_volume(volume)"""
+
+    def __init__(self, name, output):
+        self.name = name
+        self.output = output
+        self._lock = threading.Lock()
+        self._owner = None  # On the music stream
+        self._overlay = None  # On a channel, ducking the owner
+        self._queue = []  # Heap of waiting claims, highest priority first
+        self._seq = itertools.count()
+
+    def _decide(self, claim, decision, other=None):
+        claim.decision = decision
+        metrics.ARBITRATION_DECISIONS.inc(decision=decision)
+        if other is None:
+            logger.info("Output %s: %s %s", self.name, claim.describe(), DECISIONS[decision])
+        else:
+            logger.info("Output %s: %s %s %s", self.name, claim.describe(), DECISIONS[decision], other.describe())
+
+    def _grant(self, claim, overlay=False):
+        claim.granted = True
+        claim.overlay = overlay
+        if overlay:
+            self._overlay = claim
+        else:
+            self._owner = claim
+        claim.ready.set()
+
+    def request(self, schedule_id, kind, priority, policy):
+        """Register a sound about to play and decide its fate; returns its Claim"""
+        claim = Claim(schedule_id, kind, priority, policy, next(self._seq))
+        with self._lock:
+            front = self._overlay or self._owner
+            playing = [c for c in (self._owner, self._overlay) if c is not None]
+            if front is None:
+                self._decide(claim, 'play')
+                self._grant(claim)
+            elif policy == 'skip':
+                self._decide(claim, 'skip', front)
+                claim.ready.set()
+            elif policy == 'preempt' and all(priority > c.priority for c in playing):
+                for current in playing:
+                    current.cancelled.set()
+                self._owner = self._overlay = None
+                self.output.stop()
+                self._decide(claim, 'preempt', front)
+                self._grant(claim)
+            elif policy == 'duck' and self._overlay is None and priority > self._owner.priority:
+                self._owner.gain = DUCK_GAIN
+                self.output.set_music_volume(self._owner.volume * DUCK_GAIN)
+                self._decide(claim, 'duck', self._owner)
+                self._grant(claim, overlay=True)
+            else:
+                claim.deadline = time.monotonic() + QUEUE_MAX_WAIT
+                heapq.heappush(self._queue, claim)
+                self._decide(claim, 'queue', front)
+        return claim
+
+    def wait(self, claim):
+        """Block until the claim owns the output; False if it was skipped, expired or cancelled"""
+        timeout = None if claim.deadline is None else max(0.0, claim.deadline - time.monotonic())
+        if not claim.ready.wait(timeout):
+            with self._lock:
+                if not claim.ready.is_set():
+                    claim.cancelled.set()  # Popped and discarded by _grant_next
+                    claim.ready.set()
+                    self._decide(claim, 'expire')
+        return claim.granted and not claim.cancelled.is_set()
+
+    def release(self, claim):
+        """The claim's sound has finished (or will never play); safe to call more than once"""
+        with self._lock:
+            if claim is self._overlay:
+                self._overlay = None
+                self._grant_next()  # A queued ducking sound keeps the music down
+                if self._overlay is None and self._owner is not None:
+                    self._owner.gain = 1.0
+                    self.output.set_music_volume(self._owner.volume)
+                return
+            elif claim is self._owner:
+                self._owner = None
+            else:
+                claim.cancelled.set()  # Still queued, or already preempted
+                claim.ready.set()
+                return
+            self._grant_next()
+
+    def _grant_next(self):
+        """Hand the free output - or the free overlay, to a sound that may duck the owner - to the best waiting claim"""
+        if self._overlay is not None:
+            return
+        while self._queue:
+            claim = self._queue[0]
+            if claim.cancelled.is_set():
+                heapq.heappop(self._queue)
+                continue
+            if time.monotonic() > claim.deadline:
+                heapq.heappop(self._queue)
+                claim.cancelled.set()
+                claim.ready.set()
+                self._decide(claim, 'expire')
+                continue
+            if self._owner is None:
+                heapq.heappop(self._queue)
+                self._decide(claim, 'dequeue')
+                self._grant(claim)
+            elif claim.policy == 'duck' and claim.priority > self._owner.priority:
+                heapq.heappop(self._queue)
+                self._decide(claim, 'duck', self._owner)  # After waiting for the overlay
+                self._grant(claim, overlay=True)
+            return
+
+    def stop_all(self):
+        """Stop everything on the output and drop the queue (manual stop)"""
+        with self._lock:
+            claims = [c for c in (self._owner, self._overlay) if c is not None] + self._queue
+            self._owner = self._overlay = None
+            self._queue = []
+            for claim in claims:
+                claim.cancelled.set()
+                claim.ready.set()
+            self.output.stop()
+
+    def status(self):
+        with self._lock:
+            return {
+                'owner': self._owner.describe() if self._owner else None,
+                'overlay': self._overlay.describe() if self._overlay else None,
+                'queued': len([c for c in self._queue if not c.cancelled.is_set()])
+            }
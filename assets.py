@@ -0,0 +1,156 @@
+"""
+Build-free static asset pipeline.
+
+At startup every file under static/ is read once, fingerprinted with a content
+hash (style.css -> style.3f2a9c1b7d4e.css) and, for text formats, pre-compressed
+with gzip and - when the optional brotli package is installed - brotli. The
+variants are kept in memory and served from /assets/ with
+"Cache-Control: immutable", so a repeat visit downloads nothing. Templates call
+asset_url('style.css') to get the hashed URL.
+
+File changes are picked up by re-scanning static/ at most every RESCAN_SECONDS.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import pathlib
+import threading
+import time
+
+from flask import make_response
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip alone already covers every browser
+    brotli = None
+
+logger = logging.getLogger('audio_scheduler')
+
+COMPRESSIBLE_SUFFIXES = {'.js', '.css', '.svg', '.json', '.html', '.txt'}
+MIN_COMPRESS_SIZE = 256
+RESCAN_SECONDS = 2.0
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class Asset:
+    """One file with its fingerprint and pre-compressed variants"""
+    __slots__ = ('path', 'content_type', 'fingerprint', 'etag', 'variants', 'mtime')
+
+    def __init__(self, path, body, content_type, mtime=None):
+        self.path = path
+        self.content_type = content_type
+        self.fingerprint = hashlib.sha256(body).hexdigest()[:12]
+        self.etag = f'"{self.fingerprint}"'
+        self.variants = compress_variants(body, pathlib.PurePath(path).suffix in COMPRESSIBLE_SUFFIXES)
+        self.mtime = mtime
+
+    @property
+    def hashed_path(self):
+        stem, dot, suffix = self.path.rpartition('.')
+        return f"{stem}.{self.fingerprint}.{suffix}" if dot else f"{self.path}.{self.fingerprint}"
+
+
+def compress_variants(body, compressible=True):
+    """{'identity': ..., 'gzip': ..., 'br': ...}; compressed variants only when they are smaller"""
+    variants = {'identity': body}
+    if not compressible or len(body) < MIN_COMPRESS_SIZE:
+        return variants
+    gz = gzip.compress(body, compresslevel=9, mtime=0)
+    if len(gz) < len(body):
+        variants['gzip'] = gz
+    if brotli is not None:
+        br = brotli.compress(body, quality=11)
+        if len(br) < len(body):
+            variants['br'] = br
+    return variants
+
+
+def negotiate(variants, accept_encoding):
+    """Pick the smallest variant the client accepts; returns (encoding, body)"""
+    for encoding in ('br', 'gzip'):
+        if encoding in variants and encoding in accept_encoding:
+            return encoding, variants[encoding]
+    return 'identity', variants['identity']
+
+
+def send_variants(request, variants, content_type, etag, cache_control):
+    """Flask response for pre-compressed content with conditional GET support"""
+    if request.if_none_match.contains(etag.strip('"')):
+        response = make_response('', 304)
+    else:
+        encoding, body = negotiate(variants, request.accept_encodings)
+        response = make_response(body)
+        response.headers['Content-Type'] = content_type
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+class AssetManifest:
+    def __init__(self, static_folder):
+        self.static_folder = pathlib.Path(static_folder)
+        self._lock = threading.Lock()
+        self._assets = {}  # relative path -> Asset
+        self._by_hashed = {}  # hashed relative path -> Asset
+        self._next_scan = 0  # The first url() or lookup() scans
+
+    def scan(self):
+        """Fingerprint and compress new or changed files"""
+        assets = {}
+        for file_path in sorted(self.static_folder.rglob('*')):
+            if not file_path.is_file() or file_path.name.startswith('.'):
+                continue
+            relative = file_path.relative_to(self.static_folder).as_posix()
+            mtime = file_path.stat().st_mtime_ns
+            current = self._assets.get(relative)
+            if current is not None and current.mtime == mtime:
+                assets[relative] = current
+                continue
+            content_type = mimetypes.guess_type(relative)[0] or 'application/octet-stream'
+            if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json', 'image/svg+xml'):
+                content_type += '; charset=utf-8'
+            assets[relative] = Asset(relative, file_path.read_bytes(), content_type, mtime)
+        changed = [path for path, asset in assets.items() if self._assets.get(path) is not asset]
+        with self._lock:
+            self._assets = assets
+            self._by_hashed = {asset.hashed_path: asset for asset in assets.values()}
+        if changed:
+            logger.info("Fingerprinted %s static assets%s", len(changed), ' (brotli enabled)' if brotli else '')
+
+    def refresh(self):
+        now = time.monotonic()
+        if now < self._next_scan:
+            return
+        self._next_scan = now + RESCAN_SECONDS
+        try:
+            self.scan()
+        except OSError as e:
+            logger.error("Could not rescan static assets: %s", e)
+
+    def url(self, path):
+        """Hashed URL for a static file, or the plain /static URL if it is unknown"""
+        self.refresh()
+        asset = self._assets.get(path)
+        if asset is None:
+            return f"/static/{path}"
+        return f"/assets/{asset.hashed_path}"
+
+    def lookup(self, requested):
+        """(asset, exact) for a hashed or plain path; exact is False for a stale fingerprint"""
+        if not self._next_scan:
+            self.refresh()
+        asset = self._by_hashed.get(requested)
+        if asset is not None:
+            return asset, True
+        asset = self._assets.get(requested)
+        if asset is None:
+            # Stale fingerprint: strip it and serve the current content
+            stem, dot, suffix = requested.rpartition('.')
+            base = stem.rpartition('.')[0]
+            asset = self._assets.get(f"{base}.{suffix}") if base else None
+        return asset, False
+
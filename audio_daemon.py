@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Standalone audio daemon for Audio Scheduler.
+
+Runs the scheduler and the playback engines in their own process, isolated from the
+web tier. Gunicorn can then run many workers with AUDIO_SCHEDULER_ROLE=web, and a
+slow request or a worker killed by --timeout never delays or cuts off a bell.
+
+The two tiers share the SQLite database; the web tier sends control messages
+(status, invalidate) over the Unix socket in daemon_rpc.py.
+
+Usage:
+    python audio_daemon.py
+    AUDIO_SCHEDULER_ROLE=web gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+"""
+import os
+import sys
+import pathlib
+import threading
+import time
+
+# Ensure the app root is in the path
+APP_ROOT = pathlib.Path(__file__).resolve().parent
+if str(APP_ROOT) not in sys.path:
+    sys.path.insert(0, str(APP_ROOT))
+
+
+def main():
+    # Imports stay inside main(): spawned zone workers re-import this module and must not start a scheduler
+    os.environ['AUDIO_SCHEDULER_ROLE'] = 'daemon'
+    os.environ.pop('WERKZEUG_RUN_MAIN', None)
+
+    # Fire bells from the compiled schedule snapshot while the app below is still loading
+    from snapshot import start_fast_path
+    fast_path = start_fast_path()
+
+    import app as web
+    from app import db, logger, init_schedules
+    from daemon_rpc import DaemonServer
+    from date_exceptions import exception_calendar
+    from models import Zone
+    from zones import zone_manager
+    import metrics
+
+    app = web.create_app(fast_path=fast_path)
+    scheduler, elector = web.scheduler, web.elector  # Created by create_app()
+
+    logger.info("Starting Audio Scheduler daemon...")
+
+    with app.app_context():
+        db.create_all()
+        logger.info("Database tables created/verified (daemon startup)")
+    init_schedules()
+
+    started_at = time.time()
+
+    def status():
+        with app.app_context():
+            zones = {zone.name: zone_manager.status(zone.id) for zone in Zone.query.all()}
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - started_at, 1),
+            'scheduler_running': bool(scheduler and scheduler.running and scheduler.thread and scheduler.thread.is_alive()),
+            'leader': elector.status() if elector else None,
+            'audio_available': web.audio_available,
+            'active_threads': threading.active_count(),
+            'zones': zones,
+            'output': web.output_arbiter.status(),
+            'pcm_cache': web.pcm_cache.stats()
+        }
+
+    def invalidate():
+        exception_calendar.invalidate()
+        logger.info("Daemon caches invalidated by web tier")
+        return True
+
+    def stop_playback():
+        if web.audio_available:
+            web.output_arbiter.stop_all()  # Also drops sounds queued for the output
+        with app.app_context():
+            for zone in Zone.query.all():
+                zone_manager.stop(zone)
+        return True
+
+    server = DaemonServer()
+    server.register('ping', lambda: 'pong')
+    server.register('status', status)
+    server.register('invalidate', invalidate)
+    server.register('stop_playback', stop_playback)
+    server.register('metrics', lambda: metrics.registry.collect({'process': 'daemon'}))
+    server.start()
+
+    try:
+        # SIGINT/SIGTERM are handled by app.py, which stops the scheduler and exits
+        while True:
+            time.sleep(3600)
+    finally:
+        server.stop()
+        logger.info("Audio Scheduler daemon stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,441 @@
+"""
+Content-addressed, deduplicated audio store.
+
+Every audio file is identified by the sha256 of its content. The names users see -
+uploads/<name> and playlists/<folder>/<file> - are plain files, so playback,
+previews and playlist folders keep working on plain paths. The audio_file table
+maps each name to its hash, and Schedule.audio_hash records the content a schedule
+was created with.
+
+Each content is kept on disk once. Where the filesystem can share blocks
+copy-on-write (btrfs, XFS) the content also gets a blob, uploads/.blobs/<aa>/<sha256>,
+as a reflink of its name that costs no extra space; names uploaded with content
+that is already stored are reflinks of that blob. Elsewhere (ext4, FAT) there are
+no blobs: a name is the content's only copy, and lookups by hash (content_path())
+use any name whose size and mtime still match what was hashed.
+
+Names are never hard links: copying a new file over a name, an SMB/SFTP overwrite
+or a tag editor writes in place, and through a shared inode that would change every
+other name with the same content. sync() notices a changed name by its size and
+mtime, hashes it again and records it against its new content. Links made by
+earlier versions are split on the next sync.
+
+Content is referenced by its names (mirrored in audio_file) and by schedules.
+collect_garbage() removes blobs nothing references any more. If a scheduled name
+disappears, playback falls back to the blob or to another name with the same
+content, so a bell survives its file being renamed - and, where there are blobs,
+deleted. Caches keyed by the hash (durations, decoded audio) stay valid across
+renames.
+
+Re-uploading different content under a name that schedules use no longer replaces
+it; the upload is stored under a free name ("bell (2).mp3") instead.
+"""
+import errno
+import hashlib
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflinks, files are copied
+    fcntl = None
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, Schedule, AudioFile
+
+logger = logging.getLogger('audio_scheduler')
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.m4a', '.flac')
+CHUNK_SIZE = 1024 * 1024
+GC_GRACE_SECONDS = 3600  # Never collect a blob younger than this (an upload may be linking it)
+FICLONE = 0x40049409  # Linux ioctl: make the destination share the source's blocks
+_NO_REFLINK_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOTTY)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_name(filename):
+    """Raise ValueError unless filename is a plain file name (no folders, not hidden)"""
+    if not filename or filename.startswith('.') or any(c in filename for c in '/\\\0'):
+        raise ValueError(f"invalid file name: {filename!r}")
+
+
+class AudioStore:
+    def __init__(self, upload_folder, playlists_folder=None):
+        self.roots = {'uploads': pathlib.Path(upload_folder)}
+        if playlists_folder is not None:
+            self.roots['playlists'] = pathlib.Path(playlists_folder)
+        self.blob_dir = self.roots['uploads'] / '.blobs'
+        self._reflinks = {}  # st_dev -> whether that filesystem can reflink
+        self._sync_lock = threading.Lock()
+        self._maintenance = None
+        self._stop = threading.Event()
+
+    # --- Blobs -----------------------------------------------------------------
+
+    def blob_path(self, blob_hash):
+        return self.blob_dir / blob_hash[:2] / blob_hash
+
+    def _tmp_dir(self):
+        tmp = self.blob_dir / 'tmp'
+        tmp.mkdir(parents=True, exist_ok=True)
+        return tmp
+
+    def _reflink(self, src, dst):
+        """Make the open file dst share src's blocks; False where the filesystem can't"""
+        device = os.fstat(dst.fileno()).st_dev
+        if fcntl is None or self._reflinks.get(device) is False:
+            return False
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError as e:
+            if e.errno not in _NO_REFLINK_ERRNOS:
+                raise
+            logger.info("Reflinks not supported for %s (%s) - audio content is kept once, in its names",
+                        dst.name, e)
+            self._reflinks[device] = False
+            return False
+        self._reflinks[device] = True
+        return True
+
+    def can_reflink(self):
+        """Whether the uploads filesystem can share blocks between files (probed once)"""
+        folder = self._tmp_dir()
+        device = os.stat(folder).st_dev
+        if device not in self._reflinks:
+            with tempfile.TemporaryFile(dir=folder) as src, tempfile.TemporaryFile(dir=folder) as dst:
+                src.write(b'\0')
+                src.flush()
+                self._reflink(src, dst)
+                self._reflinks.setdefault(device, False)
+        return self._reflinks[device]
+
+    def _clone(self, source, dest):
+        """Atomically make dest an independent copy of source, sharing its blocks where possible"""
+        dest = pathlib.Path(dest)
+        fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix='.clone-')
+        try:
+            with open(source, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                if not self._reflink(src, dst):
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            shutil.copystat(source, tmp_name)
+            os.replace(tmp_name, dest)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def _share(self, path, blob_hash):
+        """Make the blob for blob_hash a reflink of path; without reflinks there is no blob and None is returned"""
+        blob = self.blob_path(blob_hash)
+        if blob.exists():
+            return blob
+        if not self.can_reflink():
+            return None
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=blob.parent, prefix='.clone-')
+        try:
+            with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                shared = self._reflink(src, dst)
+            if not shared:
+                return None
+            os.utime(tmp_name)  # Age the blob from now, not from the name's mtime, for the GC grace period
+            os.replace(tmp_name, blob)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+        return blob
+
+    def _split_link(self, path, stat, blob_hash, inodes):
+        """
+        Give a name hard-linked (by earlier versions) to its blob or to another name an
+        inode of its own; inodes maps (st_dev, st_ino) to the first name seen with it
+        """
+        key = (stat.st_dev, stat.st_ino)
+        if key in inodes:
+            self._clone(inodes[key], path)
+            return True
+        inodes[key] = path
+        blob = self.blob_path(blob_hash)
+        if blob.exists() and os.path.samefile(path, blob):
+            # The name keeps the inode; the blob becomes a reflink of it, or goes
+            blob.unlink()
+            self._share(path, blob_hash)
+            return True
+        return False
+
+    # --- Uploads ---------------------------------------------------------------
+
+    def _is_referenced(self, filename):
+        return db.session.query(Schedule.id).filter(Schedule.filename == filename).first() is not None
+
+    def _free_name(self, filename):
+        folder = self.roots['uploads']
+        stem, suffix = os.path.splitext(filename)
+        n = 2
+        while (folder / f"{stem} ({n}){suffix}").exists() or self._is_referenced(f"{stem} ({n}){suffix}"):
+            n += 1
+        return f"{stem} ({n}){suffix}"
+
+    def store_upload(self, stream, filename):
+        """
+        Store an uploaded stream under uploads/<filename>. Returns (stored name, blob hash, deduplicated).
+        Needs an app context; commits the audio_file row. Raises ValueError for a name with
+        path separators or a leading dot, which could otherwise write outside uploads/.
+        """
+        check_name(filename)
+        digest = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=self._tmp_dir(), prefix='upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            blob_hash = digest.hexdigest()
+            deduplicated = self.content_path(blob_hash) is not None
+
+            target = self.roots['uploads'] / filename
+            current = hash_file(target) if target.exists() else None
+            if current is not None and current != blob_hash and self._is_referenced(filename):
+                # Don't change what live schedules play - keep both versions
+                new_name = self._free_name(filename)
+                logger.info("Upload %s differs from the scheduled file; stored as %s", filename, new_name)
+                filename, current = new_name, None
+                target = self.roots['uploads'] / filename
+            if current != blob_hash:
+                blob = self.blob_path(blob_hash)
+                if blob.exists():
+                    self._clone(blob, target)  # A reflink: the content stays stored once
+                else:
+                    self._share(tmp_name, blob_hash)
+                    os.replace(tmp_name, target)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+        self._record('uploads', filename, target, blob_hash)
+        db.session.commit()
+        return filename, blob_hash, deduplicated
+
+    def _record(self, root, name, path, blob_hash):
+        stat = os.stat(path)
+        row = AudioFile.query.filter_by(root=root, name=name).first()
+        if row is None:
+            row = AudioFile(root=root, name=name)
+            db.session.add(row)
+        elif row.blob_hash != blob_hash and root == 'uploads':
+            # The name now holds other content: schedules that followed the name follow it
+            Schedule.query.filter_by(filename=name, audio_hash=row.blob_hash).update(
+                {'audio_hash': blob_hash}, synchronize_session=False)
+        row.blob_hash = blob_hash
+        row.size = stat.st_size
+        row.mtime_ns = stat.st_mtime_ns
+        return row
+
+    # --- Lookups ---------------------------------------------------------------
+
+    def hash_for_name(self, filename, session=None):
+        session = session or db.session
+        return session.execute(
+            select(AudioFile.blob_hash).where(AudioFile.root == 'uploads', AudioFile.name == filename)
+        ).scalar()
+
+    def _name_with(self, blob_hash):
+        """A name that still holds the content blob_hash (unchanged since it was hashed), or None"""
+        for row in AudioFile.query.filter_by(blob_hash=blob_hash).all():
+            if row.root not in self.roots:
+                continue
+            path = self.roots[row.root] / row.name
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if stat.st_size == row.size and stat.st_mtime_ns == row.mtime_ns:
+                return path
+        return None
+
+    def content_path(self, blob_hash):
+        """A file with the content blob_hash - its blob, or else a name holding it - or None (needs an app context)"""
+        blob = self.blob_path(blob_hash)
+        if blob.exists():
+            return blob
+        return self._name_with(blob_hash)
+
+    def resolve(self, filename, audio_hash=None):
+        """Path to play for a schedule: its file, or its stored content if the file is gone"""
+        if filename:
+            path = self.roots['uploads'] / filename
+            if path.exists():
+                return path
+        if audio_hash:
+            path = self.content_path(audio_hash)
+            if path is not None:
+                logger.warning("%s is missing - playing its stored content %s", filename, audio_hash[:12])
+                return path
+        return None
+
+    # --- Maintenance -----------------------------------------------------------
+
+    def _walk(self, root):
+        folder = self.roots[root]
+        if not folder.exists():
+            return
+        if root == 'uploads':
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith('.'):
+                        yield entry.name, pathlib.Path(entry.path)
+        else:
+            for path in folder.rglob('*'):
+                if path.is_file() and path.suffix.lower() in AUDIO_EXTENSIONS:
+                    yield path.relative_to(folder).as_posix(), path
+
+    def sync(self):
+        """
+        Bring the store in line with the folders: hash new or changed files, give
+        their content a blob where reflinks make that free, drop rows of deleted names
+        and backfill Schedule.audio_hash. Unchanged files (same size and mtime) are not re-read.
+        """
+        with self._sync_lock:
+            hashed = linked = split = 0
+            inodes = {}
+            for root in self.roots:
+                rows = {row.name: row for row in AudioFile.query.filter_by(root=root).all()}
+                seen = set()
+                for name, path in self._walk(root):
+                    seen.add(name)
+                    stat = path.stat()
+                    row = rows.get(name)
+                    if row is not None and row.size == stat.st_size and row.mtime_ns == stat.st_mtime_ns:
+                        if stat.st_nlink > 1 and self._split_link(path, stat, row.blob_hash, inodes):
+                            split += 1
+                            self._record(root, name, path, row.blob_hash)
+                        continue
+                    blob_hash = hash_file(path)
+                    hashed += 1
+                    if self.blob_path(blob_hash).exists():
+                        linked += 1
+                    if stat.st_nlink > 1 and self._split_link(path, stat, blob_hash, inodes):
+                        split += 1
+                    self._share(path, blob_hash)
+                    self._record(root, name, path, blob_hash)
+                for name, row in rows.items():
+                    if name not in seen:
+                        db.session.delete(row)
+
+            for schedule in Schedule.query.filter(Schedule.audio_hash.is_(None), Schedule.filename.isnot(None)).all():
+                schedule.audio_hash = self.hash_for_name(schedule.filename)
+            db.session.commit()
+        if hashed:
+            logger.info("Audio store sync: hashed %s files, deduplicated %s", hashed, linked)
+        if split:
+            logger.info("Audio store sync: gave %s hard-linked files their own copy", split)
+        return {'hashed': hashed, 'deduplicated': linked, 'split': split}
+
+    def refcounts(self):
+        """blob hash -> number of names and schedules referencing it"""
+        counts = {}
+        for (blob_hash,) in db.session.query(AudioFile.blob_hash).all():
+            counts[blob_hash] = counts.get(blob_hash, 0) + 1
+        for (blob_hash,) in db.session.query(Schedule.audio_hash).filter(Schedule.audio_hash.isnot(None)).all():
+            counts[blob_hash] = counts.get(blob_hash, 0) + 1
+        return counts
+
+    def _blobs(self):
+        if not self.blob_dir.exists():
+            return
+        for prefix in self.blob_dir.iterdir():
+            if prefix.is_dir() and len(prefix.name) == 2:
+                for blob in prefix.iterdir():
+                    yield blob
+
+    def collect_garbage(self, grace_seconds=GC_GRACE_SECONDS):
+        """
+        Delete blobs that no name and no schedule references - and, without reflinks,
+        blobs (left by earlier versions) that are only a second copy of a name
+        """
+        refcounts = self.refcounts()
+        reflinks = self.can_reflink()
+        removed = freed = 0
+        now = time.time()
+        for blob in self._blobs():
+            stat = blob.stat()
+            # st_nlink > 1: a name from before names had their own inode still links here
+            if stat.st_nlink > 1 or now - stat.st_mtime < grace_seconds:
+                continue
+            if refcounts.get(blob.name) and (reflinks or self._name_with(blob.name) is None):
+                continue
+            blob.unlink()
+            removed += 1
+            freed += stat.st_size
+        if removed:
+            logger.info("Audio store GC removed %s blobs (%.1f MB)", removed, freed / 1024 / 1024)
+        return {'removed': removed, 'freed_bytes': freed}
+
+    def stats(self):
+        blobs = list(self._blobs())
+        stored = sum(blob.stat().st_size for blob in blobs)
+        logical = db.session.query(db.func.coalesce(db.func.sum(AudioFile.size), 0)).scalar()
+        refcounts = self.refcounts()
+        return {
+            'blobs': len(blobs),
+            'names': AudioFile.query.count(),
+            'stored_bytes': stored,
+            'logical_bytes': int(logical),
+            # Blobs only exist as reflinks, so names share their blocks
+            'saved_bytes': max(0, int(logical) - stored) if stored else 0,
+            'unreferenced_blobs': sum(1 for blob in blobs if not refcounts.get(blob.name))
+        }
+
+    def start_maintenance(self, app, interval=24 * 3600, initial_delay=10, after_sync=None):
+        """Periodic sync + GC in the process that owns the scheduler; after_sync() runs in the same app context"""
+        if self._maintenance is not None and self._maintenance.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            delay = initial_delay
+            while not self._stop.wait(delay):
+                delay = interval
+                try:
+                    with app.app_context():
+                        self.sync()
+                        self.collect_garbage()
+                        if after_sync is not None:
+                            after_sync()
+                except Exception as e:
+                    logger.error("Audio store maintenance error: %s", e, exc_info=True)
+
+        self._maintenance = threading.Thread(target=run, daemon=True, name="AudioStoreMaintenance")
+        self._maintenance.start()
+
+    def stop_maintenance(self):
+        self._stop.set()
+
+
+@event.listens_for(Session, 'before_flush')
+def record_schedule_audio_hash(session, flush_context, instances):
+    """Stamp new schedules, and schedules whose file changed, with the file's content hash"""
+    changed = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Schedule) and obj.filename and
+        (obj in session.new or inspect(obj).attrs.filename.history.has_changes())
+    ]
+    if not changed:
+        return
+    with session.no_autoflush:
+        for schedule in changed:
+            schedule.audio_hash = session.execute(
+                select(AudioFile.blob_hash).where(AudioFile.root == 'uploads', AudioFile.name == schedule.filename)
+            ).scalar()
@@ -1,19 +1,150 @@
 from functools import wraps
 from flask import session, redirect, url_for
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from collections import deque
 import hashlib
+import hmac
+import json
+import logging
 import os
+import threading
+import time
+
+logger = logging.getLogger('audio_scheduler.auth')
 
 # File to store credentials
 CREDENTIALS_FILE = 'credentials.json'
 
+PBKDF2_ITERATIONS = 100000
+
+# PBKDF2 runs on a small dedicated pool (hashlib releases the GIL while hashing), so a
+# burst of logins uses at most this many cores and can't starve the schedule API
+HASH_WORKERS = int(os.environ.get('AUDIO_SCHEDULER_AUTH_WORKERS', 1))
+MAX_PENDING_HASHES = 4  # Further attempts are refused instead of queueing up
+HASH_TIMEOUT = 10
+
+# Failed logins allowed per client address within the window
+MAX_FAILED_LOGINS = 5
+FAILED_LOGIN_WINDOW = 300
+
+
+class AuthBusy(Exception):
+    """Too many password checks already in flight"""
+
+
+class RateLimited(Exception):
+    """Client exceeded the failed login limit"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed login attempts, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CredentialStore:
+    """Parsed credentials cached in memory, reloaded only when the file changes on disk"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None  # (mtime_ns, size) of the loaded file
+        self._credentials = None  # (username, salt + key)
+
+    def get(self):
+        """(username, stored hash) or None if the file is missing or invalid"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature != self._signature:
+                self._credentials = self._load()
+                self._signature = signature
+            return self._credentials
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            stored = bytes.fromhex(data['password'])
+            if not data['username'] or len(stored) <= 32:
+                raise ValueError("empty username or truncated hash")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Invalid credentials file %s: %s", self.path, e)
+            return None
+        logger.info("Loaded credentials from %s", self.path)
+        return data['username'], stored
+
+    def save(self, username, hashed):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'username': username, 'password': hashed.hex()}, f)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._signature = None  # Reload (and re-validate) on next access
+
+
+class LoginRateLimiter:
+    """Sliding window of failed attempts per client address"""
+
+    MAX_CLIENTS = 10000
+
+    def __init__(self, max_failures=MAX_FAILED_LOGINS, window=FAILED_LOGIN_WINDOW):
+        self.max_failures = max_failures
+        self.window = window
+        self._failures = {}  # client -> deque of failure timestamps
+        self._lock = threading.Lock()
+
+    def check(self, client):
+        """Raise RateLimited if the client has to wait before trying again"""
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(client)
+            if not failures:
+                return
+            while failures and failures[0] <= now - self.window:
+                failures.popleft()
+            if len(failures) >= self.max_failures:
+                raise RateLimited(int(failures[0] + self.window - now) + 1)
+
+    def record(self, client, success):
+        with self._lock:
+            if success:
+                self._failures.pop(client, None)
+                return
+            if client not in self._failures and len(self._failures) >= self.MAX_CLIENTS:
+                # Forget the client whose last failure is oldest
+                oldest = min(self._failures, key=lambda key: self._failures[key][-1] if self._failures[key] else 0)
+                del self._failures[oldest]
+            self._failures.setdefault(client, deque(maxlen=self.max_failures)).append(time.monotonic())
+
+
+credential_store = CredentialStore(CREDENTIALS_FILE)
+login_limiter = LoginRateLimiter()
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='PasswordHash')
+_hash_slots = threading.BoundedSemaphore(MAX_PENDING_HASHES)
+
+
+def _run_hash(func, *args):
+    """Run a PBKDF2 operation on the bounded pool; raises AuthBusy when it is saturated"""
+    if not _hash_slots.acquire(blocking=False):
+        raise AuthBusy("Too many concurrent password checks")
+    try:
+        future = _hash_pool.submit(func, *args)
+    except Exception:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        raise AuthBusy("Password check timed out")
+
 def init_credentials():
     """Initialize default credentials if they don't exist"""
-    print("Checking for credentials file...") # Debug log
-    if not os.path.exists(CREDENTIALS_FILE):
-        print("Creating new credentials file with default admin/admin") # Debug log
+    if credential_store.get() is None and not os.path.exists(CREDENTIALS_FILE):
+        logger.warning("Creating new credentials file with default admin/admin")
         set_credentials('admin', 'admin')
-    else:
-        print("Credentials file already exists") # Debug log
 
 def hash_password(password):
     """Hash password with salt"""
@@ -22,7 +153,7 @@ def hash_password(password):
         'sha256',
         password.encode('utf-8'),
         salt,
-        100000
+        PBKDF2_ITERATIONS
     )
     return salt + key
 
@@ -34,42 +165,42 @@ def verify_password(stored_password, provided_password):
         'sha256',
         provided_password.encode('utf-8'),
         salt,
-        100000
+        PBKDF2_ITERATIONS
     )
-    return key == new_key
+    return hmac.compare_digest(key, new_key)
 
 def set_credentials(username, password):
     """Save new credentials"""
-    import json
-    hashed = hash_password(password)
-    credentials = {
-        'username': username,
-        'password': hashed.hex()  # Convert bytes to hex string for JSON storage
-    }
-    with open(CREDENTIALS_FILE, 'w') as f:
-        json.dump(credentials, f)
-    print(f"Credentials saved: {credentials}")  # Debug log
-
-def check_credentials(username, password):
-    """Check if credentials are valid"""
-    import json
-    try:
-        if not os.path.exists(CREDENTIALS_FILE):
-            print(f"Credentials file not found at {CREDENTIALS_FILE}") # Debug log
-            init_credentials()
-            
-        with open(CREDENTIALS_FILE, 'rb') as f:
-            content = f.read().decode('utf-8')
-            print(f"Read credentials file: {content}") # Debug log
-            credentials = json.loads(content)
-            stored_username = credentials['username']
-            stored_password = bytes.fromhex(credentials['password']) # Convert from hex string
-            print(f"Stored username: {stored_username}") # Debug log
-            return (username == stored_username and 
-                    verify_password(stored_password, password))
-    except:
+    credential_store.save(username, _run_hash(hash_password, password))
+    logger.info("Credentials saved for user: %s", username)
+
+def check_credentials(username, password, client=None):
+    """Check if credentials are valid.
+
+    With a client address, failed attempts are rate limited (raises RateLimited).
+    Raises AuthBusy when the hashing pool is saturated.
+    """
+    if client is not None:
+        login_limiter.check(client)
+    if not isinstance(username, str) or not isinstance(password, str):
         return False
 
+    credentials = credential_store.get()
+    if credentials is None:
+        init_credentials()
+        credentials = credential_store.get()
+        if credentials is None:
+            return False
+
+    stored_username, stored_password = credentials
+    # The password is hashed even for a wrong username, so the response time doesn't reveal it
+    user_ok = hmac.compare_digest(username.encode('utf-8'), stored_username.encode('utf-8'))
+    password_ok = _run_hash(verify_password, stored_password, password)
+    valid = user_ok and password_ok
+    if client is not None:
+        login_limiter.record(client, valid)
+    return valid
+
 def login_required(f):
     """Decorator to require login for routes"""
     @wraps(f)
@@ -77,4 +208,4 @@ def login_required(f):
         if 'logged_in' not in session:
             return redirect(url_for('login'))
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+HTTP load test and latency benchmark.
+
+Seeds a throw-away data directory (SQLite database, uploads, playlist folders,
+credentials) with configurable volumes, then drives the dashboard's endpoints
+concurrently - through Flask's test client in this process, or over HTTP against
+a local Gunicorn - and reports throughput and p50/p95/p99 latency per endpoint.
+Nothing in the real database, uploads/ or playlists/ is touched.
+
+Usage:
+    python bench_http.py                                  # test client, default volumes
+    python bench_http.py --schedules 5000 --uploads 2000 --concurrency 16
+    python bench_http.py --gunicorn --workers 4           # real server (AUDIO_SCHEDULER_ROLE=web)
+    python bench_http.py --output baseline.json
+    python bench_http.py --compare baseline.json          # fails on latency/throughput regressions
+
+Exits with 1 if an endpoint regressed against --compare by more than --tolerance.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+USERNAME, PASSWORD = 'bench', 'bench-password'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lists', type=int, default=10, help='Schedule lists (default 10)')
+    parser.add_argument('--schedules', type=int, default=1000, help='Schedules, spread over the lists (default 1000)')
+    parser.add_argument('--uploads', type=int, default=300, help='Files in uploads/ (default 300)')
+    parser.add_argument('--upload-kb', type=int, default=64, help='Size of each upload in KB (default 64)')
+    parser.add_argument('--playlists', type=int, default=20, help='Playlist folders (default 20)')
+    parser.add_argument('--playlist-files', type=int, default=15, help='Files per playlist folder (default 15)')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint (default 200)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients (default 8)')
+    parser.add_argument('--endpoints', help='Comma-separated subset of endpoints to run')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default 1)')
+    parser.add_argument('--gunicorn', action='store_true', help='Benchmark a local Gunicorn instead of the test client')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn workers (default 2)')
+    parser.add_argument('--threads', type=int, default=4, help='Gunicorn threads per worker (default 4)')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON from --output to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression (default 0.25)')
+    return parser.parse_args()
+
+
+# --- Seeding -------------------------------------------------------------------
+
+def prepare_environment(workdir):
+    """Point the app at the throw-away data directory; must run before importing app"""
+    os.environ['AUDIO_SCHEDULER_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'schedules.db')}"
+    os.environ['AUDIO_SCHEDULER_UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    os.environ['AUDIO_SCHEDULER_PLAYLISTS_FOLDER'] = os.path.join(workdir, 'playlists')
+    os.environ['AUDIO_SCHEDULER_SNAPSHOT'] = os.path.join(workdir, 'schedule.snapshot')
+    os.environ['AUDIO_SCHEDULER_LOCK'] = os.path.join(workdir, 'scheduler.lock')
+    os.environ['AUDIO_SCHEDULER_ROLE'] = 'web'  # HTTP only: no scheduler, no audio device
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    os.chdir(workdir)  # credentials.json is resolved against the working directory
+    if APP_ROOT not in sys.path:
+        sys.path.insert(0, APP_ROOT)
+
+
+def seed(args, workdir, rng):
+    """Create the data set; returns (upload names, schedule ids)"""
+    from auth import set_credentials
+    import app as web
+    from models import db, Schedule, ScheduleList
+
+    set_credentials(USERNAME, PASSWORD)
+
+    uploads = os.path.join(workdir, 'uploads')
+    os.makedirs(uploads, exist_ok=True)
+    payload = os.urandom(args.upload_kb * 1024)
+    names = []
+    for n in range(args.uploads):
+        name = f'bell-{n:05d}.mp3'
+        with open(os.path.join(uploads, name), 'wb') as f:
+            f.write(payload)
+        names.append(name)
+
+    for n in range(args.playlists):
+        folder = os.path.join(workdir, 'playlists', f'playlist-{n:03d}')
+        os.makedirs(folder, exist_ok=True)
+        for track in range(args.playlist_files):
+            with open(os.path.join(folder, f'track-{track:03d}.mp3'), 'wb') as f:
+                f.write(payload[:4096])
+
+    with web.app.app_context():
+        db.create_all()
+        lists = [ScheduleList(name=f'List {n + 1}', is_active=(n == 0)) for n in range(max(1, args.lists))]
+        db.session.add_all(lists)
+        db.session.flush()
+        rows = []
+        for n in range(args.schedules):
+            days = [rng.random() < 0.6 for _ in range(7)]
+            rows.append({
+                'schedule_list_id': lists[n % len(lists)].id,
+                'filename': names[n % len(names)] if names else f'bell-{n}.mp3',
+                'time': f'{rng.randrange(24):02d}:{rng.randrange(60):02d}',
+                'monday': days[0], 'tuesday': days[1], 'wednesday': days[2], 'thursday': days[3],
+                'friday': days[4], 'saturday': days[5], 'sunday': days[6],
+                'volume': 1.0,
+            })
+        if rows:
+            db.session.execute(db.insert(Schedule), rows)
+        db.session.commit()
+        active_ids = [row.id for row in Schedule.query.with_entities(Schedule.id).filter_by(schedule_list_id=lists[0].id)]
+    return names, active_ids
+
+
+# --- Clients -------------------------------------------------------------------
+
+class TestClient:
+    """One logged-in Flask test client (each simulated user has its own cookie jar)"""
+
+    def __init__(self):
+        import app as web
+        self.client = web.app.test_client()
+        with self.client.session_transaction() as session:
+            session['logged_in'] = True
+            session['username'] = USERNAME
+
+    def request(self, method, path, payload=None):
+        response = self.client.open(path, method=method, json=payload)
+        response.get_data()  # Consume streamed bodies (send_file) so the timing includes them
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    """One logged-in HTTP client against a running server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        status = self.request('POST', '/login', {'username': USERNAME, 'password': PASSWORD})
+        if status != 200:
+            raise RuntimeError(f"Login failed with HTTP {status}")
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def start_gunicorn(args, workdir):
+    """Run the app under Gunicorn (web role) in the data directory; returns (process, base URL)"""
+    if shutil.which('gunicorn') is None:
+        sys.exit("gunicorn is not installed (pip install gunicorn)")
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen(
+        ['gunicorn', '-w', str(args.workers), '--threads', str(args.threads), '-b', f'127.0.0.1:{port}',
+         '--chdir', workdir, '--pythonpath', APP_ROOT, '--log-level', 'warning', 'wsgi:app'],
+        env=os.environ.copy()
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"gunicorn exited with {process.returncode}")
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=2).read()
+            return process, base_url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit("gunicorn did not start within 60s")
+
+
+# --- Workload ------------------------------------------------------------------
+
+def endpoints(names, schedule_ids):
+    """name -> function(client, rng) returning the HTTP status"""
+    days = list(range(7))
+
+    def schedule(client, rng):
+        return client.request('POST', '/schedule', {
+            'filename': rng.choice(names),
+            'schedule': [{'time': f'{rng.randrange(24):02d}:{rng.randrange(60):02d}', 'days': rng.sample(days, 3)}]
+        })
+
+    def update_schedule(client, rng):
+        return client.request('POST', f'/update_schedule/{rng.choice(schedule_ids)}', {
+            'time': f'{rng.randrange(24):02d}:{rng.randrange(60):02d}', 'days': rng.sample(days, 4)
+        })
+
+    return {
+        'index': lambda client, rng: client.request('GET', '/'),
+        'get_schedules': lambda client, rng: client.request('GET', '/get_schedules'),
+        'schedule_lists': lambda client, rng: client.request('GET', '/schedule_lists'),
+        'get_playlist_folders': lambda client, rng: client.request('GET', '/get_playlist_folders'),
+        'schedule': schedule,
+        'update_schedule': update_schedule,
+        'login': lambda client, rng: client.request('POST', '/login', {'username': USERNAME, 'password': PASSWORD}),
+        'audio': lambda client, rng: client.request('GET', f'/audio/{rng.choice(names)}'),
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_endpoint(clients, action, total, seed):
+    """Send total requests through the clients concurrently; returns the endpoint's stats"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(index, client):
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                status = action(client, rng)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(n, client)) for n, client in enumerate(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': statuses,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(max(latencies, default=0.0) * 1000, 2),
+    }
+
+
+def compare(report, baseline_path, tolerance):
+    """Print a per-endpoint diff against a baseline; returns the list of regressions"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\n{'endpoint':<22} {'p95 ms (base -> now)':>26} {'req/s (base -> now)':>26}")
+    for name, stats in report['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(name)
+        if old is None:
+            continue
+        print(f"{name:<22} {old['p95_ms']:>11} -> {stats['p95_ms']:<11} {old['throughput_rps']:>11} -> {stats['throughput_rps']:<11}")
+        if old['p95_ms'] and stats['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old['p95_ms']} -> {stats['p95_ms']} ms")
+        if old['throughput_rps'] and stats['throughput_rps'] < old['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['throughput_rps']} -> {stats['throughput_rps']} req/s")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='audio-scheduler-bench-')
+    process = None
+    try:
+        prepare_environment(workdir)
+        print(f"Seeding {args.schedules} schedules in {args.lists} lists, {args.uploads} uploads, "
+              f"{args.playlists} playlist folders...")
+        names, schedule_ids = seed(args, workdir, rng)
+
+        if args.gunicorn:
+            process, base_url = start_gunicorn(args, workdir)
+            clients = [HttpClient(base_url) for _ in range(args.concurrency)]
+            target = f'gunicorn ({args.workers} workers x {args.threads} threads)'
+        else:
+            clients = [TestClient() for _ in range(args.concurrency)]
+            target = 'test client'
+
+        workload = endpoints(names, schedule_ids)
+        selected = args.endpoints.split(',') if args.endpoints else list(workload)
+        unknown = [name for name in selected if name not in workload]
+        if unknown:
+            sys.exit(f"Unknown endpoints: {', '.join(unknown)} (available: {', '.join(workload)})")
+
+        print(f"{args.requests} requests per endpoint, {args.concurrency} concurrent clients, {target}\n")
+        print(f"{'endpoint':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+        results = {}
+        for n, name in enumerate(selected):
+            stats = run_endpoint(clients, workload[name], args.requests, args.seed + n)
+            results[name] = stats
+            print(f"{name:<22} {stats['throughput_rps']:>8} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+                  f"{stats['p99_ms']:>8} {stats['max_ms']:>8} {stats['errors']:>7}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        os.chdir(APP_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'target': 'gunicorn' if args.gunicorn else 'test_client',
+        'volumes': {key: getattr(args, key) for key in ('lists', 'schedules', 'uploads', 'playlists', 'playlist_files')},
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'endpoints': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nReport written to {args.output}")
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Clocks for the scheduler.
+
+SimpleScheduler asks its clock for the time and sleeps through it, so the
+simulation harness (simulate_scheduler.py) can run a week of schedules in seconds
+with SimulatedClock, where sleeping just moves time forward.
+"""
+import time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Wall-clock time (local, naive datetimes like the rest of the app)"""
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """Deterministic clock: sleep() advances time instantly"""
+
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+
+system_clock = SystemClock()
@@ -0,0 +1,114 @@
+"""
+Local RPC between the web tier and the audio daemon.
+
+Newline-delimited JSON over a Unix domain socket: each request is one line
+{"command": ..., "args": {...}} and each response is one line {"ok": bool, ...}.
+The web tier only sends short control messages (ping, status, invalidate); the
+schedules themselves are shared through the SQLite database.
+"""
+import json
+import logging
+import os
+import pathlib
+import socket
+import socketserver
+import threading
+
+logger = logging.getLogger('audio_scheduler')
+
+APP_ROOT = pathlib.Path(__file__).resolve().parent
+DEFAULT_SOCKET_PATH = APP_ROOT.joinpath('instance', 'audio-daemon.sock')
+
+
+def socket_path():
+    """Socket location, overridable with AUDIO_SCHEDULER_SOCKET"""
+    return os.environ.get('AUDIO_SCHEDULER_SOCKET') or str(DEFAULT_SOCKET_PATH)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                handler = self.server.commands.get(request.get('command'))
+                if handler is None:
+                    response = {'ok': False, 'error': f"Unknown command: {request.get('command')}"}
+                else:
+                    response = {'ok': True, 'result': handler(**(request.get('args') or {}))}
+            except Exception as e:
+                logger.error("Daemon RPC error: %s", e, exc_info=True)
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DaemonServer:
+    """Serves registered command handlers on the daemon's Unix socket"""
+
+    def __init__(self, path=None):
+        self.path = path or socket_path()
+        self.commands = {}
+        self._server = None
+        self._thread = None
+
+    def register(self, command, handler):
+        self.commands[command] = handler
+
+    def start(self):
+        # A stale socket file is left behind when the daemon was killed
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._server = _UnixServer(self.path, _RequestHandler)
+        self._server.commands = self.commands
+        os.chmod(self.path, 0o660)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="DaemonRPC")
+        self._thread.start()
+        logger.info("Daemon RPC listening on %s", self.path)
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class DaemonClient:
+    """Client used by the web tier; every call is short and never blocks a request for long"""
+
+    def __init__(self, path=None, timeout=2.0):
+        self.path = path or socket_path()
+        self.timeout = timeout
+
+    def call(self, command, **args):
+        """Send one command and return its result; raises ConnectionError if the daemon is unreachable"""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+                sock.sendall(json.dumps({'command': command, 'args': args}).encode('utf-8') + b'\n')
+                with sock.makefile('rb') as stream:
+                    line = stream.readline()
+        except OSError as e:
+            raise ConnectionError(f"Audio daemon not reachable at {self.path}: {e}") from e
+
+        if not line:
+            raise ConnectionError("Audio daemon closed the connection")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', 'Daemon command failed'))
+        return response.get('result')
+
+    def notify(self, command, **args):
+        """Fire-and-forget variant: logs instead of raising when the daemon is down"""
+        try:
+            return self.call(command, **args)
+        except (ConnectionError, RuntimeError) as e:
+            logger.warning("Daemon notification '%s' failed: %s", command, e)
+            return None
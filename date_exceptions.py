@@ -0,0 +1,127 @@
+"""
+Date exceptions and holiday calendars.
+
+DateException rows (skip dates, skip ranges, per-date schedule list overrides) are
+compiled into a dict keyed by date, so the scheduler answers "is today special?"
+with a single dictionary lookup instead of querying the database every minute.
+The compiled lookup is rebuilt lazily after any commit that touches the exception tables.
+"""
+import logging
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, DateException, HolidayCalendar
+
+logger = logging.getLogger('audio_scheduler')
+
+ACTIONS = ('skip', 'override')
+MAX_RANGE_DAYS = 366  # Keeps the compiled lookup bounded
+
+DateRule = namedtuple('DateRule', ['action', 'override_list_id', 'exception_id', 'name'])
+
+
+class ExceptionCalendar:
+    """Date-indexed lookup of compiled DateException rows"""
+
+    def __init__(self):
+        self._by_date = {}
+        self._generation = 0  # Incremented by invalidate()
+        self._compiled_generation = -1
+        self._lock = threading.Lock()
+        self.listeners = []  # Called after a committed change, e.g. to notify the audio daemon
+
+    def invalidate(self):
+        """Mark the compiled lookup stale; it is rebuilt on the next lookup"""
+        self._generation += 1
+
+    @property
+    def stale(self):
+        return self._compiled_generation != self._generation
+
+    def compile(self):
+        """
+        Rebuild the lookup from the database (requires an application context).
+        Shorter ranges are applied last so a single-date exception inside a holiday
+        range wins over the range; on equal length a skip wins over an override.
+        """
+        generation = self._generation
+        exceptions = (
+            DateException.query
+            .outerjoin(HolidayCalendar)
+            .filter(db.or_(DateException.calendar_id.is_(None), HolidayCalendar.is_enabled.is_(True)))
+            .all()
+        )
+
+        def sort_key(exception):
+            span = ((exception.end_date or exception.start_date) - exception.start_date).days
+            return (-span, exception.action == 'skip')
+
+        by_date = {}
+        for exception in sorted(exceptions, key=sort_key):
+            end_date = exception.end_date or exception.start_date
+            span = (end_date - exception.start_date).days
+            if span > MAX_RANGE_DAYS:
+                # The API refuses these; rows from before that only apply to their first year
+                logger.warning("Date exception '%s' spans %s days; only the first %s are applied",
+                               exception.name, span + 1, MAX_RANGE_DAYS + 1)
+                span = MAX_RANGE_DAYS
+            rule = DateRule(exception.action, exception.override_list_id, exception.id, exception.name)
+            for offset in range(span + 1):
+                by_date[exception.start_date + timedelta(days=offset)] = rule
+
+        with self._lock:
+            self._by_date = by_date
+            # An invalidate() that raced with this compile keeps the lookup stale
+            self._compiled_generation = generation
+        logger.info("Compiled %s date exceptions into %s dates", len(exceptions), len(by_date))
+
+    def lookup(self, day):
+        """Return the DateRule for a date, or None for an ordinary day"""
+        if self.stale:
+            self.compile()
+        return self._by_date.get(day)
+
+    def rules_between(self, start_date, days):
+        """Return {date: DateRule} for the exceptional dates in a range"""
+        if self.stale:
+            self.compile()
+        rules = {}
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            rule = self._by_date.get(day)
+            if rule is not None:
+                rules[day] = rule
+        return rules
+
+
+exception_calendar = ExceptionCalendar()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_changes(session, flush_context):
+    """Remember that this transaction touched exceptions or calendars"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (DateException, HolidayCalendar)):
+            session.info['date_exceptions_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    """
+    Recompile only once the change is committed; invalidating at flush time would let
+    another thread recompile from the not-yet-committed state and cache stale data.
+    """
+    if session.info.pop('date_exceptions_changed', False):
+        exception_calendar.invalidate()
+        for listener in exception_calendar.listeners:
+            listener()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('date_exceptions_changed', None)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Import another instance's schedules as a site of this one.
+
+For hosts that ran one instance per building: each building's schedules.db becomes
+a site (see sites.py) of a single instance. Its schedule lists and schedules are
+copied under a new site; the list that was active stays the site's active list.
+Zones and date exceptions are not copied - give the site its output with
+POST /sites/<id> {"zone_id": ...}, and date exceptions apply to all sites.
+
+With --uploads, the bells the imported schedules use are copied into this
+instance's uploads folder. A bell whose name is taken by a different file here is
+copied as "<name>-<site>.<ext>" and its schedules are pointed at the copy. Playlist
+folders are only checked: copy them into playlists/ yourself.
+
+Usage:
+    python import_site.py "North building" /srv/north/instance/schedules.db
+    python import_site.py "North building" /srv/north/instance/schedules.db --uploads /srv/north/uploads
+    python import_site.py "North building" /srv/north/instance/schedules.db --zone north-pa --dry-run
+"""
+import argparse
+import filecmp
+import os
+import pathlib
+import shutil
+import sqlite3
+import sys
+from datetime import datetime
+
+# Ensure local imports work when running from a different cwd
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, APP_ROOT
+from models import db, Schedule, ScheduleList, Site, Zone
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('name', help='Name of the new site')
+    parser.add_argument('database', help="The other instance's schedules.db")
+    parser.add_argument('--uploads', help="The other instance's uploads folder, to copy the bells from")
+    parser.add_argument('--zone', help='Name of the zone the site plays on (default: the in-process mixer)')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be imported, change nothing')
+    return parser.parse_args()
+
+
+def read_source(path):
+    """(lists, schedules) of the other database as dicts, with the columns both schemas have"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    connection.row_factory = sqlite3.Row
+    try:
+        lists = [dict(row) for row in connection.execute('SELECT id, name, is_active FROM schedule_list')]
+        source_columns = {row['name'] for row in connection.execute('PRAGMA table_info(schedule)')}
+        columns = [c.name for c in Schedule.__table__.columns if c.name in source_columns and c.name != 'id']
+        schedules = [dict(row) for row in connection.execute(f"SELECT {', '.join(columns)} FROM schedule")]
+    finally:
+        connection.close()
+    # sqlite3 returns timestamps as text
+    for row in schedules:
+        if isinstance(row.get('created_at'), str):
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+    return lists, schedules
+
+
+def copy_uploads(schedules, source_folder, site_name, dry_run):
+    """Copy the bells into uploads/; returns {old name: new name} of the renamed ones"""
+    target_folder = pathlib.Path(app.config['UPLOAD_FOLDER'])
+    renamed = {}
+    for filename in sorted({s['filename'] for s in schedules if s.get('filename')}):
+        source = pathlib.Path(source_folder, filename)
+        target = target_folder / filename
+        if not source.is_file():
+            print(f"  missing in {source_folder}: {filename}")
+            continue
+        if target.exists():
+            if filecmp.cmp(source, target, shallow=False):
+                continue
+            target = target.with_name(f"{target.stem}-{site_name}{target.suffix}")
+            renamed[filename] = target.relative_to(target_folder).as_posix()
+            print(f"  {filename} differs from the file here, copied as {renamed[filename]}")
+        if not dry_run:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(source, target)
+    return renamed
+
+
+def main():
+    args = parse_args()
+    lists, schedules = read_source(args.database)
+    print(f"{args.database}: {len(lists)} lists, {len(schedules)} schedules")
+
+    with app.app_context():
+        if Site.query.filter_by(name=args.name).first():
+            sys.exit(f"A site named '{args.name}' already exists")
+        zone = None
+        if args.zone:
+            zone = Zone.query.filter_by(name=args.zone).first()
+            if zone is None:
+                sys.exit(f"No zone named '{args.zone}'")
+
+        renamed = copy_uploads(schedules, args.uploads, args.name, args.dry_run) if args.uploads else {}
+        for folder in sorted({s['folder_path'] for s in schedules if s.get('folder_path')}):
+            if not APP_ROOT.joinpath(folder).is_dir():
+                print(f"  playlist folder not found here: {folder}")
+
+        site = Site(name=args.name, zone=zone)
+        list_map = {}
+        for source_list in lists:
+            schedule_list = ScheduleList(name=source_list['name'], is_active=bool(source_list['is_active']))
+            site.schedule_lists.append(schedule_list)
+            list_map[source_list['id']] = schedule_list
+        if not any(schedule_list.is_active for schedule_list in list_map.values()):
+            if list_map:
+                next(iter(list_map.values())).is_active = True
+            else:
+                site.schedule_lists.append(ScheduleList(name='Default', is_active=True))
+
+        imported = 0
+        for row in schedules:
+            schedule_list = list_map.get(row.pop('schedule_list_id', None))
+            if schedule_list is None:
+                continue  # Orphaned rows weren't played there either
+            if row.get('filename') in renamed:
+                row['filename'] = renamed[row['filename']]
+            schedule_list.schedules.append(Schedule(**row))
+            imported += 1
+
+        if args.dry_run:
+            print(f"Would import {imported} schedules in {len(site.schedule_lists)} lists as site '{args.name}'")
+            return
+        db.session.add(site)
+        db.session.commit()
+        print(f"Imported {imported} schedules in {len(site.schedule_lists)} lists as site '{site.name}' (id {site.id})")
+
+
+if __name__ == '__main__':
+    main()
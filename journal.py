@@ -0,0 +1,143 @@
+"""
+Persistent execution journal for the scheduler.
+
+Every fire decision is recorded as (schedule_id, scheduled minute, actual instant,
+outcome). Claims are kept in an in-memory set so the scheduler checks "already fired?"
+with a set lookup, while rows are written to the execution_record table by a
+background thread - the scheduler thread never waits for SQLite.
+
+At startup the recent part of the journal is replayed into the set, so a restart
+inside a minute doesn't fire a bell twice and the catch-up window (see
+SimpleScheduler) can fire bells that were missed while the process was down.
+A batch whose write fails (SQLite busy with the web tier, say) stays pending and is
+written with the next one. A crash in the short gap between a claim and its write
+can still repeat a bell.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from models import db, ExecutionRecord
+
+logger = logging.getLogger('audio_scheduler')
+
+RETENTION_DAYS = 30
+STOP_ATTEMPTS = 5  # Tries stop() gives a pending batch before giving up on it
+
+
+class ExecutionJournal:
+    def __init__(self, app, flush_interval=0.5, retention_days=RETENTION_DAYS):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._claimed = set()  # (schedule_id, scheduled_at)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = []  # Rows taken off the queue but not committed yet
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._last_prune = 0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True, name="JournalWriter")
+        self._thread.start()
+
+    def stop(self):
+        """Flush pending records and stop the writer"""
+        if not self._running:
+            return
+        self._running = False
+        self._thread.join(timeout=5)
+        for attempt in range(STOP_ATTEMPTS):
+            try:
+                self.flush()
+                return
+            except Exception as e:
+                logger.warning("Journal flush at shutdown failed (attempt %s of %s): %s", attempt + 1, STOP_ATTEMPTS, e)
+                time.sleep(self.flush_interval)
+        logger.error("Dropping %s unwritten journal entries", len(self._pending))
+
+    def replay(self, since):
+        """Load claims recorded since the given instant (call before the scheduler starts)"""
+        with self.app.app_context():
+            rows = db.session.query(ExecutionRecord.schedule_id, ExecutionRecord.scheduled_at).filter(
+                ExecutionRecord.scheduled_at >= since
+            ).all()
+        with self._lock:
+            self._claimed.update((row.schedule_id, row.scheduled_at) for row in rows)
+        logger.info("Replayed %s journal entries since %s", len(rows), since.strftime('%Y-%m-%d %H:%M'))
+
+    def claim(self, schedule_id, scheduled_at):
+        """Atomically mark a (schedule, minute) as handled; False if it already was"""
+        key = (schedule_id, scheduled_at)
+        with self._lock:
+            if key in self._claimed:
+                return False
+            self._claimed.add(key)
+            return True
+
+    def record(self, schedule_id, scheduled_at, outcome, fired_at=None):
+        """Queue a journal row; never blocks on the database"""
+        lateness = (fired_at - scheduled_at).total_seconds() if fired_at else None
+        self._queue.put({
+            'schedule_id': schedule_id,
+            'scheduled_at': scheduled_at,
+            'fired_at': fired_at,
+            'outcome': outcome,
+            'lateness': lateness
+        })
+
+    def forget_before(self, instant):
+        """Drop in-memory claims older than the catch-up horizon"""
+        with self._lock:
+            self._claimed = {key for key in self._claimed if key[1] >= instant}
+
+    def _writer_loop(self):
+        while self._running:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if time.time() - self._last_prune > 24 * 3600:
+                    self._prune()
+            except Exception as e:
+                logger.error("Journal writer error: %s", e, exc_info=True)
+
+    def flush(self):
+        """
+        Write queued records now (the writer thread calls this every flush_interval).
+        If the write fails the rows stay pending for the next flush and the error is raised.
+        """
+        with self._flush_lock:
+            while True:
+                try:
+                    self._pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._pending:
+                return
+            with self.app.app_context():
+                try:
+                    # OR IGNORE keeps the journal append-only when a claim was replayed and re-recorded
+                    db.session.execute(insert(ExecutionRecord).prefix_with('OR IGNORE'), self._pending)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+            self._pending = []
+
+    def _prune(self):
+        self._last_prune = time.time()
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        with self.app.app_context():
+            deleted = ExecutionRecord.query.filter(ExecutionRecord.scheduled_at < cutoff).delete()
+            db.session.commit()
+        if deleted:
+            logger.info("Pruned %s journal entries older than %s days", deleted, self.retention_days)
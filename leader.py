@@ -0,0 +1,150 @@
+"""
+Leader election between processes that could run the scheduler.
+
+Every candidate (each Gunicorn worker, or a pair of audio daemons) polls an exclusive,
+non-blocking fcntl lock on a shared lock file. The holder is the leader and owns the
+scheduler; everyone else only serves HTTP. The kernel drops the lock when the leader
+process dies, so a follower takes over within one poll interval.
+
+While it holds the lock the leader writes a heartbeat (pid, timestamp) into the file.
+If its scheduler thread has died it steps down and releases the lock, so another
+candidate can take over.
+"""
+import json
+import logging
+import os
+import pathlib
+import socket
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no fcntl, fall back to a single always-leader process
+    fcntl = None
+
+logger = logging.getLogger('audio_scheduler')
+
+# Shared by every candidate process (and the snapshot fast path, which starts before the app)
+DEFAULT_LOCK_PATH = os.environ.get('AUDIO_SCHEDULER_LOCK') or str(
+    pathlib.Path(__file__).resolve().parent.joinpath('instance', 'scheduler.lock'))
+
+
+def try_lock(lock_path):
+    """Take the exclusive leader lock without blocking; returns the locked fd, or None if it is held"""
+    if fcntl is None:
+        return None
+    os.makedirs(os.path.dirname(str(lock_path)) or '.', exist_ok=True)
+    fd = os.open(str(lock_path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class LeaderElector:
+    def __init__(self, lock_path, on_elected, on_demoted=None, is_healthy=None, interval=2.0, lock_fd=None):
+        self.lock_path = str(lock_path)
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_healthy = is_healthy
+        self.interval = interval
+        self.is_leader = False
+        self.elected_at = None
+        self._cooldown_until = 0  # After stepping down as unhealthy, give other candidates a head start
+        self._fd = lock_fd  # A lock already taken with try_lock() (e.g. by the snapshot fast path)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Try to become leader right away, then keep contending/heartbeating in the background"""
+        if fcntl is None:
+            logger.warning("fcntl not available - leader election disabled, this process runs the scheduler")
+            self._become_leader()
+            return
+
+        if self._fd is not None:
+            self._become_leader()
+        else:
+            self._tick()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="LeaderElection")
+        self._thread.start()
+
+    def stop(self):
+        """Release leadership (if held) and stop contending"""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.interval + 1)
+        self._step_down()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error("Leader election error: %s", e, exc_info=True)
+
+    def _tick(self):
+        if self.is_leader:
+            if self.is_healthy is not None and not self.is_healthy():
+                logger.error("Scheduler unhealthy - stepping down as leader")
+                self._step_down()
+                self._cooldown_until = time.time() + self.interval * 2
+                return
+            self._write_heartbeat()
+        elif time.time() >= self._cooldown_until and self._try_lock():
+            self._become_leader()
+
+    def _try_lock(self):
+        self._fd = try_lock(self.lock_path)
+        return self._fd is not None
+
+    def _become_leader(self):
+        self.is_leader = True
+        self.elected_at = time.time()
+        if self._fd is not None:
+            self._write_heartbeat()
+        logger.info("Process %s elected scheduler leader", os.getpid())
+        self.on_elected()
+
+    def _step_down(self):
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        if self.on_demoted is not None:
+            try:
+                self.on_demoted()
+            except Exception as e:
+                logger.error("Error while stepping down: %s", e, exc_info=True)
+        if self._fd is not None:
+            # Unlock explicitly: closing alone would keep the lock if the fd was inherited by a child
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        logger.info("Process %s released scheduler leadership", os.getpid())
+
+    def _write_heartbeat(self):
+        data = json.dumps({
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+            'elected_at': self.elected_at,
+            'heartbeat': time.time()
+        }).encode('utf-8')
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, data, 0)
+
+    def status(self):
+        """Leader info as seen by this process; the heartbeat is stale if the leader stopped updating it"""
+        info = {'is_leader': self.is_leader, 'pid': os.getpid(), 'leader': None, 'heartbeat_age': None}
+        try:
+            with open(self.lock_path, 'r') as f:
+                leader = json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            leader = None
+        if leader:
+            info['leader'] = leader
+            info['heartbeat_age'] = round(time.time() - leader.get('heartbeat', 0), 1)
+            info['heartbeat_stale'] = info['heartbeat_age'] > self.interval * 3
+        return info
@@ -0,0 +1,65 @@
+"""
+Non-blocking logging pipeline.
+
+Loggers get a single QueueHandler; a QueueListener thread owns the real handlers
+(rotating files, console) and does all formatting and disk I/O. A slow SD card
+then delays only the listener, never the scheduler or a playback thread.
+
+Set AUDIO_SCHEDULER_LOG_FORMAT=json to write the log files as JSON lines.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock prepare() renders the message and traceback in the caller so the
+    record can be pickled; ours never leaves the process, so the caller only pays
+    for the enqueue. Log args are rendered later and must not be mutated afterwards.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class NameFilter(logging.Filter):
+    """Pass records from any of the given logger names (or their children)"""
+
+    def __init__(self, *names):
+        super().__init__()
+        self.names = tuple(names)
+        self.prefixes = tuple(f"{name}." for name in names)
+
+    def filter(self, record):
+        return record.name in self.names or record.name.startswith(self.prefixes)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, plus location and exception"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'func': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def start_pipeline(logger, handlers):
+    """Route logger through a queue to handlers; returns the started QueueListener"""
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,317 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock, so
+recording a sample costs a dict lookup and an addition - cheap enough for the
+scheduler thread and every request. registry.render() produces the text format
+served at /metrics.
+
+Each process has its own registry, and the process answering a scrape is rarely
+the one doing the work, so every other process exports its registry: the audio
+daemon over RPC, everything else by writing it to <METRICS_DIR>/<pid>.json
+every EXPORT_INTERVAL seconds (an Exporter). METRICS_DIR is on tmpfs
+($XDG_RUNTIME_DIR, else /dev/shm) so the exports never wear an SD card, and only
+processes with someone to export to run an Exporter. /metrics merges its own registry,
+the files of the other processes and, in the web role, the daemon's. Series carry
+a process label (and pid, or zone, where several processes share a role):
+
+    scheduler families (audio_scheduler_loop_*, _check_*, _trigger_lateness_*,
+    _fires_*, _snapshot_fallbacks_*)      the scheduler leader: the standalone
+                                          worker holding the leader lock, or the daemon
+    playback families (_audio_load_*, _playlist_*, _arbitration_*)
+                                          the leader for the in-process mixer;
+                                          process="zone" for zone engines
+    audio_scheduler_db_commit_seconds     every process that commits (web workers)
+    audio_scheduler_is_leader, _active_playback_threads
+                                          every worker, evaluated in that worker
+
+A file that hasn't been rewritten for STALE_SECONDS belongs to a process that is
+gone; it is skipped and deleted.
+"""
+import bisect
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+
+logger = logging.getLogger('audio_scheduler')
+
+APP_ROOT = pathlib.Path(__file__).resolve().parent
+
+
+def _default_metrics_dir():
+    for runtime in (os.environ.get('XDG_RUNTIME_DIR'), '/dev/shm'):
+        if runtime and os.path.isdir(runtime) and os.access(runtime, os.W_OK):
+            # One folder per installation, so two on one host don't merge each other's metrics
+            return pathlib.Path(runtime, f"audio-scheduler-metrics-{hashlib.sha1(bytes(APP_ROOT)).hexdigest()[:8]}")
+    return APP_ROOT.joinpath('instance', 'metrics')  # No tmpfs (Windows, macOS)
+
+
+METRICS_DIR = pathlib.Path(os.environ.get('AUDIO_SCHEDULER_METRICS_DIR') or _default_metrics_dir())
+EXPORT_INTERVAL = 5.0
+STALE_SECONDS = 60
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, const_labels, *extra):
+        return _format_labels(list(const_labels) + list(zip(self.labelnames, key)) + list(extra))
+
+    def collect(self, const_labels=()):
+        """Family as a plain dict (JSON-serializable, so it can cross the daemon RPC)"""
+        return {
+            'name': self.name,
+            'help': self.documentation,
+            'type': self.kind,
+            'samples': self._samples(tuple(const_labels))
+        }
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, const_labels):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{self._labels(key, const_labels)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(_Metric):
+    """Gauge set explicitly, or computed at scrape time when a callback is given"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self, const_labels):
+        if self.callback is not None:
+            return [f'{self.name}{_format_labels(list(const_labels))} {_format_value(self.callback())}']
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{self._labels(key, const_labels)} {_format_value(value)}' for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, const_labels):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = self._labels(key, const_labels, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = self._labels(key, const_labels)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collect(self, const_labels=None):
+        """All families, optionally tagged with constant labels such as {'process': 'daemon'}"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        const_labels = sorted((const_labels or {}).items())
+        return [metric.collect(const_labels) for metric in metrics]
+
+    def render(self):
+        return render(self.collect())
+
+
+def render(*collections):
+    """Render one or more collect() results, merging families that share a name"""
+    families = {}
+    for collection in collections:
+        for family in collection:
+            merged = families.setdefault(family['name'], dict(family, samples=[]))
+            merged['samples'].extend(family['samples'])
+    lines = []
+    for family in families.values():
+        lines.append(f"# HELP {family['name']} {family['help']}")
+        lines.append(f"# TYPE {family['name']} {family['type']}")
+        lines.extend(family['samples'])
+    return '\n'.join(lines) + '\n'
+
+
+class Exporter:
+    """Writes a registry to <folder>/<pid>.json every interval, for the process serving /metrics"""
+
+    def __init__(self, registry, const_labels, folder=METRICS_DIR, interval=EXPORT_INTERVAL):
+        self.registry = registry
+        self.const_labels = const_labels
+        self.folder = pathlib.Path(folder)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def path(self):
+        return self.folder / f"{os.getpid()}.json"
+
+    def labels(self):
+        return dict(self.const_labels, pid=os.getpid())
+
+    def dump(self):
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.registry.collect(self.labels())))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug("Could not export metrics: %s", e)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.dump()
+
+        self.dump()
+        self._thread = threading.Thread(target=run, daemon=True, name="MetricsExporter")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def collect_exported(folder=METRICS_DIR, exclude_pid=None):
+    """Families exported by the other processes, as one list"""
+    families = []
+    now = time.time()
+    for path in pathlib.Path(folder).glob('*.json'):
+        if path.stem == str(exclude_pid):
+            continue
+        try:
+            if now - path.stat().st_mtime > STALE_SECONDS:
+                path.unlink()
+                continue
+            families.extend(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # Being replaced or removed right now
+    return families
+
+
+registry = Registry()
+
+# Scheduler
+SCHEDULER_LOOP_ITERATIONS = registry.counter(
+    'audio_scheduler_loop_iterations_total', 'Scheduler polling loop iterations')
+SCHEDULER_CHECK_SECONDS = registry.histogram(
+    'audio_scheduler_check_seconds', 'Time spent querying and matching schedules for one minute')
+SCHEDULER_TRIGGER_LATENESS = registry.histogram(
+    'audio_scheduler_trigger_lateness_seconds', 'Delay between the scheduled minute and the actual trigger',
+    buckets=(0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+SCHEDULER_FIRES = registry.counter(
+    'audio_scheduler_fires_total', 'Schedule fire decisions by outcome', ('outcome',))
+SCHEDULER_SNAPSHOT_FALLBACKS = registry.counter(
+    'audio_scheduler_snapshot_fallbacks_total', 'Minutes checked from the schedule snapshot because the database failed')
+
+# Playback
+AUDIO_LOAD_SECONDS = registry.histogram(
+    'audio_scheduler_audio_load_seconds', 'Time to load/decode an audio file before playback starts')
+PLAYLIST_TRACKS = registry.counter(
+    'audio_scheduler_playlist_tracks_total', 'Playlist tracks started')
+PLAYLIST_TRACKS_PER_RUN = registry.histogram(
+    'audio_scheduler_playlist_tracks_per_run', 'Tracks played per playlist run',
+    buckets=(1, 2, 5, 10, 20, 50, 100))
+PLAYLIST_GAP_SECONDS = registry.histogram(
+    'audio_scheduler_playlist_gap_seconds', 'Silence between the end of one playlist track and the start of the next',
+    buckets=(0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0))
+ARBITRATION_DECISIONS = registry.counter(
+    'audio_scheduler_arbitration_decisions_total', 'Output arbitration decisions for overlapping sounds', ('decision',))
+
+# Web tier
+DB_COMMIT_SECONDS = registry.histogram(
+    'audio_scheduler_db_commit_seconds', 'Database commit latency by Flask endpoint', ('endpoint',))
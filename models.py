@@ -1,29 +1,81 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from datetime import datetime
+import json
 
 db = SQLAlchemy()
 
+class Site(db.Model):
+    """A building served by this process, with its own active schedule list and audio output (see sites.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    zone_id = db.Column(db.Integer, db.ForeignKey('zone.id', ondelete='SET NULL'), nullable=True)  # None plays on the in-process mixer
+    is_enabled = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    zone = db.relationship('Zone', lazy='joined')
+    schedule_lists = db.relationship('ScheduleList', backref='site', lazy=True, cascade='all, delete-orphan')
+
+    def to_dict(self):
+        active = next((l for l in self.schedule_lists if l.is_active), None)
+        return {
+            'id': self.id,
+            'name': self.name,
+            'zone_id': self.zone_id,
+            'is_enabled': bool(self.is_enabled),
+            'active_list_id': active.id if active else None,
+            'list_count': len(self.schedule_lists)
+        }
+
 class ScheduleList(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    site_id = db.Column(db.Integer, db.ForeignKey('site.id'), nullable=True)  # None is the default site
     name = db.Column(db.String(100), nullable=False)
-    is_active = db.Column(db.Boolean, default=False)
+    is_active = db.Column(db.Boolean, default=False)  # One active list per site
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped on every change to the list or its schedules
     schedules = db.relationship('Schedule', backref='schedule_list', lazy=True, cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
             'id': self.id,
+            'site_id': self.site_id,
             'name': self.name,
             'is_active': self.is_active,
+            'revision': self.revision or 0,
             'schedule_count': len(self.schedules)
         }
 
+schedule_zones = db.Table('schedule_zone',
+    db.Column('schedule_id', db.Integer, db.ForeignKey('schedule.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('zone_id', db.Integer, db.ForeignKey('zone.id', ondelete='CASCADE'), primary_key=True)
+)
+
+class Zone(db.Model):
+    """An audio output (building, PA zone) with its own playback engine"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    driver = db.Column(db.String(20), default='pulseaudio')  # SDL audio driver: 'pulseaudio', 'alsa', 'dummy', 'disk'
+    sink = db.Column(db.String(255), nullable=True)  # PulseAudio sink name (or a .raw output file in instance/ for the 'disk' driver)
+    is_enabled = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'driver': self.driver,
+            'sink': self.sink,
+            'is_enabled': bool(self.is_enabled)
+        }
+
 class Schedule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     schedule_list_id = db.Column(db.Integer, db.ForeignKey('schedule_list.id'), nullable=True)
     
     # Basic schedule info
     filename = db.Column(db.String(255), nullable=True)  # Nullable for playlist schedules
+    audio_hash = db.Column(db.String(64), nullable=True, index=True)  # Content of filename when scheduled (see audio_store.py)
     time = db.Column(db.String(5), nullable=False)  # Format: "HH:MM"
     monday = db.Column(db.Boolean, default=False)
     tuesday = db.Column(db.Boolean, default=False)
@@ -43,6 +95,17 @@ class Schedule(db.Model):
     track_interval = db.Column(db.Integer, default=10)  # Seconds between tracks
     max_tracks = db.Column(db.Integer, nullable=True)  # Maximum number of tracks to play
     shuffle_mode = db.Column(db.Boolean, default=True)  # Random/shuffle playback
+    render_ahead = db.Column(db.Boolean, default=False)  # Mix upcoming blocks into one file overnight (see prerender.py)
+    
+    # Repeats, month and date limits or a cron expression as compact JSON (see recurrence.py); None fires once at time
+    recurrence = db.Column(db.Text, nullable=True)
+    
+    # Overlapping sounds (see arbitration.py) - None means the default for the schedule type
+    priority = db.Column(db.Integer, nullable=True)  # Higher wins; bells default to 10, playlists to 0
+    conflict_policy = db.Column(db.String(10), nullable=True)  # 'preempt', 'duck', 'queue' or 'skip'
+    
+    # Output routing - no zones means the default (in-process) output
+    zones = db.relationship('Zone', secondary=schedule_zones, lazy='selectin', backref='schedules')
 
     def to_dict(self):
         return {
@@ -63,29 +126,171 @@ class Schedule(db.Model):
             'track_interval': self.track_interval,
             'max_tracks': self.max_tracks,
             'shuffle_mode': self.shuffle_mode,
+            'render_ahead': bool(self.render_ahead),
+            'priority': self.priority,
+            'conflict_policy': self.conflict_policy,
+            'recurrence': json.loads(self.recurrence) if self.recurrence else None,
+            'zones': [zone.id for zone in self.zones],
             'next_run': self.next_run_time()
         }
     
     def next_run_time(self):
         """Calculate the next time this schedule will run"""
         from datetime import datetime, timedelta
+        from occurrences import schedule_minutes_on
         now = datetime.now()
-        hour, minute = map(int, self.time.split(':'))
-        today = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        # A week ahead covers every weekly schedule; rules limited to some months or dates look further
+        for offset in range(8 if not self.recurrence else 400):
+            day = midnight + timedelta(days=offset)
+            for minute_of_day in schedule_minutes_on(self, day.date()):
+                run = day + timedelta(minutes=minute_of_day)
+                if run > now:
+                    return run.isoformat()
         
-        days = [
+        return None
+
+    def output_zones(self):
+        """Zones the schedule plays on: its own, else its site's output; empty means the in-process mixer"""
+        if self.zones:
+            return self.zones
+        site = self.schedule_list.site if self.schedule_list is not None else None
+        return [site.zone] if site is not None and site.zone is not None else []
+
+    def active_days(self):
+        """Weekday flags indexed 0=Monday .. 6=Sunday"""
+        return [
             self.monday, self.tuesday, self.wednesday,
             self.thursday, self.friday, self.saturday, self.sunday
         ]
-        
-        # If we haven't missed today's time and today is a scheduled day
-        if today > now and days[now.weekday()]:
-            return today.isoformat()
-            
-        # Find the next scheduled day
-        for i in range(1, 8):
-            next_day = (now.weekday() + i) % 7
-            if days[next_day]:
-                return (today + timedelta(days=i)).isoformat()
-        
-        return None
\ No newline at end of file
+
+class HolidayCalendar(db.Model):
+    """Named group of date exceptions that can be switched on or off as a whole"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    is_enabled = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    exceptions = db.relationship('DateException', backref='calendar', lazy=True, cascade='all, delete-orphan')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'is_enabled': bool(self.is_enabled),
+            'exception_count': len(self.exceptions)
+        }
+
+class DateException(db.Model):
+    """Skip all bells, or play another schedule list, on a date or date range"""
+    id = db.Column(db.Integer, primary_key=True)
+    calendar_id = db.Column(db.Integer, db.ForeignKey('holiday_calendar.id'), nullable=True)
+    name = db.Column(db.String(100), nullable=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=True)  # Inclusive; None means a single date
+    action = db.Column(db.String(20), nullable=False, default='skip')  # 'skip' or 'override'
+    override_list_id = db.Column(db.Integer, db.ForeignKey('schedule_list.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'calendar_id': self.calendar_id,
+            'name': self.name,
+            'start_date': self.start_date.isoformat(),
+            'end_date': (self.end_date or self.start_date).isoformat(),
+            'action': self.action,
+            'override_list_id': self.override_list_id
+        }
+
+class AudioFile(db.Model):
+    """A name under uploads/ or playlists/ and the content-addressed blob it links to"""
+    id = db.Column(db.Integer, primary_key=True)
+    root = db.Column(db.String(20), nullable=False)  # 'uploads' or 'playlists'
+    name = db.Column(db.String(500), nullable=False)  # Path relative to the root
+    blob_hash = db.Column(db.String(64), nullable=False, index=True)  # sha256 of the content
+    size = db.Column(db.Integer, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=True)  # Lets sync skip re-hashing unchanged files
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('root', 'name', name='uq_audio_file_root_name'),
+    )
+
+    def to_dict(self):
+        return {
+            'root': self.root,
+            'name': self.name,
+            'blob_hash': self.blob_hash,
+            'size': self.size
+        }
+
+class AudioAnalysis(db.Model):
+    """Audible extent of one blob's content: where playback should start and stop (see silence.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    blob_hash = db.Column(db.String(64), nullable=False, unique=True)
+    duration = db.Column(db.Float, nullable=True)  # Seconds; None if the file couldn't be decoded
+    trim_start = db.Column(db.Float, nullable=False, default=0.0)  # Leading silence to skip, in seconds
+    trim_end = db.Column(db.Float, nullable=True)  # Where the sound ends, in seconds; None plays to the end
+    peaks = db.Column(db.LargeBinary, nullable=True)  # Waveform peaks at several zoom levels (see waveform.py)
+    analyzed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'blob_hash': self.blob_hash,
+            'duration': self.duration,
+            'trim_start': self.trim_start,
+            'trim_end': self.trim_end
+        }
+
+class ExecutionRecord(db.Model):
+    """Append-only journal entry: one row per (schedule, scheduled minute)"""
+    id = db.Column(db.Integer, primary_key=True)
+    schedule_id = db.Column(db.Integer, nullable=False)  # No FK: records outlive deleted schedules
+    scheduled_at = db.Column(db.DateTime, nullable=False)
+    fired_at = db.Column(db.DateTime, nullable=True)  # None when the fire was missed
+    outcome = db.Column(db.String(20), nullable=False)  # 'fired', 'caught_up' or 'missed'
+    lateness = db.Column(db.Float, nullable=True)  # Seconds between scheduled and actual instant
+
+    __table_args__ = (
+        db.UniqueConstraint('schedule_id', 'scheduled_at', name='uq_execution_schedule_instant'),
+        db.Index('ix_execution_scheduled_at', 'scheduled_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'schedule_id': self.schedule_id,
+            'scheduled_at': self.scheduled_at.isoformat(),
+            'fired_at': self.fired_at.isoformat() if self.fired_at else None,
+            'outcome': self.outcome,
+            'lateness': self.lateness
+        }
+
+@event.listens_for(Session, 'before_flush')
+def bump_schedule_list_revisions(session, flush_context, instances):
+    """
+    Increment ScheduleList.revision for every list whose schedules changed in this flush.
+    Caches keyed by (list id, revision) are therefore invalidated by any mutation,
+    whichever route or process performed it.
+    """
+    touched_list_ids = set()
+    touched_lists = set()
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Schedule):
+                if obj in session.dirty and not session.is_modified(obj):
+                    continue
+                if obj.schedule_list_id is not None:
+                    touched_list_ids.add(obj.schedule_list_id)
+            elif isinstance(obj, ScheduleList) and obj not in session.deleted and obj not in session.new:
+                if session.is_modified(obj):
+                    touched_lists.add(obj)
+
+        for list_id in touched_list_ids:
+            schedule_list = session.get(ScheduleList, list_id)
+            if schedule_list is not None and schedule_list not in session.deleted:
+                touched_lists.add(schedule_list)
+
+    for schedule_list in touched_lists:
+        schedule_list.revision = (schedule_list.revision or 0) + 1
@@ -0,0 +1,136 @@
+"""
+Occurrence expansion for schedule lists.
+
+Expands the rows of a ScheduleList - "HH:MM on these weekdays", or a recurrence
+rule (see recurrence.py) - into concrete occurrences over a date range, with
+expected durations and overlap detection, and into the scheduler's fire index.
+Expansions are cached per (list id, list revision), so any mutation of the list
+invalidates them without explicit cache management in the routes.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+
+import recurrence
+
+MAX_RANGE_DAYS = 31
+
+
+def schedule_minutes_on(schedule, day):
+    """Return the minutes of the day (0..1439) at which a schedule fires on the given date"""
+    if not schedule.recurrence:
+        if not schedule.active_days()[day.weekday()]:
+            return []
+        hour, minute = map(int, schedule.time.split(':'))
+        return [hour * 60 + minute]
+    rule = recurrence.for_schedule(schedule)
+    return rule.minutes_on(day) if rule is not None else []
+
+
+def fire_index(schedules, day):
+    """{minute of day: [schedule ids]} of the schedules that fire on the given date"""
+    index = defaultdict(list)
+    for schedule in schedules:
+        for minute_of_day in schedule_minutes_on(schedule, day):
+            index[minute_of_day].append(schedule.id)
+    return dict(index)
+
+
+def expand_schedules(schedules, start_date, days, duration_of, include_muted=False):
+    """
+    Expand schedules into occurrences between start_date and start_date + days.
+
+    duration_of(schedule) returns the expected playback length in seconds, or None
+    when it cannot be determined. Occurrences are returned sorted by start time, each
+    carrying the ids of the schedules whose occurrences it overlaps with.
+    """
+    durations = {}
+    occurrences = []
+    for schedule in schedules:
+        if schedule.is_muted and not include_muted:
+            continue
+        if schedule.id not in durations:
+            durations[schedule.id] = duration_of(schedule)
+        duration = durations[schedule.id]
+
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            for minute_of_day in schedule_minutes_on(schedule, day):
+                start = datetime(day.year, day.month, day.day) + timedelta(minutes=minute_of_day)
+                end = start + timedelta(seconds=duration) if duration else None
+                occurrences.append({
+                    'schedule_id': schedule.id,
+                    'schedule_type': schedule.schedule_type,
+                    'filename': schedule.filename,
+                    'folder_path': schedule.folder_path,
+                    'is_muted': bool(schedule.is_muted),
+                    'start': start,
+                    'end': end,
+                    'duration': duration,
+                    'overlaps': []
+                })
+
+    occurrences.sort(key=lambda o: (o['start'], o['schedule_id']))
+    conflicts = _mark_overlaps(occurrences)
+
+    for occurrence in occurrences:
+        occurrence['start'] = occurrence['start'].isoformat()
+        occurrence['end'] = occurrence['end'].isoformat() if occurrence['end'] else None
+    return occurrences, conflicts
+
+
+def _mark_overlaps(occurrences):
+    """
+    Sweep the sorted occurrences and record overlaps in place.
+    Two occurrences overlap when they start at the same instant or one starts
+    before the other has finished (e.g. a bell during a playlist block).
+    Returns the number of overlapping pairs.
+    """
+    conflicts = 0
+    running = []  # occurrences that may still be playing at the current start
+    for occurrence in occurrences:
+        start = occurrence['start']
+        running = [r for r in running if r['start'] == start or (r['end'] is not None and r['end'] > start)]
+        for other in running:
+            if other['schedule_id'] == occurrence['schedule_id']:
+                continue
+            other['overlaps'].append(occurrence['schedule_id'])
+            occurrence['overlaps'].append(other['schedule_id'])
+            conflicts += 1
+        running.append(occurrence)
+    return conflicts
+
+
+class OccurrenceCache:
+    """Small thread-safe LRU cache of expansions keyed by list id and revision"""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def expand(self, schedule_list, start_date, days, duration_of, include_muted=False):
+        """Return the cached expansion of a list, computing it on a miss"""
+        key = (schedule_list.id, schedule_list.revision or 0, start_date, days, include_muted)
+        result = self.get(key)
+        if result is None:
+            occurrences, conflicts = expand_schedules(
+                schedule_list.schedules, start_date, days, duration_of, include_muted
+            )
+            result = {'occurrences': occurrences, 'conflicts': conflicts}
+            self.put(key, result)
+        return result
@@ -0,0 +1,183 @@
+"""
+Persistent cache of decoded audio.
+
+Decoding an MP3 into samples takes far longer than playing from them, and every
+process used to do it from scratch after each restart: the mixer for a ducking
+bell, silence analysis, duration lookups, render-ahead mixing - and every zone
+engine again for itself. The cache keeps each decode as a raw PCM file in the
+mixer's format, named by content hash and format:
+
+    instance/pcm-cache/<aa>/<sha256>.<rate>-<bits>-<channels>.pcm
+
+A hit memory-maps the file, so all processes read the same pages from the OS
+page cache, and a restart finds them already decoded. pygame.mixer.Sound(buffer=...)
+copies what it is given, so a Sound holds a private copy only while it exists -
+nothing keeps decoded audio in memory between playbacks. The length of a file is
+its size, so durations need no decode at all.
+
+Files are written atomically (a reader never sees a partial decode) and their
+mtime is bumped on use. When the cache grows past AUDIO_SCHEDULER_PCM_CACHE_MB
+(default 512) the least recently used files are deleted; a process that still has
+one mapped keeps reading it until it unmaps it.
+"""
+import logging
+import mmap
+import os
+import pathlib
+import threading
+import time
+
+from audio_store import hash_file
+
+logger = logging.getLogger('audio_scheduler.audio')
+
+APP_ROOT = pathlib.Path(__file__).resolve().parent
+CACHE_FOLDER = os.environ.get('AUDIO_SCHEDULER_PCM_CACHE') or str(APP_ROOT.joinpath('instance', 'pcm-cache'))
+MAX_BYTES = int(os.environ.get('AUDIO_SCHEDULER_PCM_CACHE_MB', 512)) * 1024 * 1024
+TOUCH_INTERVAL = 60  # Seconds between mtime updates of a file in use
+
+
+def mixer_format():
+    """(rate, bits, channels) of the initialised mixer"""
+    import pygame
+    frequency, size, channels = pygame.mixer.get_init()
+    return frequency, size, channels
+
+
+class PcmCache:
+    """Decoded audio by content hash, as memory-mapped raw files shared by all processes"""
+
+    def __init__(self, folder=CACHE_FOLDER, max_bytes=MAX_BYTES):
+        self.folder = pathlib.Path(folder)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hashes = {}  # (path, mtime_ns, size) -> content hash, so a file is hashed once per process
+        self._touched = {}  # cache path -> monotonic time of its last mtime update
+        self._size = None  # Bytes in the cache, as last counted
+        self.hits = 0
+        self.misses = 0
+
+    def content_hash(self, path):
+        stat = os.stat(path)
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self._hashes:
+                return self._hashes[key]
+        content_hash = hash_file(path)
+        with self._lock:
+            self._hashes[key] = content_hash
+        return content_hash
+
+    def path_for(self, content_hash, fmt):
+        frequency, size, channels = fmt
+        return self.folder / content_hash[:2] / f"{content_hash}.{frequency}-{abs(size)}-{channels}.pcm"
+
+    def _touch(self, cache_path):
+        now = time.monotonic()
+        if now - self._touched.get(cache_path, -TOUCH_INTERVAL) < TOUCH_INTERVAL:
+            return
+        self._touched[cache_path] = now
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+
+    def _decode(self, path, cache_path):
+        """Decode a file with the mixer and store its samples; returns the size"""
+        import pygame
+        raw = pygame.mixer.Sound(str(path)).get_raw()
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp, cache_path)
+        logger.debug("Decoded %s into the PCM cache (%.1f MB)", path, len(raw) / 1024 / 1024)
+        return len(raw)
+
+    def cached_path(self, path, content_hash=None):
+        """Path of the decoded samples of a file, decoding it on a miss (needs an initialised mixer)"""
+        cache_path = self.path_for(content_hash or self.content_hash(path), mixer_format())
+        if cache_path.exists():
+            self.hits += 1
+            self._touch(cache_path)
+            return cache_path
+        self.misses += 1
+        written = self._decode(path, cache_path)
+        with self._lock:
+            if self._size is not None:
+                self._size += written
+        self.evict(keep=cache_path)
+        return cache_path
+
+    def pcm(self, path, content_hash=None):
+        """The decoded samples of a file as a read-only memoryview of the mapped cache file"""
+        try:
+            f = open(self.cached_path(path, content_hash), 'rb')
+        except FileNotFoundError:  # Evicted by another process in between
+            f = open(self.cached_path(path, content_hash), 'rb')
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b'')
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def sound(self, path, content_hash=None, start=0.0):
+        """A pygame Sound of a file, start seconds in, built from the cache"""
+        import pygame
+        frequency, size, channels = mixer_format()
+        pcm = self.pcm(path, content_hash)
+        offset = int(start * frequency) * (abs(size) // 8) * channels
+        return pygame.mixer.Sound(buffer=pcm[offset:] if offset < len(pcm) else b'')
+
+    def duration(self, path, content_hash=None):
+        """Length of a file in seconds, from the size of its decoded samples"""
+        frequency, size, channels = mixer_format()
+        return self.cached_path(path, content_hash).stat().st_size / (frequency * (abs(size) // 8) * channels)
+
+    def _files(self):
+        files = []
+        for cache_path in self.folder.glob('*/*.pcm'):
+            try:
+                stat = cache_path.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            files.append((stat.st_mtime, stat.st_size, cache_path))
+        return files
+
+    def evict(self, keep=None):
+        """Delete the least recently used files (except keep) until the cache fits its cap; returns the bytes freed"""
+        with self._lock:
+            if self._size is not None and self._size <= self.max_bytes:
+                return 0
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            freed = 0
+            for _, size, cache_path in sorted(files):
+                if total - freed <= self.max_bytes:
+                    break
+                if cache_path == keep:
+                    continue
+                try:
+                    cache_path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:  # Windows won't delete a file that is mapped
+                    logger.debug("Could not evict %s: %s", cache_path, e)
+                    continue
+                freed += size
+            self._size = total - freed
+        if freed:
+            logger.info("Evicted %.1f MB from the PCM cache", freed / 1024 / 1024)
+        return freed
+
+    def stats(self):
+        files = self._files()
+        return {
+            'files': len(files),
+            'bytes': sum(size for _, size, _ in files),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+pcm_cache = PcmCache()
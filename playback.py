@@ -0,0 +1,265 @@
+"""
+Playback primitives shared by the in-process mixer and the per-zone engines.
+
+Everything here drives the pygame mixer of the *current* process, so the same code
+runs in the web/scheduler process and inside each zone worker process.
+"""
+import logging
+import random
+import time
+
+from metrics import AUDIO_LOAD_SECONDS, PLAYLIST_TRACKS, PLAYLIST_TRACKS_PER_RUN, PLAYLIST_GAP_SECONDS
+
+audio_logger = logging.getLogger('audio_scheduler.audio')
+playlist_logger = logging.getLogger('audio_scheduler.playlist')
+
+
+AUDIO_PATTERNS = ['*.mp3', '*.wav', '*.ogg', '*.m4a', '*.flac']
+
+
+def playlist_files(folder_path):
+    """Audio files of a playlist folder, sorted by name (case-insensitive)"""
+    audio_files = []
+    for pattern in AUDIO_PATTERNS:
+        audio_files.extend(folder_path.glob(pattern))
+        audio_files.extend(folder_path.glob(pattern.upper()))
+    audio_files.sort(key=lambda f: f.name.lower())
+    return audio_files
+
+
+def _play_music(start=0.0):
+    """Start the loaded music, skipping its first start seconds (leading silence, see silence.py)"""
+    import pygame
+    if start:
+        try:
+            pygame.mixer.music.play(start=start)
+            return
+        except pygame.error as e:
+            audio_logger.debug("Can't seek in this file, playing it from the start: %s", e)
+    pygame.mixer.music.play()
+
+
+def play_file(file_path, volume=1.0, start=0.0):
+    """Start playing a single file on the mixer's music stream, start seconds in"""
+    import pygame  # Imported on first playback, not when app.py is imported
+    load_start = time.perf_counter()
+    pygame.mixer.music.load(str(file_path))
+    AUDIO_LOAD_SECONDS.observe(time.perf_counter() - load_start)
+    pygame.mixer.music.set_volume(volume)
+    _play_music(start)
+    audio_logger.info("Playing audio: %s at volume %s%s", file_path, volume, f" from {start:.2f}s" if start else '')
+
+
+class MixerOutput:
+    """The current process's mixer as seen by an arbitration.Arbiter"""
+
+    def stop(self):
+        import pygame
+        if pygame.mixer.get_init():
+            pygame.mixer.music.stop()
+            pygame.mixer.stop()
+
+    def set_music_volume(self, volume):
+        import pygame
+        if pygame.mixer.get_init():
+            pygame.mixer.music.set_volume(max(0.0, min(1.0, volume)))
+
+
+def _play_overlay(file_path, volume, start):
+    """Play a file on a mixer channel, over the music stream (a ducking bell); returns the channel"""
+    from pcm_cache import pcm_cache
+    sound = pcm_cache.sound(file_path, start=start)
+    sound.set_volume(volume)
+    audio_logger.info("Playing audio: %s at volume %s over the music%s", file_path, volume, f" from {start:.2f}s" if start else '')
+    return sound.play()
+
+
+def play_claimed(arbiter, claim, file_path, volume=1.0, start=0.0):
+    """Play a single file once its claim owns the output, and hold the claim until it ends (blocking)"""
+    import pygame
+    try:
+        if not arbiter.wait(claim):
+            return
+        claim.volume = volume
+        if claim.overlay:
+            channel = _play_overlay(file_path, volume, start)
+            busy = channel.get_busy if channel is not None else (lambda: False)
+        else:
+            play_file(file_path, volume * claim.gain, start)
+            busy = pygame.mixer.music.get_busy
+        while busy() and not claim.cancelled.wait(0.05):
+            pass
+    finally:
+        arbiter.release(claim)
+
+
+def run_playlist(audio_files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume=1.0, trims=None,
+                 arbiter=None, claim=None):
+    """
+    Play tracks back to back until the duration or track limit is reached (blocking).
+    trims maps str(path) to the (start, end) seconds of a track's audible part. With a
+    claim, playback waits until it owns the output, follows its ducking gain and ends
+    early if it is preempted.
+    """
+    if claim is None:
+        return _play_tracks(audio_files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume, trims)
+    try:
+        if arbiter.wait(claim):
+            claim.volume = volume
+            _play_tracks(audio_files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume, trims, claim)
+    finally:
+        arbiter.release(claim)
+
+
+def _play_tracks(audio_files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume=1.0, trims=None, claim=None):
+    import pygame
+    
+    cancelled = claim.cancelled if claim is not None else None
+    gain = (lambda: claim.gain) if claim is not None else (lambda: 1.0)
+    start_time = time.time()
+    # Handle None duration by setting a default of 60 minutes
+    if duration_minutes is None:
+        duration_minutes = 60
+        playlist_logger.warning("No duration specified, using default of 60 minutes")
+    end_time = start_time + (duration_minutes * 60)
+    tracks_played = 0
+    previous_track_end = None  # For measuring the gap between tracks
+    file_list = list(audio_files)  # Make a copy
+    
+    # Fade out settings
+    fade_duration = 5.0  # Fade out over 5 seconds
+    
+    while time.time() < end_time and (max_tracks is None or tracks_played < max_tracks):
+        if cancelled is not None and cancelled.is_set():
+            break
+        
+        # If we've played all files and shuffle is enabled, reshuffle
+        if not file_list and shuffle_mode:
+            file_list = list(audio_files)
+            random.shuffle(file_list)
+        elif not file_list:
+            # If no shuffle, reset to original list
+            file_list = list(audio_files)
+        
+        # Get next file
+        audio_file = file_list.pop(0)
+        
+        # Check if this will be the last track (the folder repeats until the duration or max_tracks)
+        is_last_track = (
+            (max_tracks is not None and tracks_played + 1 >= max_tracks) or
+            (time.time() + fade_duration >= end_time)
+        )
+        
+        try:
+            playlist_logger.info("Playing playlist track: %s at volume %s%s", audio_file.name, volume, ' (LAST TRACK - will fade out)' if is_last_track else '')
+            load_start = time.perf_counter()
+            pygame.mixer.music.load(str(audio_file))
+            AUDIO_LOAD_SECONDS.observe(time.perf_counter() - load_start)
+            pygame.mixer.music.set_volume(volume * gain())
+            trim_start, trim_end = (trims or {}).get(str(audio_file), (0.0, None))
+            _play_music(trim_start)
+            PLAYLIST_TRACKS.inc()
+            if previous_track_end is not None:
+                PLAYLIST_GAP_SECONDS.observe(time.time() - previous_track_end)
+            
+            # Wait for the track to finish playing completely
+            track_start = time.time()
+            fade_started = False
+            
+            # Wait for track to finish playing naturally
+            while pygame.mixer.music.get_busy():
+                current_time = time.time()
+                
+                # Preempted or stopped: whoever took the output owns the mixer now
+                if cancelled is not None and cancelled.is_set():
+                    playlist_logger.info("Playlist preempted, stopping")
+                    break
+                
+                # Check if we've exceeded the total playlist duration while playing
+                if current_time >= end_time:
+                    pygame.mixer.music.stop()
+                    playlist_logger.info("Track stopped due to playlist duration limit")
+                    break
+                
+                # Skip the track's trailing silence
+                if trim_end is not None and current_time - track_start >= trim_end - trim_start:
+                    pygame.mixer.music.stop()
+                    break
+                
+                # Apply fade out for last track
+                if is_last_track and not fade_started:
+                    # Calculate when to start fading based on track length estimation
+                    time_remaining = end_time - current_time
+                    if max_tracks is not None and tracks_played + 1 >= max_tracks:
+                        # For max_tracks limit, start fading after a reasonable time
+                        if current_time - track_start > 10:  # After 10 seconds, start checking
+                            time_remaining = fade_duration
+                    
+                    # Start fade if we're within fade_duration seconds of the end
+                    if time_remaining <= fade_duration:
+                        fade_started = True
+                        fade_start_time = current_time
+                        playlist_logger.info("Starting fade-out for last track (remaining: %.1fs)", time_remaining)
+                
+                # Apply gradual volume reduction during fade
+                if fade_started:
+                    elapsed_fade = current_time - fade_start_time
+                    if elapsed_fade < fade_duration:
+                        # Linear fade from volume to 0
+                        fade_progress = elapsed_fade / fade_duration
+                        current_volume = volume * (1.0 - fade_progress)
+                        pygame.mixer.music.set_volume(max(0.0, current_volume * gain()))
+                    else:
+                        # Fade complete, stop the music
+                        pygame.mixer.music.fadeout(100)  # Quick final fadeout
+                        playlist_logger.info("Fade-out complete, stopping track")
+                        time.sleep(0.2)
+                        break
+                
+                time.sleep(0.1)
+            
+            track_end = time.time()
+            previous_track_end = track_end
+            track_duration = track_end - track_start
+            playlist_logger.info("Track '%s' finished after %.1fs", audio_file.name, track_duration)
+            
+            tracks_played += 1
+            
+            if cancelled is not None and cancelled.is_set():
+                break
+            
+            # Check if we've exceeded the total playlist duration
+            if time.time() >= end_time:
+                break
+                
+            # If this was the last track, exit the loop
+            if is_last_track:
+                playlist_logger.info("Last track completed, ending playlist")
+                break
+                
+            # Wait for the interval time before starting the next track
+            if track_interval_seconds and track_interval_seconds > 0:
+                # Check if we have enough time left for the full interval
+                if time.time() + track_interval_seconds < end_time:
+                    playlist_logger.debug("Waiting %ss interval before next track", track_interval_seconds)
+                    _sleep(track_interval_seconds, cancelled)
+                else:
+                    # Wait only for the remaining time if playlist duration is about to end
+                    remaining_time = end_time - time.time()
+                    if remaining_time > 0:
+                        playlist_logger.debug("Waiting %.1fs (shortened interval due to playlist duration limit)", remaining_time)
+                        _sleep(remaining_time, cancelled)
+                
+        except Exception as e:
+            playlist_logger.error("Error playing playlist track %s: %s", audio_file, e)
+            tracks_played += 1  # Count failed attempts to prevent infinite loops
+    
+    PLAYLIST_TRACKS_PER_RUN.observe(tracks_played)
+    playlist_logger.info("Playlist finished. Played %s tracks in %.1f minutes", tracks_played, (time.time() - start_time) / 60)
+
+
+def _sleep(seconds, cancelled=None):
+    if cancelled is None:
+        time.sleep(seconds)
+    else:
+        cancelled.wait(seconds)
@@ -0,0 +1,370 @@
+"""
+Pre-rendered playlist blocks.
+
+A playlist schedule with render_ahead set is mixed offline, during the idle window
+(01:00-05:00 by default), into one WAV file per upcoming occurrence: the tracks in
+the order they will air and trimmed of silence (see silence.py), the gaps between
+them, the gain and the final fade-out are all applied. When the block fires, play_playlist() plays that file as a single
+stream instead of decoding track after track and timing the gaps with sleeps, and
+the file - with a JSON sidecar listing the tracks and their offsets - can be
+auditioned from /prerender before it airs.
+
+A render is only used while its fingerprint (the schedule's playlist settings plus
+the names, sizes and mtimes of the folder's files) still matches; otherwise the
+block plays live as before. Renders run one at a time in a spawned worker process
+on SDL's dummy driver, so decoding never competes with the scheduler thread for the
+GIL or touches the real audio device. Mixing needs NumPy; without it render-ahead
+schedules simply play live.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import random
+import threading
+import time
+import wave
+from datetime import datetime, timedelta
+
+try:
+    import numpy
+except ImportError:  # Optional; render-ahead blocks then play live
+    numpy = None
+
+logger = logging.getLogger('audio_scheduler.playlist')
+
+APP_ROOT = pathlib.Path(__file__).resolve().parent
+PRERENDER_FOLDER = os.environ.get('AUDIO_SCHEDULER_PRERENDER_FOLDER') or str(APP_ROOT.joinpath('instance', 'prerendered'))
+PRERENDER_WINDOW = os.environ.get('AUDIO_SCHEDULER_PRERENDER_WINDOW', '01:00-05:00')
+
+FREQUENCY = 44100
+CHANNELS = 2
+FADE_SECONDS = 5.0  # Same fade-out as the live playlist's last track
+HORIZON = timedelta(hours=24)  # Occurrences rendered ahead on each pass
+LOOKUP_WINDOW = timedelta(minutes=10)  # How late a block may start and still use its render
+PASS_INTERVAL = 300  # Seconds between render passes inside the window
+KEEP_RENDERS = timedelta(days=1)  # Aired renders stay inspectable this long
+
+# 'spawn' gives the worker a fresh interpreter, like the zone engines
+_mp_context = multiprocessing.get_context('spawn')
+
+
+def parse_window(value):
+    """'HH:MM-HH:MM' -> (start minute, end minute); the window may wrap past midnight"""
+    start, end = value.split('-')
+    to_minute = lambda hhmm: int(hhmm.split(':')[0]) * 60 + int(hhmm.split(':')[1])
+    return to_minute(start), to_minute(end)
+
+
+def in_window(window, now):
+    start, end = window
+    minute = now.hour * 60 + now.minute
+    return start <= minute < end if start <= end else (minute >= start or minute < end)
+
+
+def render_name(schedule_id, start):
+    return f"{schedule_id}-{start:%Y%m%d-%H%M}"
+
+
+def fingerprint(schedule, audio_files, trims=None):
+    """Identity of what a block would sound like; a render with another fingerprint is stale"""
+    files = []
+    for path in audio_files:
+        stat = path.stat()
+        files.append((path.name, stat.st_size, stat.st_mtime_ns))
+    settings = [schedule.folder_path, schedule.playlist_duration or 60, schedule.track_interval,
+                schedule.max_tracks, bool(schedule.shuffle_mode),
+                schedule.volume if schedule.volume is not None else 1.0, files,
+                sorted((pathlib.Path(path).name, trim) for path, trim in (trims or {}).items())]
+    return hashlib.sha1(json.dumps(settings).encode('utf-8')).hexdigest()
+
+
+def track_order(audio_files, shuffle_mode, max_tracks, seed):
+    """
+    The tracks a block plays, like a live playlist: the folder over and over, reshuffled
+    (reproducibly) on every pass, up to max_tracks - or without end, for the renderer
+    to stop when the block is full.
+    """
+    rng = random.Random(seed)
+    played = 0
+    while True:
+        files = list(audio_files)
+        if shuffle_mode:
+            rng.shuffle(files)
+        for path in files:
+            if max_tracks and played >= max_tracks:
+                return
+            yield path
+            played += 1
+
+
+def render_block(job):
+    """Worker process entry point: mix one block into job['path'] (WAV) plus its JSON sidecar"""
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [prerender] %(message)s')
+    import pygame
+    from pcm_cache import pcm_cache
+
+    pygame.mixer.init(frequency=FREQUENCY, size=-16, channels=CHANNELS)
+    frequency, size, channels = pygame.mixer.get_init()
+    if abs(size) != 16:
+        logger.error("Pre-render needs a 16-bit mixer, got %s bits", size)
+        return
+
+    path = pathlib.Path(job['path'])
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    total_frames = int(job['duration_minutes'] * 60 * frequency)
+    gap_frames = int((job['track_interval'] or 0) * frequency)
+    fade_frames = int(FADE_SECONDS * frequency)
+    max_tracks = job['max_tracks']
+    played = []
+    position = 0
+    silent = 0  # Tracks in a row that added nothing; a whole pass of them would never fill the block
+
+    with wave.open(str(tmp), 'wb') as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(frequency)
+        for n, track in enumerate(track_order(job['tracks'], job['shuffle_mode'], max_tracks, job['seed'])):
+            try:
+                samples = numpy.frombuffer(pcm_cache.pcm(track), dtype=numpy.int16).reshape(-1, channels)
+            except Exception as e:
+                logger.error("Could not decode %s: %s", track, e)
+                samples = numpy.empty((0, channels), dtype=numpy.int16)
+            trim_start, trim_end = job['trims'].get(track, (0.0, None))
+            samples = samples[int(trim_start * frequency):int(trim_end * frequency) if trim_end is not None else None]
+            if len(samples) == 0:
+                silent += 1
+                if silent >= len(job['tracks']):
+                    break
+                continue
+            silent = 0
+
+            frames = min(len(samples), total_frames - position)
+            block = samples[:frames].astype(numpy.float32) * job['volume']
+            last = max_tracks and n == max_tracks - 1
+            if last or position + frames >= total_frames:
+                fade = min(fade_frames, frames)
+                block[frames - fade:] *= numpy.linspace(1.0, 0.0, fade, dtype=numpy.float32)[:, None]
+            out.writeframes(numpy.clip(block, -32768, 32767).astype(numpy.int16).tobytes())
+            played.append({'file': pathlib.Path(track).name, 'offset': round(position / frequency, 3),
+                           'seconds': round(frames / frequency, 3)})
+            position += frames
+            if position >= total_frames or last:
+                break
+
+            gap = min(gap_frames, total_frames - position)
+            if gap > 0:
+                out.writeframes(bytes(gap * channels * 2))
+                position += gap
+
+    pygame.mixer.quit()
+    if not played:
+        tmp.unlink(missing_ok=True)
+        logger.error("Nothing could be rendered for %s", path.name)
+        return
+
+    os.replace(tmp, path)
+    sidecar = dict(job['meta'], tracks=played, seconds=round(position / frequency, 3),
+                   frequency=frequency, channels=channels, rendered_at=datetime.now().isoformat(timespec='seconds'))
+    path.with_suffix('.json').write_text(json.dumps(sidecar, indent=2), encoding='utf-8')
+    logger.info("Rendered %s: %s tracks, %.1f minutes", path.name, len(played), position / frequency / 60)
+
+
+class Prerenderer:
+    """Renders upcoming render-ahead blocks in the idle window and finds renders at play time"""
+
+    def __init__(self, app, playlists_folder, folder=PRERENDER_FOLDER, window=PRERENDER_WINDOW):
+        self.app = app
+        self.playlists_folder = playlists_folder
+        self.folder = pathlib.Path(folder)
+        self.window = parse_window(window)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # One render at a time
+        self._process = None
+
+    # --- Lifecycle ---------------------------------------------------------------
+
+    def start(self):
+        """Render passes in the process that owns the scheduler"""
+        if numpy is None:
+            logger.warning("NumPy is not installed - render-ahead playlists will play live")
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Prerenderer")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        process = self._process
+        if process is not None and process.is_alive():
+            process.terminate()
+
+    def _run(self, initial_delay=10):
+        delay = initial_delay
+        while not self._stop.wait(delay):
+            delay = PASS_INTERVAL
+            now = datetime.now()
+            if not in_window(self.window, now):
+                continue
+            try:
+                self.render_pending(now)
+                self.cleanup(now)
+            except Exception as e:
+                logger.error("Pre-render pass failed: %s", e, exc_info=True)
+
+    # --- Rendering ---------------------------------------------------------------
+
+    def _paths(self, schedule_id, start):
+        wav = self.folder / f"{render_name(schedule_id, start)}.wav"
+        return wav, wav.with_suffix('.json')
+
+    def _is_current(self, schedule_id, start, expected):
+        wav, sidecar = self._paths(schedule_id, start)
+        try:
+            return wav.exists() and json.loads(sidecar.read_text(encoding='utf-8')).get('fingerprint') == expected
+        except (OSError, ValueError):
+            return False
+
+    def upcoming(self, now, schedule_id=None):
+        """(schedule, start) of render-ahead blocks starting within HORIZON (needs an app context)"""
+        from models import Schedule
+        from occurrences import schedule_minutes_on
+        from sites import playing_lists
+
+        blocks = []
+        for offset in range(HORIZON.days + 1):
+            day = now.date() + timedelta(days=offset)
+            list_ids = [schedule_list.id for schedule_list in playing_lists(day).values()]
+            if not list_ids:
+                continue
+            query = Schedule.query.filter(Schedule.schedule_list_id.in_(list_ids)).filter_by(schedule_type='playlist', render_ahead=True)
+            if schedule_id is not None:
+                query = query.filter_by(id=schedule_id)
+            midnight = datetime(day.year, day.month, day.day)
+            for schedule in query.filter(Schedule.is_muted.isnot(True)).all():
+                for minute_of_day in schedule_minutes_on(schedule, day):
+                    start = midnight + timedelta(minutes=minute_of_day)
+                    if now < start <= now + HORIZON:
+                        blocks.append((schedule, start))
+        blocks.sort(key=lambda block: block[1])
+        return blocks
+
+    def _job(self, schedule, start):
+        """The render job for one block, or None if its render is current or the folder is empty"""
+        from playback import playlist_files
+        from silence import trims_for_files
+
+        audio_files = playlist_files(APP_ROOT.joinpath(schedule.folder_path))
+        if not audio_files:
+            return None
+        trims = trims_for_files(audio_files, self.playlists_folder)
+        expected = fingerprint(schedule, audio_files, trims)
+        if self._is_current(schedule.id, start, expected):
+            return None
+        name = render_name(schedule.id, start)
+        return {
+            'path': str(self.folder / f"{name}.wav"),
+            'tracks': [str(f) for f in audio_files],
+            'shuffle_mode': bool(schedule.shuffle_mode),
+            'max_tracks': schedule.max_tracks,
+            'seed': name,
+            'duration_minutes': schedule.playlist_duration or 60,
+            'track_interval': schedule.track_interval,
+            'volume': schedule.volume if schedule.volume is not None else 1.0,
+            'trims': trims,
+            'meta': {'schedule_id': schedule.id, 'folder_path': schedule.folder_path,
+                     'start': start.isoformat(), 'fingerprint': expected},
+        }
+
+    def render_pending(self, now, schedule_id=None):
+        """Render every upcoming block without a current render; returns how many were rendered"""
+        if numpy is None:
+            return 0
+        with self.app.app_context():
+            jobs = [job for job in (self._job(schedule, start) for schedule, start in self.upcoming(now, schedule_id)) if job]
+        rendered = 0
+        for job in jobs:
+            if self._stop.is_set():
+                break
+            if self.render(job):
+                rendered += 1
+        return rendered
+
+    def render(self, job):
+        """Run one job in a worker process (blocking); returns True if the render was written"""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            started = time.perf_counter()
+            self._process = _mp_context.Process(target=render_block, args=(job,), daemon=True,
+                                                name=f"Prerender-{job['meta']['schedule_id']}")
+            self._process.start()
+            self._process.join(max(600, job['duration_minutes'] * 60))
+            if self._process.is_alive():
+                self._process.terminate()
+                logger.error("Pre-render of %s timed out", pathlib.Path(job['path']).name)
+            ok = self._process.exitcode == 0 and pathlib.Path(job['path']).with_suffix('.json').exists()
+            self._process = None
+        if ok:
+            logger.info("Pre-rendered %s in %.1fs", pathlib.Path(job['path']).name, time.perf_counter() - started)
+        return ok
+
+    def render_schedule(self, schedule_id):
+        """Render one schedule's upcoming blocks now, in the background (dashboard button)"""
+        threading.Thread(target=self.render_pending, args=(datetime.now(), schedule_id),
+                         daemon=True, name=f"Prerender-{schedule_id}").start()
+
+    def cleanup(self, now):
+        """Remove renders that aired more than KEEP_RENDERS ago and abandoned temporary files"""
+        if not self.folder.exists():
+            return
+        for path in self.folder.iterdir():
+            if path.name.startswith('.') and path.stat().st_mtime < time.time() - 24 * 3600:
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                start = datetime.strptime(path.stem.split('-', 1)[1], '%Y%m%d-%H%M')
+            except (IndexError, ValueError):
+                continue
+            if start < now - KEEP_RENDERS:
+                path.unlink(missing_ok=True)
+
+    # --- Playback ----------------------------------------------------------------
+
+    def lookup(self, schedule, audio_files, trims=None, now=None):
+        """Path of the current render for the block firing now, or None to play it live"""
+        from occurrences import schedule_minutes_on
+
+        now = now or datetime.now()
+        expected = None
+        for day in (now.date() - timedelta(days=1), now.date()):
+            midnight = datetime(day.year, day.month, day.day)
+            for minute_of_day in schedule_minutes_on(schedule, day):
+                start = midnight + timedelta(minutes=minute_of_day)
+                if not start <= now < start + LOOKUP_WINDOW:
+                    continue
+                expected = expected or fingerprint(schedule, audio_files, trims)
+                if self._is_current(schedule.id, start, expected):
+                    return self._paths(schedule.id, start)[0]
+                logger.warning("No current pre-render for playlist %s at %s - playing live", schedule.id, start.strftime('%H:%M'))
+        return None
+
+    def renders(self):
+        """Sidecars of the renders on disk, soonest first"""
+        if not self.folder.exists():
+            return []
+        renders = []
+        for sidecar in self.folder.glob('*.json'):
+            try:
+                info = json.loads(sidecar.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            info['name'] = sidecar.with_suffix('.wav').name
+            renders.append(info)
+        renders.sort(key=lambda info: info.get('start', ''))
+        return renders
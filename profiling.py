@@ -0,0 +1,238 @@
+"""
+Opt-in request profiling with sampled stack capture.
+
+ProfilingMiddleware wraps the WSGI app. It profiles a random fraction of requests
+(AUDIO_SCHEDULER_PROFILE_RATE) plus any request that carries an "X-Profile: 1"
+header. While a profiled request runs, one sampler thread reads its Python stack
+via sys._current_frames() every few milliseconds. Unprofiled requests pay only a
+random() call.
+
+Samples are aggregated per Flask endpoint as collapsed stacks ("a;b;c count"),
+the input format of flamegraph.pl and speedscope. Each process dumps its
+aggregates to instance/profiles/<pid>.json when it is idle, so the admin
+endpoints can merge the data from every Gunicorn worker.
+
+Enable with AUDIO_SCHEDULER_PROFILING=1.
+"""
+import json
+import logging
+import os
+import pathlib
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger('audio_scheduler')
+
+APP_ROOT = pathlib.Path(__file__).resolve().parent
+DEFAULT_PROFILE_DIR = APP_ROOT.joinpath('instance', 'profiles')
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+MAX_STACK_DEPTH = 64
+MAX_STACKS_PER_ROUTE = 5000  # Distinct stacks kept per route; rarer ones are folded into "[other]"
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class StackSampler:
+    """Samples the stacks of registered threads and aggregates them per route"""
+
+    def __init__(self, interval=0.005, profile_dir=None):
+        self.interval = interval
+        self.profile_dir = pathlib.Path(profile_dir or DEFAULT_PROFILE_DIR)
+        self._active = {}  # thread id -> route
+        self._stacks = {}  # route -> Counter of collapsed stacks
+        self._requests = Counter()  # route -> profiled requests
+        self._wall = Counter()  # route -> seconds spent in profiled requests
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._dirty = False
+        self._thread = None
+
+    def begin(self, thread_id):
+        with self._lock:
+            self._active[thread_id] = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="ProfileSampler")
+                self._thread.start()
+        self._wakeup.set()
+
+    def end(self, thread_id, route, elapsed):
+        with self._lock:
+            self._active.pop(thread_id, None)
+            # Samples are taken before the route is known, so they are filed under the thread until now
+            pending = self._stacks.pop(('thread', thread_id), None)
+            if pending:
+                self._add(route, pending)
+            self._requests[route] += 1
+            self._wall[route] += elapsed
+            self._dirty = True
+
+    def _add(self, route, stacks):
+        target = self._stacks.setdefault(route, Counter())
+        for stack, count in stacks.items():
+            if stack in target or len(target) < MAX_STACKS_PER_ROUTE:
+                target[stack] += count
+            else:
+                target['[other]'] += count
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                if self._dirty:
+                    self._dump()
+                self._wakeup.clear()
+                self._wakeup.wait(5)
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in active:
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != me:
+                        self._stacks.setdefault(('thread', thread_id), Counter())[_collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def snapshot(self):
+        """This process's aggregates in the on-disk format"""
+        with self._lock:
+            return {
+                route: {
+                    'requests': self._requests[route],
+                    'wall_seconds': round(self._wall[route], 4),
+                    'stacks': dict(self._stacks.get(route, {}))
+                }
+                for route in self._requests
+            }
+
+    def _dump(self):
+        with self._dump_lock:
+            self._dirty = False
+            try:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                path = self.profile_dir / f"{os.getpid()}.json"
+                tmp = path.with_suffix('.tmp')
+                tmp.write_text(json.dumps(self.snapshot()))
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning("Could not write profile samples: %s", e)
+
+    def load_all(self):
+        """Merge the dumps of every process (including this one) into route -> aggregates"""
+        self._dump()
+        merged = {}
+        for path in self.profile_dir.glob('*.json'):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for route, entry in data.items():
+                target = merged.setdefault(route, {'requests': 0, 'wall_seconds': 0.0, 'stacks': Counter()})
+                target['requests'] += entry['requests']
+                target['wall_seconds'] += entry['wall_seconds']
+                target['stacks'].update(entry['stacks'])
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._stacks = {key: value for key, value in self._stacks.items() if isinstance(key, tuple)}
+            self._requests.clear()
+            self._wall.clear()
+            self._dirty = False
+        for path in self.profile_dir.glob('*.json'):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def collapsed_text(stacks, root=None):
+    """Render a stack Counter in collapsed format, optionally under a root frame"""
+    prefix = f"{root};" if root else ''
+    return ''.join(f"{prefix}{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class _ProfiledBody:
+    """Streams a sampled response through, ending its sample when the server closes it"""
+
+    def __init__(self, body, finish):
+        self._body = body
+        self._finish = finish
+
+    def __iter__(self):
+        # Rendering inside the response iterator runs here, so it is sampled too
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            finish, self._finish = self._finish, None
+            if finish is not None:
+                finish()
+
+
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, url_map, sample_rate=0.0, sampler=None):
+        self.wsgi_app = wsgi_app
+        self.url_map = url_map
+        self.sample_rate = sample_rate
+        self.sampler = sampler or StackSampler()
+
+    def _route(self, environ):
+        try:
+            endpoint, _ = self.url_map.bind_to_environ(environ).match()
+            return endpoint
+        except Exception:
+            return 'unmatched'
+
+    def __call__(self, environ, start_response):
+        forced = environ.get(PROFILE_HEADER) == '1'
+        if not forced and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return self.wsgi_app(environ, start_response)
+
+        thread_id = threading.get_ident()
+        started = time.perf_counter()
+
+        def finish():
+            self.sampler.end(thread_id, self._route(environ), time.perf_counter() - started)
+
+        self.sampler.begin(thread_id)
+        try:
+            body = self.wsgi_app(environ, start_response)
+        except BaseException:
+            finish()
+            raise
+        # Not joined into one bytes object: audio and pre-rendered WAVs can be hundreds of MB
+        return _ProfiledBody(body, finish)
+
+
+def install(app):
+    """Wrap app.wsgi_app when AUDIO_SCHEDULER_PROFILING is set; returns the sampler or None"""
+    if os.environ.get('AUDIO_SCHEDULER_PROFILING', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    sample_rate = float(os.environ.get('AUDIO_SCHEDULER_PROFILE_RATE', 0.01))
+    interval = float(os.environ.get('AUDIO_SCHEDULER_PROFILE_INTERVAL_MS', 5)) / 1000
+    middleware = ProfilingMiddleware(app.wsgi_app, app.url_map, sample_rate, StackSampler(interval))
+    app.wsgi_app = middleware
+    logger.info("Request profiling enabled (sample rate %.2f%%, every %.0f ms)", sample_rate * 100, interval * 1000)
+    return middleware.sampler
@@ -0,0 +1,219 @@
+"""
+Recurrence rules for schedules.
+
+A plain schedule fires at its time on its weekdays. Schedule.recurrence may hold
+a rule that makes one row stand for many fires, stored as compact JSON:
+
+    {"every": 45, "until": "15:00"}       every 45 minutes from the schedule's time through 15:00
+    {"nth": [1, 3]}                       only the 1st and 3rd of its weekdays in a month (-1: the last)
+    {"from": "2026-09-01", "to": "2027-06-30"}   only between these dates (inclusive)
+    {"cron": "0 8-15 * * 1-5"}            minute hour day-of-month month day-of-week; replaces the time,
+                                          the weekdays, every/until and nth
+
+Keys combine (a period bell every 45 minutes during term time is one row). Rules
+are never stored as fires: the scheduler expands the rows of the playing list into
+its fire index once per day and list revision (occurrences.fire_index), and
+everything else that needs the fires of a day goes through minutes_on(). Compiled
+rules are cached by their text, so a row costs the same to evaluate as a plain one.
+"""
+import json
+import logging
+from datetime import date, timedelta
+from functools import lru_cache
+
+logger = logging.getLogger('audio_scheduler')
+
+KEYS = ('every', 'until', 'nth', 'from', 'to', 'cron')
+
+_MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+_WEEKDAYS = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+
+
+def _minute_of_day(value, field):
+    try:
+        hour, minute = map(int, str(value).split(':'))
+    except ValueError:
+        raise ValueError(f"{field} must be HH:MM")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"{field} must be HH:MM")
+    return hour * 60 + minute
+
+
+def _cron_field(text, low, high, names=None):
+    """Values of one cron field: *, a, a-b, */n, a-b/n and comma-separated lists of those"""
+    values = set()
+    for part in text.lower().split(','):
+        spec, _, step = part.partition('/')
+        if step and not step.isdigit():
+            raise ValueError(f"invalid cron field '{text}'")
+        step = int(step) if step else 1
+        if spec == '*':
+            first, last = low, high
+        else:
+            first, _, last = spec.partition('-')
+            if names and first in names:
+                first = names.index(first) + low
+            if names and last in names:
+                last = names.index(last) + low
+            try:
+                first = int(first)
+                last = int(last) if last else (high if step > 1 else first)
+            except ValueError:
+                raise ValueError(f"invalid cron field '{text}'")
+        if step < 1 or not (low <= first <= last <= high):
+            raise ValueError(f"cron field '{text}' out of range {low}-{high}")
+        values.update(range(first, last + 1, step))
+    return values
+
+
+class Cron:
+    """A five-field cron expression"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("cron needs five fields: minute hour day-of-month month day-of-week")
+        minutes = _cron_field(fields[0], 0, 59)
+        hours = _cron_field(fields[1], 0, 23)
+        self.days = _cron_field(fields[2], 1, 31)
+        self.months = _cron_field(fields[3], 1, 12, _MONTHS)
+        cron_weekdays = _cron_field(fields[4], 0, 7, _WEEKDAYS)  # 0 and 7 are Sunday
+        self.weekdays = {(d - 1) % 7 for d in cron_weekdays}  # date.weekday(): Monday is 0
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+        self.any_month = fields[3] == '*'
+        self.minutes = sorted(h * 60 + m for h in hours for m in minutes)
+
+    def matches(self, day):
+        if day.month not in self.months:
+            return False
+        # Like cron: restricting both day fields means either may match
+        if not self.any_day and not self.any_weekday:
+            return day.day in self.days or day.weekday() in self.weekdays
+        return day.day in self.days and day.weekday() in self.weekdays
+
+
+class Recurrence:
+    """A rule compiled against its schedule's time and weekday flags"""
+
+    def __init__(self, rule, time, days):
+        self.rule = rule
+        self.days = tuple(bool(d) for d in days)
+        self.nth = set(rule.get('nth') or ())
+        self.start = date.fromisoformat(rule['from']) if rule.get('from') else None
+        self.end = date.fromisoformat(rule['to']) if rule.get('to') else None
+        self.cron = Cron(rule['cron']) if rule.get('cron') else None
+        if self.cron is None:
+            first = _minute_of_day(time, 'time')
+            every = rule.get('every')
+            last = _minute_of_day(rule['until'], 'until') if every and rule.get('until') else 24 * 60 - 1
+            self.minutes = list(range(first, last + 1, every)) if every else [first]
+        else:
+            self.minutes = self.cron.minutes
+
+    def fires_on(self, day):
+        if (self.start is not None and day < self.start) or (self.end is not None and day > self.end):
+            return False
+        if self.cron is not None:
+            return self.cron.matches(day)
+        if not self.days[day.weekday()]:
+            return False
+        if self.nth:
+            week = (day.day - 1) // 7 + 1
+            last = (day + timedelta(days=7)).month != day.month
+            return week in self.nth or (last and -1 in self.nth)
+        return True
+
+    def minutes_on(self, day):
+        """Minutes of the day (0..1439) at which the schedule fires on a date, ascending"""
+        return self.minutes if self.fires_on(day) else []
+
+    def weekly(self):
+        """(minutes, weekday mask) if the rule only depends on the weekday, otherwise None"""
+        if self.start is not None or self.end is not None or self.nth:
+            return None
+        if self.cron is not None:
+            if not (self.cron.any_day and self.cron.any_month):
+                return None
+            return self.minutes, sum(1 << d for d in self.cron.weekdays)
+        return self.minutes, sum(1 << d for d, active in enumerate(self.days) if active)
+
+
+def parse(value, time=None):
+    """
+    Validate a rule (a dict or its JSON text) for a schedule at time (HH:MM);
+    returns its compact JSON text, or None for no rule. Raises ValueError.
+    """
+    if value in (None, '', {}):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError("recurrence must be a JSON object")
+    if not isinstance(value, dict):
+        raise ValueError("recurrence must be a JSON object")
+    unknown = set(value) - set(KEYS)
+    if unknown:
+        raise ValueError(f"unknown recurrence keys: {', '.join(sorted(unknown))}")
+
+    rule = {}
+    if value.get('cron') is not None:
+        if any(value.get(key) for key in ('every', 'until', 'nth')):
+            raise ValueError("cron can't be combined with every, until or nth")
+        Cron(str(value['cron']))
+        rule['cron'] = ' '.join(str(value['cron']).split())
+    if value.get('every') is not None:
+        every = value['every']
+        if not isinstance(every, int) or isinstance(every, bool) or not (1 <= every < 24 * 60):
+            raise ValueError("every must be a number of minutes between 1 and 1439")
+        rule['every'] = every
+    if value.get('until') is not None:
+        if 'every' not in rule:
+            raise ValueError("until needs every")
+        until = _minute_of_day(value['until'], 'until')
+        if time is not None and until < _minute_of_day(time, 'time'):
+            raise ValueError("until must not be before the schedule's time")
+        rule['until'] = value['until']
+    if value.get('nth') is not None:
+        nth = value['nth'] if isinstance(value['nth'], list) else [value['nth']]
+        if not nth or any(n not in (1, 2, 3, 4, 5, -1) or isinstance(n, bool) for n in nth):
+            raise ValueError("nth must be a list of 1..5, or -1 for the last")
+        rule['nth'] = sorted(set(nth))
+    for key in ('from', 'to'):
+        if value.get(key) is not None:
+            try:
+                date.fromisoformat(value[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a date (YYYY-MM-DD)")
+            rule[key] = value[key]
+    if rule.get('from') and rule.get('to') and rule['from'] > rule['to']:
+        raise ValueError("from must not be after to")
+    return json.dumps(rule, sort_keys=True, separators=(',', ':')) if rule else None
+
+
+def loads(text):
+    return json.loads(text) if text else None
+
+
+def cron_defaults(text):
+    """(HH:MM of the first fire, weekdays) a cron rule's schedule shows as its time and days; None without cron"""
+    rule = loads(text)
+    if not rule or not rule.get('cron'):
+        return None
+    cron = Cron(rule['cron'])
+    return f"{cron.minutes[0] // 60:02d}:{cron.minutes[0] % 60:02d}", sorted(cron.weekdays)
+
+
+@lru_cache(maxsize=4096)
+def compiled(text, time, days):
+    return Recurrence(loads(text), time, days)
+
+
+def for_schedule(schedule):
+    """The compiled rule of a schedule (plain schedules get one too), or None if it is invalid"""
+    try:
+        return compiled(schedule.recurrence or '{}', schedule.time, tuple(bool(d) for d in schedule.active_days()))
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error("Schedule %s has an invalid recurrence %r: %s", schedule.id, schedule.recurrence, e)
+        return None
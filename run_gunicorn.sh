@@ -32,8 +32,19 @@ echo "📡 Server will be available at: http://localhost:5000"
 echo "🛑 Press Ctrl+C to stop the server"
 echo ""
 
+# Workers: every worker contends for instance/scheduler.lock and only the leader runs the
+# scheduler, so several workers never fire a bell twice (do NOT add --preload, the lock
+# would then be taken by the master process). With AUDIO_SCHEDULER_ROLE=web the scheduler
+# runs in audio_daemon.py instead.
+WORKERS=${GUNICORN_WORKERS:-1}
+if [ "$AUDIO_SCHEDULER_ROLE" = "web" ]; then
+    WORKERS=${GUNICORN_WORKERS:-4}
+fi
+# Workers only export their metrics for each other when there are several (see metrics.py)
+export WEB_CONCURRENCY="$WORKERS"
+
 # Run with Gunicorn
-# -w 1: Use only 1 worker (CRITICAL: prevents duplicate schedulers!)
+# -w $WORKERS: Number of worker processes (see above)
 # -b 0.0.0.0:5000: Bind to all interfaces on port 5000
 # --timeout 120: Allow 2 minutes for long-running requests
 # --log-level info: Log level
@@ -41,7 +52,7 @@ echo ""
 # --error-logfile logs/gunicorn_error.log: Error log
 # --capture-output: Capture stdout/stderr to error log
 exec gunicorn \
-    -w 1 \
+    -w "$WORKERS" \
     -b 0.0.0.0:5000 \
     --timeout 120 \
     --log-level info \
@@ -11,9 +11,13 @@ APP_ROOT = pathlib.Path(__file__).resolve().parent
 if str(APP_ROOT) not in sys.path:
     sys.path.insert(0, str(APP_ROOT))
 
-from app import app, logger, scheduler, init_schedules, db
-
 if __name__ == '__main__':
+    # Fire bells from the compiled schedule snapshot while the app below is still loading
+    from snapshot import start_fast_path
+    fast_path = start_fast_path()
+
+    from app import create_app, logger, init_schedules, cleanup_scheduler, db
+    app = create_app(fast_path=fast_path)
     logger.info("Starting Audio Scheduler in PRODUCTION mode...")
     
     # Create database tables
@@ -31,8 +35,5 @@ if __name__ == '__main__':
         # Run in production mode (debug=False)
         app.run(debug=False, host='0.0.0.0', port=5000, threaded=True)
     finally:
-        # Ensure scheduler is properly shut down on exit
-        if scheduler is not None:
-            logger.info("Shutting down scheduler...")
-            scheduler.stop()
-            logger.info("Scheduler shut down complete")
+        # Ensure scheduler is properly shut down (and leadership released) on exit
+        cleanup_scheduler()
@@ -0,0 +1,289 @@
+"""
+Polling scheduler.
+
+SimpleScheduler checks the active schedule list once per minute and hands due
+schedules to a sink. Time comes from an injectable clock and playback goes to an
+injectable sink, so the same code runs in production (SystemClock + ThreadedSink)
+and in the deterministic simulation in simulate_scheduler.py. If the database
+can't be read, due bells come from the compiled snapshot (snapshot.py) instead.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
+import metrics
+from arbitration import priority_of, request_for
+from clock import system_clock
+from journal import ExecutionJournal
+from occurrences import fire_index
+from snapshot import SnapshotEntry
+
+logger = logging.getLogger('audio_scheduler')
+playlist_logger = logging.getLogger('audio_scheduler.playlist')
+
+
+class ThreadedSink:
+    """
+    Starts playback of each fired schedule on its own daemon thread. Sounds for the
+    default output claim it from the arbiter right here, in firing order, so which
+    one wins doesn't depend on how the playback threads get scheduled.
+    """
+
+    def __init__(self, play_audio, play_playlist, play_snapshot_entry=None, arbiter=None):
+        self.play_audio = play_audio  # callable(schedule_id, claim)
+        self.play_playlist = play_playlist  # callable(schedule_id, claim)
+        self.play_snapshot_entry = play_snapshot_entry  # callable(SnapshotEntry, claim), used without a database
+        self.arbiter = arbiter  # arbitration.Arbiter of the default output; zones arbitrate in their engine
+
+    def fire(self, schedule, scheduled_at, fired_at):
+        if isinstance(schedule, SnapshotEntry):
+            if schedule.schedule_type != 'single_file' or schedule.zoned or self.play_snapshot_entry is None:
+                logger.error("Schedule %s needs the database to play - skipped", schedule.id)
+                return
+            target, arg, name = self.play_snapshot_entry, schedule, f"Audio-{schedule.id}"
+            zoned = False
+        elif schedule.schedule_type == 'playlist':
+            target, arg, name = self.play_playlist, schedule.id, f"Playlist-{schedule.id}"
+            zoned = bool(schedule.output_zones())
+        else:
+            target, arg, name = self.play_audio, schedule.id, f"Audio-{schedule.id}"
+            zoned = bool(schedule.output_zones())
+
+        claim = None
+        if self.arbiter is not None and not zoned:
+            claim = self.arbiter.request(*request_for(schedule))
+            if claim.decision == 'skip':
+                return
+        threading.Thread(target=self._run, args=(target, arg, schedule.id, claim), daemon=True, name=name).start()
+
+    def _run(self, target, arg, schedule_id, claim):
+        try:
+            target(arg, claim)
+        except Exception as e:
+            playlist_logger.error("Error playing schedule %s: %s", schedule_id, e, exc_info=True)
+        finally:
+            if claim is not None:
+                self.arbiter.release(claim)  # No-op if the player already released it
+
+
+class RecordingSink:
+    """Collects fires instead of playing them (simulation and tests)"""
+
+    def __init__(self):
+        self.fires = []  # (schedule_id, scheduled_at, fired_at)
+
+    def fire(self, schedule, scheduled_at, fired_at):
+        self.fires.append((schedule.id, scheduled_at, fired_at))
+
+
+# Simple Polling-Based Scheduler
+class SimpleScheduler:
+    """
+    Simple polling-based scheduler that checks database every second.
+    Much more reliable than APScheduler for this use case - no job lifecycle issues.
+    """
+
+    # Minutes the loop looks back after a stall before giving up on recording misses
+    MAX_MISSED_MINUTES = 60
+
+    def __init__(self, app_instance, db_instance, schedule_model, sink, journal=None, catchup_seconds=120, clock=None,
+                 snapshot=None):
+        self.app = app_instance
+        self.db = db_instance
+        self.Schedule = schedule_model
+        self.sink = sink  # Receives due schedules: sink.fire(schedule, scheduled_at, fired_at)
+        self.clock = clock or system_clock
+        self.snapshot = snapshot  # SnapshotFile to fire from while the database can't be read
+        self._shards = {}  # site id -> ((list id, revision, date), {minute of day: [schedule ids]})
+        self.running = False
+        self.thread = None
+        self.journal = journal or ExecutionJournal(app_instance)  # Tracks what was executed, persisted off the hot path
+        self.catchup_seconds = catchup_seconds  # Fire a missed bell if it is at most this late
+        self.last_checked_minute = None
+        logger.info("SimpleScheduler initialized")
+
+    def start(self, handoff=()):
+        """
+        Start the scheduler polling thread. handoff lists (schedule id, scheduled minute,
+        fired at) of bells already fired by the snapshot fast path.
+        """
+        if self.running:
+            logger.warning("Scheduler already running")
+            return
+
+        # Replay the journal so a restart neither repeats nor silently drops recent bells
+        self.last_checked_minute = None
+        try:
+            self.journal.replay(self.clock.now() - timedelta(seconds=self.catchup_seconds + 120))
+        except Exception as e:
+            logger.error("Could not replay execution journal: %s", e)
+        for schedule_id, scheduled_at, fired_at in handoff:
+            if self.journal.claim(schedule_id, scheduled_at):
+                self.journal.record(schedule_id, scheduled_at, 'fired', fired_at)
+                metrics.SCHEDULER_FIRES.inc(outcome='fired')
+        if handoff:
+            logger.info("Took over %s bells fired from the schedule snapshot during startup", len(handoff))
+        self.journal.start()
+
+        self.running = True
+        self.thread = threading.Thread(target=self._schedule_loop, daemon=True, name="SchedulerThread")
+        self.thread.start()
+        logger.info("✅ Simple scheduler started - polling every second")
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        if not self.running:
+            return
+
+        logger.info("Stopping scheduler...")
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        self.journal.stop()
+        logger.info("✅ Scheduler stopped")
+
+    def _schedule_loop(self):
+        """Main scheduling loop - checks time every second"""
+        consecutive_errors = 0
+
+        while self.running:
+            try:
+                if self.tick():
+                    consecutive_errors = 0  # Reset error counter on success
+
+                # Sleep for 1 second before next check
+                self.clock.sleep(1)
+
+            except Exception as e:
+                consecutive_errors += 1
+                logger.error("Error in schedule loop (attempt %s): %s", consecutive_errors, e, exc_info=True)
+                if consecutive_errors > 5:
+                    logger.critical("Too many consecutive errors, scheduler loop stopping")
+                    break
+                self.clock.sleep(5)  # Wait longer on error
+
+    def tick(self):
+        """One loop iteration; returns True if a new minute was checked"""
+        current_minute = self.clock.now().replace(second=0, microsecond=0)
+        metrics.SCHEDULER_LOOP_ITERATIONS.inc()
+
+        # Only check schedules once per minute - plus any minutes skipped by a stall or restart
+        if current_minute == self.last_checked_minute:
+            return False
+        for minute in self._minutes_to_check(current_minute):
+            check_start = time.perf_counter()
+            self._check_and_execute_schedules(minute)
+            metrics.SCHEDULER_CHECK_SECONDS.observe(time.perf_counter() - check_start)
+        self.last_checked_minute = current_minute
+        self.journal.forget_before(current_minute - timedelta(seconds=self.catchup_seconds + 120))
+        return True
+
+    def _minutes_to_check(self, current_minute):
+        """
+        Minutes to evaluate on this tick: the current one, every minute skipped since the
+        last check (GC pause, suspended process) and, right after startup, the catch-up window.
+        """
+        if self.last_checked_minute is None:
+            first = current_minute - timedelta(seconds=self.catchup_seconds)
+        else:
+            first = self.last_checked_minute + timedelta(minutes=1)
+        first = max(first.replace(second=0, microsecond=0), current_minute - timedelta(minutes=self.MAX_MISSED_MINUTES))
+
+        minute = first
+        while minute <= current_minute:
+            yield minute
+            minute += timedelta(minutes=1)
+
+    def _check_and_execute_schedules(self, now):
+        """Check which schedules should run at the given minute and execute them"""
+        with self.app.app_context():
+            try:
+                try:
+                    schedules = self._due_schedules(now)
+                except SQLAlchemyError as e:
+                    schedules = self._due_from_snapshot(now, e)
+
+                # Highest priority first, so a bell claims its output before music due the same minute
+                for schedule in sorted(schedules, key=lambda s: (-priority_of(s), s.id)):
+                    self._fire(schedule, now)
+
+            except Exception as e:
+                logger.error("Error checking schedules: %s", e, exc_info=True)
+
+    def _due_schedules(self, now):
+        """Schedules of the lists playing at this minute (one per site) whose time and weekday match"""
+        from sites import playing_lists
+
+        lists = playing_lists(now.date())
+        for stale in set(self._shards) - set(lists):
+            del self._shards[stale]  # Site removed, disabled or skipped today
+
+        # Only the schedules the fire indexes have for this minute are loaded
+        minute_of_day = now.hour * 60 + now.minute
+        schedule_ids = []
+        for site_id, schedule_list in lists.items():
+            schedule_ids.extend(self._fire_index_for(site_id, schedule_list, now.date()).get(minute_of_day, ()))
+        logger.debug("%s schedules due at %s", len(schedule_ids), now.strftime('%H:%M'))
+        if not schedule_ids:
+            return []
+        return self.Schedule.query.filter_by(is_muted=False).filter(self.Schedule.id.in_(schedule_ids)).all()
+
+    def _fire_index_for(self, site_id, schedule_list, day):
+        """
+        Minute -> schedule ids of a site's list on a date, with recurrence rules
+        expanded. Each site's shard is rebuilt once a day and whenever its list or
+        the list's revision changes (any edit to its schedules, from any process),
+        so the per-minute work doesn't grow with the number of rows, the fires a
+        rule stands for or the number of sites.
+        """
+        key = (schedule_list.id, schedule_list.revision or 0, day)
+        shard = self._shards.get(site_id)
+        if shard is None or shard[0] != key:
+            schedules = self.Schedule.query.filter_by(schedule_list_id=schedule_list.id, is_muted=False).all()
+            shard = self._shards[site_id] = (key, fire_index(schedules, day))
+            logger.debug("Built fire index of list %s for %s: %s schedules", schedule_list.id, day, len(schedules))
+        return shard[1]
+
+    def _due_from_snapshot(self, now, error):
+        """Due bells from the compiled snapshot, used while the database can't be read"""
+        snapshot = self.snapshot.current() if self.snapshot is not None else None
+        if snapshot is None:
+            logger.error("Database unavailable and no schedule snapshot - cannot check %s: %s", now.strftime('%H:%M'), error)
+            return []
+        logger.warning("Database unavailable (%s) - firing from the schedule snapshot compiled %s",
+                       error.__class__.__name__, snapshot.generated_at.strftime('%Y-%m-%d %H:%M'))
+        metrics.SCHEDULER_SNAPSHOT_FALLBACKS.inc()
+        return snapshot.due(now)
+
+    def _fire(self, schedule, now):
+        current_time = now.strftime('%H:%M')
+
+        # Check if already executed for this minute (also across restarts, via the journal)
+        if not self.journal.claim(schedule.id, now):
+            logger.debug("Skipping schedule %s - already executed this minute", schedule.id)
+            return
+
+        # Fire late bells only within the catch-up window
+        fired_at = self.clock.now()
+        lateness = (fired_at - now).total_seconds()
+        if lateness >= 60 and lateness > self.catchup_seconds:
+            self.journal.record(schedule.id, now, 'missed')
+            metrics.SCHEDULER_FIRES.inc(outcome='missed')
+            logger.warning("Missed schedule %s at %s (%.0fs late, catch-up window %ss)", schedule.id, current_time, lateness, self.catchup_seconds)
+            return
+
+        # Marked as executed IMMEDIATELY (before starting playback); the row is written in the background
+        outcome = 'fired' if lateness < 60 else 'caught_up'
+        self.journal.record(schedule.id, now, outcome, fired_at)
+        metrics.SCHEDULER_FIRES.inc(outcome=outcome)
+        metrics.SCHEDULER_TRIGGER_LATENESS.observe(lateness)
+        logger.info("🔒 Marked schedule %s as executed for minute %s", schedule.id, current_time)
+
+        if schedule.schedule_type == 'playlist':
+            logger.info("▶️  Triggering playlist: %s at %s", schedule.folder_path, current_time)
+        else:
+            logger.info("▶️  Triggering audio: %s at %s", schedule.filename, current_time)
+        self.sink.fire(schedule, now, fired_at)
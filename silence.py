@@ -0,0 +1,204 @@
+"""
+Leading and trailing silence detection.
+
+Many bells start with a few hundred milliseconds of encoder padding or silence, so
+the audible sound lags the scheduled instant. Every blob in the audio store is
+analysed once - at upload, and by a backfill over the library in the process that
+owns the scheduler: the file is decoded, cut into 10 ms frames and the RMS level of
+all frames is computed in one vectorised NumPy pass. The first and last frames
+within RANGE_DB of the loudest one (and above FLOOR_DB) bound the audible part.
+The same pass summarises the samples as waveform peaks for the dashboard (see
+waveform.py).
+
+The offsets are stored per content hash in audio_analysis, so they follow a file
+through renames and are shared by duplicates. Playback starts at trim_start with
+pygame.mixer.music.play(start=...) and the playlist runner also stops each track
+at trim_end, so the gap between tracks is the configured interval and not the
+interval plus trailing silence. Set AUDIO_SCHEDULER_TRIM_SILENCE=0 to play files
+untrimmed. Decoding runs in a spawned worker process on SDL's dummy driver; without
+NumPy nothing is analysed and everything plays untrimmed.
+"""
+import logging
+import multiprocessing
+import os
+import pathlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy
+except ImportError:  # Optional; files then play untrimmed
+    numpy = None
+
+from sqlalchemy import or_, select
+
+import waveform
+from models import db, AudioAnalysis, AudioFile
+
+logger = logging.getLogger('audio_scheduler.audio')
+
+TRIM_ENABLED = os.environ.get('AUDIO_SCHEDULER_TRIM_SILENCE', '1') != '0'
+
+FRAME_SECONDS = 0.01
+FLOOR_DB = -60.0  # Anything quieter than this (dBFS) is silence
+RANGE_DB = 45.0  # ...and so is anything this far below the loudest frame
+PRE_ROLL = 0.01  # Seconds kept before the first audible frame, so the attack isn't clipped
+POST_ROLL = 0.05  # Seconds kept after the last audible frame (reverb tail)
+MIN_TRIM = 0.02  # Shorter silences are left alone
+
+_mp_context = multiprocessing.get_context('spawn')
+
+
+def _init_worker():
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    import pygame
+    pygame.mixer.init(frequency=44100, size=-16, channels=2)
+
+
+def audible_extent(samples, frequency):
+    """(trim_start, trim_end, duration) in seconds of int16 samples shaped (frames, channels)"""
+    mono = samples.astype(numpy.float32).mean(axis=1) / 32768.0
+    duration = len(mono) / frequency
+
+    frame = int(frequency * FRAME_SECONDS)
+    frames = len(mono) // frame
+    if frames == 0:
+        return 0.0, None, round(duration, 3)
+    rms = numpy.sqrt(numpy.mean(numpy.square(mono[:frames * frame].reshape(frames, frame)), axis=1))
+    level = 20 * numpy.log10(numpy.maximum(rms, 1e-10))
+    audible = numpy.flatnonzero(level > max(FLOOR_DB, level.max() - RANGE_DB))
+    if len(audible) == 0:
+        return 0.0, None, round(duration, 3)
+
+    start = max(0.0, audible[0] * FRAME_SECONDS - PRE_ROLL)
+    end = min(duration, (audible[-1] + 1) * FRAME_SECONDS + POST_ROLL)
+    return (round(start, 3) if start >= MIN_TRIM else 0.0,
+            round(end, 3) if duration - end >= MIN_TRIM else None,
+            round(duration, 3))
+
+
+def analyze(path, content_hash=None):
+    """(trim_start, trim_end, duration, waveform peaks) of a file; needs an initialised 16-bit mixer"""
+    import pygame
+    from pcm_cache import pcm_cache
+
+    frequency, _, channels = pygame.mixer.get_init()
+    # Decoding through the cache also leaves the samples ready for playback
+    samples = numpy.frombuffer(pcm_cache.pcm(path, content_hash), dtype=numpy.int16).reshape(-1, channels)
+    return audible_extent(samples, frequency) + (waveform.compute(samples, frequency),)
+
+
+def _analyze_safely(path, content_hash=None):
+    try:
+        return analyze(path, content_hash)
+    except Exception as e:
+        logger.warning("Could not analyse %s for silence: %s", path, e)
+        return None
+
+
+class SilenceAnalyzer:
+    """Analyses blobs in a background worker process and records their trim offsets"""
+
+    def __init__(self, app, store):
+        self.app = app
+        self.store = store
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=1, mp_context=_mp_context, initializer=_init_worker)
+            return self._executor
+
+    def submit(self, blob_hash, path):
+        """Queue one blob for analysis (e.g. right after an upload)"""
+        if numpy is None:
+            return
+        with self._lock:
+            if blob_hash in self._pending:
+                return
+            self._pending.add(blob_hash)
+        future = self._pool().submit(_analyze_safely, str(path), blob_hash)
+        future.add_done_callback(lambda f: self._record(blob_hash, f))
+
+    def _record(self, blob_hash, future):
+        with self._lock:
+            self._pending.discard(blob_hash)
+        if future.cancelled() or future.exception() is not None:
+            return
+        trim_start, trim_end, duration, peaks = future.result() or (0.0, None, None, None)
+        try:
+            with self.app.app_context():
+                row = AudioAnalysis.query.filter_by(blob_hash=blob_hash).first() or AudioAnalysis(blob_hash=blob_hash)
+                row.trim_start, row.trim_end, row.duration, row.peaks = trim_start, trim_end, duration, peaks
+                db.session.add(row)
+                db.session.commit()
+        except Exception as e:
+            logger.error("Could not store silence analysis of %s: %s", blob_hash[:12], e)
+            return
+        if trim_start or trim_end is not None:
+            logger.info("Audio %s: %.0f ms leading silence, sound ends at %s", blob_hash[:12], trim_start * 1000,
+                        f"{trim_end:.2f}s of {duration:.2f}s" if trim_end is not None else 'the end')
+
+    def backfill(self):
+        """Queue every stored blob that hasn't been analysed yet (needs an app context); returns the count"""
+        if numpy is None:
+            logger.warning("NumPy is not installed - leading silence won't be trimmed")
+            return 0
+        # Rows from before waveform peaks were computed are analysed again (undecodable files aren't)
+        analysed = select(AudioAnalysis.blob_hash).where(
+            or_(AudioAnalysis.peaks.is_not(None), AudioAnalysis.duration.is_(None)))
+        hashes = db.session.execute(
+            select(AudioFile.blob_hash).where(AudioFile.blob_hash.not_in(analysed)).distinct()
+        ).scalars().all()
+        queued = 0
+        for blob_hash in hashes:
+            path = self.store.content_path(blob_hash)
+            if path is not None:
+                self.submit(blob_hash, path)
+                queued += 1
+        if queued:
+            logger.info("Analysing %s audio files for leading silence", queued)
+        return queued
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+# --- Lookups at play time (need an app context) ---------------------------------
+
+def trim_for(blob_hash):
+    """(start, end) to play of a blob; (0.0, None) when unknown or trimming is off"""
+    if not TRIM_ENABLED or not blob_hash:
+        return 0.0, None
+    row = db.session.execute(
+        select(AudioAnalysis.trim_start, AudioAnalysis.trim_end).where(AudioAnalysis.blob_hash == blob_hash)
+    ).first()
+    return (row.trim_start or 0.0, row.trim_end) if row else (0.0, None)
+
+
+def trims_for_files(audio_files, playlists_folder):
+    """{str(path): (start, end)} for the playlist files that have something to trim"""
+    if not TRIM_ENABLED:
+        return {}
+    folder = pathlib.Path(playlists_folder).resolve()
+    names = {}
+    for path in audio_files:
+        try:
+            names[pathlib.Path(path).resolve().relative_to(folder).as_posix()] = str(path)
+        except ValueError:
+            continue  # Outside the playlists folder: not in the audio store
+    if not names:
+        return {}
+    rows = db.session.execute(
+        select(AudioFile.name, AudioAnalysis.trim_start, AudioAnalysis.trim_end)
+        .join(AudioAnalysis, AudioAnalysis.blob_hash == AudioFile.blob_hash)
+        .where(AudioFile.root == 'playlists', AudioFile.name.in_(list(names)))
+    ).all()
+    return {names[row.name]: (row.trim_start or 0.0, row.trim_end) for row in rows
+            if row.trim_start or row.trim_end is not None}
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Deterministic scheduler simulation.
+
+Seeds a throw-away SQLite database with many schedule lists and schedules, then
+drives SimpleScheduler.tick() with a SimulatedClock through a synthetic week -
+poll jitter and periodic stalls included - in a few minutes of real time. Fires go
+to a RecordingSink and are compared with the fires of a small reference
+implementation of the schedule rules (reference_minutes(), which shares no code
+with occurrences.py or recurrence.py; cron expressions come from a fixed table):
+
+  - fire accuracy: lateness of every fire (mean, p95, max)
+  - missed fires: expected but never fired (stalls longer than the catch-up window)
+  - duplicate fires: the same schedule fired twice for one minute
+  - unexpected fires: fired although nothing was due
+  - CPU time per simulated minute and peak memory
+
+Usage:
+    python simulate_scheduler.py                       # 10k schedules, 40 lists, 7 days
+    python simulate_scheduler.py --schedules 2000 --days 1 --stall-seconds 300
+    python simulate_scheduler.py --recurring 0.1            # a tenth of the rows carry recurrence rules
+    python simulate_scheduler.py --output baseline.json
+    python simulate_scheduler.py --compare baseline.json   # fails on CPU/memory regressions
+
+Exits with 1 on duplicate, unexpected or (unless --allow-missed) missed fires, or
+on a regression against --compare.
+"""
+import argparse
+import calendar
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Ensure local imports work when running from a different cwd
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from clock import SimulatedClock
+from journal import ExecutionJournal
+from models import db, Schedule, ScheduleList, DateException
+import recurrence
+from scheduler import SimpleScheduler, RecordingSink
+
+# Metrics compared by --compare: name -> allowed relative increase
+REGRESSION_KEYS = {
+    'cpu_ms_per_minute_mean': 0.25,
+    'cpu_ms_per_minute_p95': 0.25,
+    'peak_rss_mb': 0.25,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--schedules', type=int, default=10000, help='Number of schedules (default 10000)')
+    parser.add_argument('--lists', type=int, default=40, help='Number of schedule lists (default 40)')
+    parser.add_argument('--days', type=int, default=7, help='Simulated days (default 7)')
+    parser.add_argument('--start', default='2024-09-02', help='First simulated day, YYYY-MM-DD (default a Monday)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default 1)')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Max extra seconds per poll (default 0.2)')
+    parser.add_argument('--stall-every', type=float, default=6, help='Hours between simulated stalls, 0 disables (default 6)')
+    parser.add_argument('--stall-seconds', type=float, default=90, help='Length of each stall (default 90)')
+    parser.add_argument('--catchup', type=int, default=120, help='Scheduler catch-up window in seconds (default 120)')
+    parser.add_argument('--recurring', type=float, default=0.0,
+                        help='Fraction of schedules with a recurrence rule - repeats, nth weekday, date range or cron (default 0)')
+    parser.add_argument('--no-exceptions', action='store_true', help="Don't seed a skip day and an override day")
+    parser.add_argument('--allow-missed', action='store_true', help="Don't fail on missed fires (long stalls)")
+    parser.add_argument('--tracemalloc', action='store_true', help='Also report the Python heap peak (slower)')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON from --output to check for regressions')
+    parser.add_argument('--verbose', action='store_true', help='Show scheduler log output')
+    return parser.parse_args()
+
+
+def create_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed(app, args, rng, start_date):
+    """Create lists, schedules and date exceptions; returns {date: 'skip' | list id} for the exceptions"""
+    with app.app_context():
+        lists = [ScheduleList(name=f'List {n + 1}', is_active=(n == 0)) for n in range(args.lists)]
+        db.session.add_all(lists)
+        db.session.flush()
+
+        rows = []
+        for n in range(args.schedules):
+            days = [rng.random() < 0.6 for _ in range(7)]
+            playlist = rng.random() < 0.1
+            hour, minute = rng.randrange(24), rng.randrange(60)
+            rows.append({
+                'schedule_list_id': lists[n % len(lists)].id,
+                'time': f'{hour:02d}:{minute:02d}',
+                'recurrence': random_rule(rng, hour, start_date) if args.recurring and rng.random() < args.recurring else None,
+                'monday': days[0], 'tuesday': days[1], 'wednesday': days[2], 'thursday': days[3],
+                'friday': days[4], 'saturday': days[5], 'sunday': days[6],
+                'is_muted': rng.random() < 0.05,
+                'volume': 1.0,
+                'schedule_type': 'playlist' if playlist else 'single_file',
+                'filename': None if playlist else f'bell-{n % 50}.mp3',
+                'folder_path': f'folder-{n % 10}' if playlist else None,
+            })
+        db.session.execute(db.insert(Schedule), rows)
+
+        exceptions = {}
+        if not args.no_exceptions and args.days >= 3:
+            skip_day = start_date + timedelta(days=1)
+            override_day = start_date + timedelta(days=2)
+            override_list = lists[1 % len(lists)]
+            db.session.add(DateException(name='Simulated holiday', start_date=skip_day, action='skip'))
+            db.session.add(DateException(name='Simulated event', start_date=override_day, action='override',
+                                         override_list_id=override_list.id))
+            exceptions = {skip_day: 'skip', override_day: override_list.id}
+        db.session.commit()
+        return lists[0].id, exceptions
+
+
+# The cron expressions random_rule() draws from: expression -> (fires on date?, minutes of the day)
+CRON_REFERENCE = {
+    '*/20 8-15 * * 1-5': (lambda day: day.weekday() < 5, [h * 60 + m for h in range(8, 16) for m in (0, 20, 40)]),
+    '0 */2 * * *': (lambda day: True, [h * 60 for h in range(0, 24, 2)]),
+    '30 12 1-10 * *': (lambda day: day.day <= 10, [12 * 60 + 30]),
+    '0 9 * * sat,sun': (lambda day: day.weekday() >= 5, [9 * 60]),
+}
+
+
+def random_rule(rng, hour, start_date):
+    """A recurrence rule (see recurrence.py) starting at the given hour"""
+    kind = rng.randrange(4)
+    if kind == 0:
+        rule = {'every': rng.choice([5, 15, 45, 90]), 'until': f'{rng.randrange(hour, 24):02d}:59'}
+    elif kind == 1:
+        rule = {'nth': [rng.choice([1, 2, 3, 4, -1])]}
+    elif kind == 2:
+        rule = {'from': (start_date + timedelta(days=rng.randrange(3))).isoformat(),
+                'to': (start_date + timedelta(days=rng.randrange(3, 7))).isoformat()}
+    else:
+        rule = {'cron': rng.choice(list(CRON_REFERENCE))}
+    return recurrence.parse(rule)
+
+
+def reference_minutes(schedule, day):
+    """
+    Minutes of the day a schedule should fire on a date, worked out the slow, obvious
+    way - the yardstick the scheduler's fires are measured against
+    """
+    rule = json.loads(schedule.recurrence) if schedule.recurrence else {}
+    iso = day.isoformat()
+    if iso < rule.get('from', iso) or iso > rule.get('to', iso):
+        return []
+    if 'cron' in rule:
+        fires_on, minutes = CRON_REFERENCE[rule['cron']]
+        return minutes if fires_on(day) else []
+
+    if not schedule.active_days()[day.weekday()]:
+        return []
+    if 'nth' in rule:
+        # Count this weekday's dates in the month up to and including day
+        nth = sum(1 for d in range(1, day.day + 1) if day.replace(day=d).weekday() == day.weekday())
+        last = day.day + 7 > calendar.monthrange(day.year, day.month)[1]
+        if nth not in rule['nth'] and not (last and -1 in rule['nth']):
+            return []
+
+    hour, minute = schedule.time.split(':')
+    first = int(hour) * 60 + int(minute)
+    if 'every' not in rule:
+        return [first]
+    until = rule.get('until', '23:59').split(':')
+    last_minute = int(until[0]) * 60 + int(until[1])
+    return [m for m in range(24 * 60) if first <= m <= last_minute and (m - first) % rule['every'] == 0]
+
+
+def expected_fires(app, active_list_id, exceptions, start_date, days):
+    """(schedule id, scheduled minute) pairs that should fire, computed without the scheduler or its rule code"""
+    with app.app_context():
+        by_list = {}
+        for schedule in Schedule.query.filter_by(is_muted=False).all():
+            by_list.setdefault(schedule.schedule_list_id, []).append(schedule)
+
+        expected = set()
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            rule = exceptions.get(day)
+            if rule == 'skip':
+                continue
+            list_id = rule if rule is not None else active_list_id
+            midnight = datetime(day.year, day.month, day.day)
+            for schedule in by_list.get(list_id, []):
+                for minute_of_day in reference_minutes(schedule, day):
+                    expected.add((schedule.id, midnight + timedelta(minutes=minute_of_day)))
+        return expected
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def simulate(app, args, start):
+    """Drive the scheduler through the simulated period; returns (sink, per-minute CPU seconds)"""
+    rng = random.Random(args.seed + 1)
+    clock = SimulatedClock(start)
+    sink = RecordingSink()
+    journal = ExecutionJournal(app)
+    scheduler = SimpleScheduler(app, db, Schedule, sink, journal=journal, catchup_seconds=args.catchup, clock=clock)
+    # As if the scheduler had been running before the simulated period
+    scheduler.last_checked_minute = start - timedelta(minutes=1)
+
+    end = start + timedelta(days=args.days)
+    stall_interval = timedelta(hours=args.stall_every) if args.stall_every > 0 else None
+    next_stall = start + stall_interval if stall_interval else None
+    minute_cpu = []
+
+    while clock.now() < end:
+        cpu_start = time.process_time()
+        if scheduler.tick():
+            # Persist the journal as the writer thread would
+            journal.flush()
+            minute_cpu.append(time.process_time() - cpu_start)
+        clock.sleep(1 + rng.uniform(0, args.jitter))
+
+        if next_stall is not None and clock.now() >= next_stall:
+            clock.advance(args.stall_seconds)  # GC pause, suspended VM, blocked SD card...
+            next_stall += stall_interval
+
+    return sink, minute_cpu
+
+
+def build_report(args, expected, sink, minute_cpu, wall_seconds, heap_peak):
+    counts = {}
+    lateness = []
+    for schedule_id, scheduled_at, fired_at in sink.fires:
+        key = (schedule_id, scheduled_at)
+        counts[key] = counts.get(key, 0) + 1
+        lateness.append((fired_at - scheduled_at).total_seconds())
+    fired = set(counts)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+    report = {
+        'schedules': args.schedules,
+        'lists': args.lists,
+        'days': args.days,
+        'seed': args.seed,
+        'simulated_minutes': len(minute_cpu),
+        'expected_fires': len(expected),
+        'fires': len(sink.fires),
+        'missed_fires': len(expected - fired),
+        'duplicate_fires': sum(count - 1 for count in counts.values() if count > 1),
+        'unexpected_fires': len(fired - expected),
+        'lateness_mean_s': round(statistics.fmean(lateness), 3) if lateness else 0.0,
+        'lateness_p95_s': round(percentile(lateness, 0.95), 3),
+        'lateness_max_s': round(max(lateness, default=0.0), 3),
+        'cpu_ms_per_minute_mean': round(statistics.fmean(minute_cpu) * 1000, 3) if minute_cpu else 0.0,
+        'cpu_ms_per_minute_p95': round(percentile(minute_cpu, 0.95) * 1000, 3),
+        'cpu_ms_per_minute_max': round(max(minute_cpu, default=0.0) * 1000, 3),
+        'peak_rss_mb': round(rss_mb, 1),
+        'wall_seconds': round(wall_seconds, 1),
+    }
+    if heap_peak is not None:
+        report['python_heap_peak_mb'] = round(heap_peak / 1024 / 1024, 1)
+    return report
+
+
+def compare(report, baseline_path):
+    """Return a list of regressions against a baseline report"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    for key, tolerance in REGRESSION_KEYS.items():
+        old, new = baseline.get(key), report.get(key)
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%, allowed +{tolerance * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not args.verbose:
+        # Stall-induced misses are counted in the report; don't print one line per bell
+        logging.getLogger('audio_scheduler').setLevel(logging.ERROR)
+
+    start_date = datetime.strptime(args.start, '%Y-%m-%d').date()
+    start = datetime(start_date.year, start_date.month, start_date.day)
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory(prefix='scheduler-sim-') as tmp:
+        app = create_app(os.path.join(tmp, 'simulation.db'))
+        print(f"Seeding {args.schedules} schedules in {args.lists} lists...")
+        active_list_id, exceptions = seed(app, args, rng, start_date)
+        expected = expected_fires(app, active_list_id, exceptions, start_date, args.days)
+
+        print(f"Simulating {args.days} days from {start:%Y-%m-%d} ({len(expected)} expected fires)...")
+        if args.tracemalloc:
+            tracemalloc.start()
+        wall_start = time.perf_counter()
+        sink, minute_cpu = simulate(app, args, start)
+        wall_seconds = time.perf_counter() - wall_start
+        heap_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+
+        report = build_report(args, expected, sink, minute_cpu, wall_seconds, heap_peak)
+
+    for key, value in report.items():
+        print(f"  {key:<24} {value}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    failed = report['duplicate_fires'] or report['unexpected_fires'] or (report['missed_fires'] and not args.allow_missed)
+    if args.compare:
+        regressions = compare(report, args.compare)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or regressions
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Sites: several buildings served by one process.
+
+Running one instance per building costs a Python process, a Flask app, a mixer
+and a database per building. A Site instead groups schedule lists inside the
+shared instance: each site has its own active list and its own audio output (a
+zone; without one it plays on the in-process mixer), and lists without a site
+form the default site, which is how a single-building install keeps working.
+
+The scheduler keeps one shard per site - the fire index of the list the site is
+playing today - inside the same polling loop, so a site costs a few dictionaries
+rather than a process. Uploads, the content-addressed audio store, silence
+analysis and decoded audio are shared by all sites. Date exceptions apply to
+every site; an override switches only the site that owns the override list.
+"""
+import logging
+
+from sqlalchemy import or_
+
+from models import db, Site, ScheduleList
+
+logger = logging.getLogger('audio_scheduler')
+
+DEFAULT_SITE = None  # site_id of lists that belong to no site
+
+
+def active_list(site_id=DEFAULT_SITE):
+    """The list a site plays on ordinary days (needs an app context)"""
+    return ScheduleList.query.filter_by(is_active=True, site_id=site_id).first()
+
+
+def playing_lists(day):
+    """{site id: ScheduleList} of every enabled site on a date, date exceptions applied (needs an app context)"""
+    from date_exceptions import exception_calendar
+
+    # Date exceptions: one dict lookup, no query on ordinary days
+    rule = exception_calendar.lookup(day)
+    if rule is not None and rule.action == 'skip':
+        logger.debug("Skipping schedules on %s - date exception '%s'", day, rule.name)
+        return {}
+
+    lists = {
+        schedule_list.site_id: schedule_list
+        for schedule_list in ScheduleList.query.outerjoin(Site).filter(
+            ScheduleList.is_active == True,  # noqa: E712
+            or_(ScheduleList.site_id.is_(None), Site.is_enabled == True)  # noqa: E712
+        ).order_by(ScheduleList.id.desc())  # Lowest id wins, like .first()
+    }
+
+    if rule is not None and rule.action == 'override' and rule.override_list_id is not None:
+        override = db.session.get(ScheduleList, rule.override_list_id)
+        if override is None:
+            logger.warning("Override list %s of date exception '%s' not found, using active list", rule.override_list_id, rule.name)
+        elif override.site is None or override.site.is_enabled:
+            lists[override.site_id] = override
+    return lists
@@ -0,0 +1,438 @@
+"""
+Compiled schedule snapshot for boot-time firing and database outages.
+
+Every committed change to schedules, lists, zones or date exceptions recompiles the
+bells that can fire - the active list, the lists date exceptions switch to, and
+the exceptions for the coming year - into instance/schedule.snapshot. The file is
+a small versioned, CRC-checked binary that is read through mmap with struct only,
+so loading it takes milliseconds and needs neither Flask nor SQLAlchemy.
+
+Two users:
+
+- FastPathScheduler: wsgi.py and audio_daemon.py start it before importing the app.
+  It takes the scheduler leader lock and fires single-file bells from the snapshot
+  while Flask, SQLAlchemy and pygame are still loading, then hands the lock and
+  the bells it fired over to the real scheduler in create_app().
+- SimpleScheduler: if the database can't be read (locked, corrupted), it keeps
+  firing from the snapshot instead of going silent.
+
+Playlists and zone-routed bells need the database and are left to the full
+scheduler (its catch-up window still fires them once the app is up). Recurrence
+rules (recurrence.py) are expanded into one entry per minute they fire at; rules
+that depend on the date rather than the weekday (nth weekday, date ranges, cron
+days of the month) are left out. Only the default site is compiled: other sites
+(sites.py) play through their own zone or need the database.
+
+File layout (little-endian):
+    header   magic, version, CRC-32 of the rest, counts, active list id, generated at
+    index    1441 uint32: the first entry of each minute of the day (entries sorted by minute)
+    entries  schedule id, list id, minute, weekday mask, flags, volume, string offsets
+    rules    date ordinal, action, override list id (date exceptions)
+    strings  length-prefixed UTF-8: file names, content hashes, playlist folders
+"""
+import array
+import json
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import recurrence
+
+logger = logging.getLogger('audio_scheduler')
+
+APP_ROOT = pathlib.Path(__file__).resolve().parent
+SNAPSHOT_PATH = os.environ.get('AUDIO_SCHEDULER_SNAPSHOT') or str(APP_ROOT.joinpath('instance', 'schedule.snapshot'))
+
+MAGIC = b'ASSN'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIIIid')  # magic, version, reserved, crc32, entries, rules, strings size, active list id, generated at
+ENTRY = struct.Struct('<IIHBBfIII')  # id, list id, minute, weekday mask, flags, volume, filename, hash, folder
+RULE = struct.Struct('<IBxxxI')  # date ordinal, action, override list id
+INDEX_SIZE = 24 * 60 + 1
+NO_STRING = 0xFFFFFFFF
+NO_LIST = -1
+
+FLAG_PLAYLIST = 1
+FLAG_ZONED = 2
+ACTION_SKIP, ACTION_OVERRIDE = 0, 1
+
+RULE_DAYS = 400  # Date exceptions compiled ahead
+COMPILE_DELAY = 1.0  # Seconds to wait for more changes before recompiling
+
+SnapshotEntry = namedtuple('SnapshotEntry', [
+    'id', 'schedule_list_id', 'minute', 'schedule_type', 'zoned', 'volume', 'filename', 'audio_hash', 'folder_path'
+])
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+# --- Reading -------------------------------------------------------------------
+
+class Snapshot:
+    """A loaded snapshot file"""
+
+    def __init__(self, buffer):
+        if len(buffer) < HEADER.size:
+            raise SnapshotError("snapshot truncated")
+        magic, version, _, crc, entries, rules, strings_size, active_list_id, generated_at = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise SnapshotError("not a schedule snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"unsupported snapshot version {version}")
+        expected = HEADER.size + INDEX_SIZE * 4 + entries * ENTRY.size + rules * RULE.size + strings_size
+        if len(buffer) != expected:
+            raise SnapshotError(f"snapshot size {len(buffer)} != {expected}")
+        if zlib.crc32(memoryview(buffer)[HEADER.size:]) != crc:
+            raise SnapshotError("snapshot checksum mismatch")
+
+        self._buffer = buffer
+        self.entry_count = entries
+        self.active_list_id = None if active_list_id == NO_LIST else active_list_id
+        self.generated_at = datetime.fromtimestamp(generated_at)
+        self._index = array.array('I')
+        self._index.frombytes(buffer[HEADER.size:HEADER.size + INDEX_SIZE * 4])
+        self._entries_offset = HEADER.size + INDEX_SIZE * 4
+        rules_offset = self._entries_offset + entries * ENTRY.size
+        self._strings_offset = rules_offset + rules * RULE.size
+        self.rules = {}
+        for n in range(rules):
+            ordinal, action, list_id = RULE.unpack_from(buffer, rules_offset + n * RULE.size)
+            self.rules[ordinal] = (action, list_id or None)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                raise SnapshotError("snapshot is empty")
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer)
+
+    def __len__(self):
+        return self.entry_count
+
+    def _string(self, offset):
+        if offset == NO_STRING:
+            return None
+        start = self._strings_offset + offset
+        (length,) = struct.unpack_from('<H', self._buffer, start)
+        return bytes(self._buffer[start + 2:start + 2 + length]).decode('utf-8')
+
+    def list_for(self, day):
+        """Schedule list that plays on a date (None on a skip day)"""
+        rule = self.rules.get(day.toordinal())
+        if rule is not None:
+            action, list_id = rule
+            if action == ACTION_SKIP:
+                return None
+            if list_id is not None:
+                return list_id
+        return self.active_list_id
+
+    def due(self, minute):
+        """Entries that fire at the given minute (a datetime)"""
+        list_id = self.list_for(minute.date())
+        if list_id is None:
+            return []
+        minute_of_day = minute.hour * 60 + minute.minute
+        weekday_bit = 1 << minute.weekday()
+        due = []
+        for n in range(self._index[minute_of_day], self._index[minute_of_day + 1]):
+            fields = ENTRY.unpack_from(self._buffer, self._entries_offset + n * ENTRY.size)
+            schedule_id, entry_list_id, minute_value, mask, flags, volume, filename, audio_hash, folder = fields
+            if entry_list_id != list_id or not mask & weekday_bit:
+                continue
+            due.append(SnapshotEntry(
+                schedule_id, entry_list_id, minute_value,
+                'playlist' if flags & FLAG_PLAYLIST else 'single_file', bool(flags & FLAG_ZONED), volume,
+                self._string(filename), self._string(audio_hash), self._string(folder)
+            ))
+        return due
+
+
+class SnapshotFile:
+    """Snapshot at a path, reloaded when the file is replaced"""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stat = None
+
+    def current(self):
+        """The latest valid snapshot, or None if there is none (errors are logged once per file)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key != self._stat:
+                self._stat = key
+                try:
+                    self._snapshot = Snapshot.load(self.path)
+                except (OSError, SnapshotError) as e:
+                    # Keep the previous snapshot; a valid file is always written atomically
+                    logger.error("Ignoring schedule snapshot %s: %s", self.path, e)
+            return self._snapshot
+
+
+# --- Writing -------------------------------------------------------------------
+
+def _flags(schedule):
+    flags = FLAG_PLAYLIST if schedule.schedule_type == 'playlist' else 0
+    if schedule.output_zones():
+        flags |= FLAG_ZONED
+    return flags
+
+
+def build(today=None):
+    """Compile the snapshot from the database (needs an app context); returns its bytes"""
+    from date_exceptions import exception_calendar
+    from models import Schedule, ScheduleList
+
+    today = today or date.today()
+    rules = exception_calendar.rules_between(today - timedelta(days=1), RULE_DAYS)
+    # Overrides switching another site's list leave the default site alone
+    site_list_ids = {schedule_list.id for schedule_list in ScheduleList.query.filter(ScheduleList.site_id.isnot(None))}
+    rules = {day: rule for day, rule in rules.items() if rule.action != 'override' or rule.override_list_id not in site_list_ids}
+    active = ScheduleList.query.filter_by(is_active=True, site_id=None).first()
+    list_ids = {rule.override_list_id for rule in rules.values() if rule.action == 'override' and rule.override_list_id}
+    if active is not None:
+        list_ids.add(active.id)
+
+    rows = []
+    if list_ids:
+        for schedule in Schedule.query.filter(Schedule.schedule_list_id.in_(list_ids), Schedule.is_muted.isnot(True)).all():
+            rule = recurrence.for_schedule(schedule)
+            weekly = rule.weekly() if rule is not None else None
+            if weekly is None:
+                continue
+            minutes, mask = weekly
+            if mask:
+                rows.extend((minute_of_day, schedule.schedule_list_id, schedule.id, mask, _flags(schedule), schedule)
+                            for minute_of_day in minutes)
+    rows.sort(key=lambda row: row[:3])
+
+    strings = bytearray()
+    offsets = {}
+
+    def intern(value):
+        if not value:
+            return NO_STRING
+        if value not in offsets:
+            encoded = value.encode('utf-8')[:0xFFFF]
+            offsets[value] = len(strings)
+            strings.extend(struct.pack('<H', len(encoded)) + encoded)
+        return offsets[value]
+
+    index = array.array('I', [0] * INDEX_SIZE)
+    entries = bytearray()
+    for minute_of_day, list_id, schedule_id, mask, flags, schedule in rows:
+        index[minute_of_day + 1] += 1
+        volume = schedule.volume if schedule.volume is not None else 1.0
+        entries.extend(ENTRY.pack(schedule_id, list_id, minute_of_day, mask, flags, volume,
+                                  intern(schedule.filename), intern(schedule.audio_hash), intern(schedule.folder_path)))
+    for n in range(1, INDEX_SIZE):
+        index[n] += index[n - 1]
+
+    rule_bytes = bytearray()
+    for day, rule in sorted(rules.items()):
+        action = ACTION_SKIP if rule.action == 'skip' else ACTION_OVERRIDE
+        rule_bytes.extend(RULE.pack(day.toordinal(), action, rule.override_list_id or 0))
+
+    body = index.tobytes() + bytes(entries) + bytes(rule_bytes) + bytes(strings)
+    header = HEADER.pack(MAGIC, VERSION, 0, zlib.crc32(body), len(rows), len(rules), len(strings),
+                         active.id if active is not None else NO_LIST, time.time())
+    return header + body
+
+
+def write(path, data):
+    """Atomically replace the snapshot file (fsynced, so it survives a power cut)"""
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class SnapshotCompiler:
+    """Recompiles the snapshot in the background after committed changes"""
+
+    def __init__(self, app, path=SNAPSHOT_PATH, delay=COMPILE_DELAY):
+        self.app = app
+        self.path = str(path)
+        self.delay = delay
+        self._dirty = threading.Event()
+        self._thread = None
+        self.compiled_at = None
+
+    def start(self):
+        """Install the change listeners and compile once; idempotent"""
+        if self._thread is not None:
+            return
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+
+        event.listen(Session, 'after_flush', self._track_changes)
+        event.listen(Session, 'after_commit', self._on_commit)
+        event.listen(Session, 'after_rollback', lambda session: session.info.pop('snapshot_changed', None))
+        self._thread = threading.Thread(target=self._run, daemon=True, name="SnapshotCompiler")
+        self._thread.start()
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        self._dirty.set()
+
+    @staticmethod
+    def _track_changes(session, flush_context):
+        from models import Schedule, ScheduleList, Zone, Site, DateException, HolidayCalendar
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, (Schedule, ScheduleList, Zone, Site, DateException, HolidayCalendar)):
+                session.info['snapshot_changed'] = True
+                return
+
+    def _on_commit(self, session):
+        if session.info.pop('snapshot_changed', False):
+            self.mark_dirty()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.delay)  # Let a burst of edits (e.g. a CSV import) settle
+            self._dirty.clear()
+            try:
+                self.compile()
+            except Exception as e:
+                logger.error("Could not compile schedule snapshot: %s", e)
+
+    def compile(self):
+        with self.app.app_context():
+            data = build()
+        write(self.path, data)
+        self.compiled_at = datetime.now()
+        logger.info("Compiled schedule snapshot: %s bytes", len(data))
+
+
+# --- Fast path -----------------------------------------------------------------
+
+def play_entry(entry, upload_folder, play_file):
+    """Play a single-file entry without the database: its file, or its blob if the file is gone"""
+    upload_folder = pathlib.Path(upload_folder)
+    path = upload_folder / entry.filename if entry.filename else None
+    if path is None or not path.exists():
+        path = upload_folder / '.blobs' / entry.audio_hash[:2] / entry.audio_hash if entry.audio_hash else None
+    if path is None or not path.exists():
+        logger.error("Audio file not found: %s", entry.filename)
+        return False
+    play_file(os.path.abspath(path), entry.volume)
+    return True
+
+
+class FastPathScheduler:
+    """
+    Fires single-file, unzoned bells from the snapshot until the full scheduler
+    takes over. Runs only while it holds the scheduler leader lock.
+    """
+
+    def __init__(self, snapshot_file, lock_fd, upload_folder, start_minute):
+        self.snapshot_file = snapshot_file
+        self.lock_fd = lock_fd
+        self.upload_folder = upload_folder
+        self.next_minute = start_minute
+        self.fired = []  # (schedule id, scheduled minute, fired at)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="SchedulerFastPath")
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        os.environ['SDL_AUDIODRIVER'] = 'pulseaudio'  # Same device as init_audio() in app.py
+        try:
+            import pygame
+            import playback
+            pygame.mixer.init()
+        except Exception as e:
+            logger.warning("Fast path: audio not available (%s) - bells wait for the full scheduler", e)
+            return
+        while not self._stop.wait(0.5):
+            now = datetime.now()
+            while self.next_minute <= now and not self._stop.is_set():
+                self._fire_minute(self.next_minute, playback.play_file)
+                self.next_minute += timedelta(minutes=1)
+
+    def _fire_minute(self, minute, play_file):
+        snapshot = self.snapshot_file.current()
+        if snapshot is None:
+            return
+        for entry in snapshot.due(minute):
+            if entry.schedule_type != 'single_file' or entry.zoned:
+                continue
+            if (datetime.now() - minute).total_seconds() >= 60:
+                continue  # Late bells are the full scheduler's call (catch-up window, journal)
+            try:
+                if play_entry(entry, self.upload_folder, play_file):
+                    self.fired.append((entry.id, minute, datetime.now()))
+                    logger.info("Fast path fired schedule %s (%s) at %s", entry.id, entry.filename, minute.strftime('%H:%M'))
+            except Exception as e:
+                logger.error("Fast path could not play schedule %s: %s", entry.id, e)
+
+    def stop(self):
+        """Stop firing; returns (bells fired, leader lock fd) for the full scheduler"""
+        self._stop.set()
+        self._thread.join(timeout=5)
+        lock_fd, self.lock_fd = self.lock_fd, None
+        return list(self.fired), lock_fd
+
+
+def start_fast_path(lock_path=None, upload_folder=None, snapshot_path=SNAPSHOT_PATH):
+    """
+    Start firing from the snapshot if this process may run the scheduler and can take
+    the leader lock right away. Returns the FastPathScheduler, or None.
+    """
+    import multiprocessing
+    if os.environ.get('AUDIO_SCHEDULER_ROLE', 'standalone') == 'web' or os.environ.get('WERKZEUG_RUN_MAIN'):
+        return None
+    if multiprocessing.parent_process() is not None:
+        return None  # Zone worker re-importing its parent's entry script
+    if os.environ.get('AUDIO_SCHEDULER_FAST_PATH', '1') == '0':
+        return None
+    started = time.perf_counter()
+    snapshot_file = SnapshotFile(snapshot_path)
+    snapshot = snapshot_file.current()
+    if snapshot is None:
+        return None
+
+    from leader import try_lock, DEFAULT_LOCK_PATH
+    lock_fd = try_lock(lock_path or DEFAULT_LOCK_PATH)
+    if lock_fd is None:
+        return None  # Another process is the leader
+
+    # A leader that was alive this minute may already have fired it
+    now = datetime.now()
+    start_minute = now.replace(second=0, microsecond=0)
+    try:
+        heartbeat = json.loads(os.pread(lock_fd, 4096, 0) or b'null')
+    except (OSError, ValueError):
+        heartbeat = None
+    if heartbeat and heartbeat.get('heartbeat', 0) >= start_minute.timestamp():
+        start_minute += timedelta(minutes=1)
+
+    fast_path = FastPathScheduler(snapshot_file, lock_fd, upload_folder or APP_ROOT.joinpath('uploads'), start_minute)
+    fast_path.start()
+    logger.info("Fast path firing from schedule snapshot (%s entries, compiled %s), ready in %.1f ms",
+                len(snapshot), snapshot.generated_at.strftime('%Y-%m-%d %H:%M'), (time.perf_counter() - started) * 1000)
+    return fast_path
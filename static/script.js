@@ -1,5 +1,6 @@
-// Store uploaded files - declared in base.html template
-// let uploadedFiles = []; // Removed - declared in template
+// Uploaded files currently shown in the file picker (one page of /uploads)
+let uploadedFiles = [];
+const UPLOADS_PAGE_SIZE = 100;
 let activeListId = null;
 let currentSchedules = [];
 
@@ -211,8 +212,11 @@ async function uploadFile() {
         
         if (data.success) {
             showMessageModal(appTranslations && appTranslations.modals && appTranslations.modals.info && appTranslations.modals.info.title ? appTranslations.modals.info.title : 'Info', 'File uploaded successfully!');
-            // Reload the page to refresh the file list after a short delay so the user can see the modal
-            setTimeout(() => window.location.reload(), 800);
+            // Refresh the picker and select the new file
+            fileInput.value = '';
+            const search = document.getElementById('fileSearch');
+            if (search) search.value = '';
+            await loadUploadedFiles('', data.filename);
         } else {
             showMessageModal('Error', 'Error uploading file: ' + data.error);
         }
@@ -221,13 +225,33 @@ async function uploadFile() {
     }
 }
 
+// Fetch one page of uploaded files matching the search text into the picker
+async function loadUploadedFiles(query = '', selectFilename = null) {
+    const select = document.getElementById('fileSelect');
+    if (!select) return;
+    try {
+        const params = new URLSearchParams({ q: query, per_page: UPLOADS_PAGE_SIZE });
+        const response = await fetch(`/uploads?${params}`);
+        const data = await response.json();
+        uploadedFiles = data.files;
+        updateFileSelect(data.total, selectFilename);
+    } catch (error) {
+        console.error('Error loading uploaded files:', error);
+    }
+}
+
 // Update file select dropdown
-function updateFileSelect() {
+function updateFileSelect(total = uploadedFiles.length, selectFilename = null) {
     const select = document.getElementById('fileSelect');
     if (!select) return;
+    const previous = selectFilename || select.value;
     
     // Keep the default option
-    select.innerHTML = '<option value="">Select File</option>';
+    select.innerHTML = '';
+    const placeholder = document.createElement('option');
+    placeholder.value = '';
+    placeholder.textContent = select.dataset.placeholder || 'Select File';
+    select.appendChild(placeholder);
     
     uploadedFiles.forEach(filename => {
         const option = document.createElement('option');
@@ -235,6 +259,25 @@ function updateFileSelect() {
         option.textContent = filename;
         select.appendChild(option);
     });
+    if (total > uploadedFiles.length) {
+        const more = document.createElement('option');
+        more.disabled = true;
+        more.textContent = `… +${total - uploadedFiles.length}`;
+        select.appendChild(more);
+    }
+    if (previous && uploadedFiles.includes(previous)) {
+        select.value = previous;
+    }
+}
+
+function initFileSearch() {
+    const search = document.getElementById('fileSearch');
+    if (!search) return;
+    let timer = null;
+    search.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => loadUploadedFiles(search.value.trim()), 250);
+    });
 }
 
 // Show custom modal for success/error when adding a schedule instead of alert.
@@ -655,12 +698,15 @@ async function changeLanguage(lang) {
 document.addEventListener('DOMContentLoaded', () => {
     console.log('DOM Content Loaded - Starting initialization');
     console.log('appTranslations:', appTranslations);
-    console.log('uploadedFiles:', uploadedFiles);
     
     try {
         // Initialize tab states - ensure only one main tab is active
         initializeTabStates();
         
+        // Populate the file picker from the uploads catalogue
+        initFileSearch();
+        loadUploadedFiles();
+        
         // Initialize modal buttons
         const confirmDeleteBtn = document.getElementById('confirmDeleteBtn');
         const cancelDeleteBtn = document.getElementById('cancelDeleteBtn');
@@ -880,6 +926,7 @@ async function addPlaylistSchedule() {
     const maxTracks = document.getElementById('maxTracks').value;
     const trackInterval = document.getElementById('trackInterval').value;
     const shuffleMode = document.getElementById('shuffleMode').checked;
+    const renderAhead = document.getElementById('renderAhead').checked;
     
     if (!folderPath || !time) {
         const errorMsg = appTranslations.playlist?.select_folder_time_error || 'Please select a folder and time';
@@ -908,7 +955,8 @@ async function addPlaylistSchedule() {
                 playlist_duration: duration ? parseInt(duration) : null,
                 max_tracks: maxTracks ? parseInt(maxTracks) : null,
                 track_interval: parseInt(trackInterval),
-                shuffle_mode: shuffleMode
+                shuffle_mode: shuffleMode,
+                render_ahead: renderAhead
             })
         });
         
@@ -923,6 +971,7 @@ async function addPlaylistSchedule() {
             document.getElementById('maxTracks').value = '';
             document.getElementById('trackInterval').value = '10';
             document.getElementById('shuffleMode').checked = true;
+            document.getElementById('renderAhead').checked = false;
             document.getElementById('folderPreview').classList.remove('show');
             
             // Clear day selections
@@ -970,6 +1019,7 @@ async function loadPlaylistSchedules() {
                 <div class="config-item"><strong>${appTranslations.playlist?.config_tracks || 'Max tracks'}:</strong> ${tracksText}</div>
                 <div class="config-item"><strong>${appTranslations.playlist?.config_interval || 'Interval'}:</strong> ${intervalText}</div>
                 <div class="config-item"><strong>${appTranslations.playlist?.config_shuffle || 'Shuffle'}:</strong> ${shuffleText}</div>
+                ${schedule.render_ahead ? `<div class="config-item"><strong>${appTranslations.playlist?.render_ahead || 'Pre-render overnight'}</strong></div>` : ''}
             `;
             
             const nextRun = schedule.next_run 
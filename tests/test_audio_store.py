@@ -0,0 +1,89 @@
+import io
+import os
+
+import pytest
+from flask import Flask
+
+from audio_store import AudioStore
+from models import db, AudioFile
+
+
+@pytest.fixture
+def store(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    (tmp_path / 'playlists').mkdir()
+    store = AudioStore(uploads, tmp_path / 'playlists')
+    with app.app_context():
+        db.create_all()
+        yield store
+
+
+def no_reflinks(store):
+    """Make the store behave as on ext4 or FAT, whatever filesystem the test runs on"""
+    store._reflinks[os.stat(store._tmp_dir()).st_dev] = False
+
+
+def disk_usage(folder):
+    inodes = {}
+    for path in folder.rglob('*'):
+        if path.is_file():
+            stat = path.stat()
+            inodes[(stat.st_dev, stat.st_ino)] = stat.st_blocks * 512
+    return sum(inodes.values())
+
+
+def test_sync_without_reflinks_keeps_one_copy(store):
+    no_reflinks(store)
+    folder = store.roots['uploads']
+    (folder / 'bell.mp3').write_bytes(os.urandom(256 * 1024))
+    (folder / 'music.mp3').write_bytes(os.urandom(512 * 1024))
+    before = disk_usage(folder)
+
+    assert store.sync()['hashed'] == 2
+    assert disk_usage(folder) == before
+    assert store.stats()['blobs'] == 0
+
+
+def test_upload_without_reflinks_keeps_one_copy(store):
+    no_reflinks(store)
+    content = os.urandom(256 * 1024)
+
+    filename, blob_hash, deduplicated = store.store_upload(io.BytesIO(content), 'bell.mp3')
+
+    assert (filename, deduplicated) == ('bell.mp3', False)
+    assert disk_usage(store.roots['uploads']) == (store.roots['uploads'] / 'bell.mp3').stat().st_blocks * 512
+    assert store.content_path(blob_hash) == store.roots['uploads'] / 'bell.mp3'
+
+
+def test_content_path_ignores_a_changed_name(store):
+    no_reflinks(store)
+    path = store.roots['uploads'] / 'bell.mp3'
+    path.write_bytes(b'first')
+    store.sync()
+    blob_hash = AudioFile.query.filter_by(name='bell.mp3').one().blob_hash
+
+    path.write_bytes(b'second version')
+
+    assert store.content_path(blob_hash) is None
+    assert store.resolve('gone.mp3', blob_hash) is None
+
+
+def test_legacy_hard_links_are_split_without_growing(store):
+    no_reflinks(store)
+    folder = store.roots['uploads']
+    (folder / 'bell.mp3').write_bytes(os.urandom(128 * 1024))
+    store.sync()
+    blob_hash = AudioFile.query.filter_by(name='bell.mp3').one().blob_hash
+    blob = store.blob_path(blob_hash)
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    os.link(folder / 'bell.mp3', blob)  # As linked by earlier versions
+    before = disk_usage(folder)
+
+    assert store.sync()['split'] == 1
+    assert not blob.exists()
+    assert (folder / 'bell.mp3').stat().st_nlink == 1
+    assert disk_usage(folder) == before
@@ -0,0 +1,34 @@
+import pytest
+
+from zones import DISK_FOLDER, check_output
+
+
+@pytest.mark.parametrize('driver, sink, expected', [
+    ('pulseaudio', 'alsa_output.pci-0000_00_1b.0.analog-stereo', 'alsa_output.pci-0000_00_1b.0.analog-stereo'),
+    ('pulseaudio', None, None),
+    ('alsa', 'hw:1,0', 'hw:1,0'),
+    ('dummy', 'anything', None),
+    ('disk', 'zone-a.raw', str(DISK_FOLDER.resolve() / 'zone-a.raw')),
+    ('disk', 'out/zone-b.raw', str(DISK_FOLDER.resolve() / 'out' / 'zone-b.raw')),
+])
+def test_accepted_outputs(driver, sink, expected):
+    assert check_output(driver, sink) == (driver, expected)
+
+
+@pytest.mark.parametrize('driver, sink', [
+    ('directsound', None),
+    ('', None),
+    (None, None),
+    ('pulseaudio', 'sink; rm -rf /'),
+    ('pulseaudio', 'a' * 256),
+    ('alsa', '../etc'),
+    ('pulseaudio', ['list']),
+    ('disk', '/etc/passwd'),
+    ('disk', '../app.py'),
+    ('disk', '../instance/../zones.raw'),
+    ('disk', 'schedules.db'),
+    ('disk', '/tmp/zone.raw'),
+])
+def test_rejected_outputs(driver, sink):
+    with pytest.raises(ValueError):
+        check_output(driver, sink)
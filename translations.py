@@ -0,0 +1,127 @@
+"""
+Translation catalog with precompiled JavaScript bundles.
+
+static/translations.json is parsed once. Each page's JS subset is serialized once
+per language into a small script ("var appTranslations = {...};"). Bundles are
+served from memory under a content-fingerprinted URL, so browsers cache them
+forever and page renders only emit a <script src>. The file is re-read (and the
+bundles rebuilt) when its mtime changes, checked at most every RELOAD_CHECK_SECONDS.
+Nothing is read until the catalog is first used.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from assets import compress_variants
+
+logger = logging.getLogger('audio_scheduler')
+
+DEFAULT_LANGUAGE = 'en'
+RELOAD_CHECK_SECONDS = 2.0
+
+
+def _index_subset(translations):
+    return {
+        'navigation': translations['navigation'],
+        'days_list': translations['schedule']['days_list'],
+        'current_schedules': translations['current_schedules'],
+        'schedule_lists': translations.get('schedule_lists', {}),
+        'playlist': translations.get('playlist', {}),
+        'modals': translations['modals']
+    }
+
+
+# Page -> the part of the translations its JavaScript needs
+PAGE_SUBSETS = {
+    'index': _index_subset,
+    'settings': lambda translations: {'settings': translations.get('settings', {})},
+    'login': lambda translations: {'login': translations.get('login', {})},
+}
+
+
+class Bundle:
+    __slots__ = ('body', 'fingerprint', 'etag', 'variants')
+
+    def __init__(self, body):
+        self.body = body.encode('utf-8')
+        self.fingerprint = hashlib.sha256(self.body).hexdigest()[:12]
+        self.etag = f'"{self.fingerprint}"'
+        self.variants = compress_variants(self.body)
+
+
+class TranslationCatalog:
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0
+        self.translations = {}
+        self._bundles = {}  # (lang, page) -> Bundle
+
+    def _ensure_loaded(self):
+        """Load on first use, so importing the app doesn't parse and compile every language"""
+        if self._mtime is None:
+            with self._load_lock:
+                if self._mtime is None:
+                    self.reload()
+
+    def reload(self):
+        """(Re)load the JSON file and rebuild every bundle"""
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, 'r', encoding='utf-8') as f:
+            translations = json.load(f)
+        bundles = {}
+        for lang, strings in translations.items():
+            for page, subset in PAGE_SUBSETS.items():
+                try:
+                    data = subset(strings)
+                except KeyError:
+                    data = subset(translations[DEFAULT_LANGUAGE])
+                bundles[(lang, page)] = Bundle(
+                    f"var appTranslations = {json.dumps(data, ensure_ascii=False, separators=(',', ':'))};\n")
+        with self._lock:
+            self.translations = translations
+            self._bundles = bundles
+            self._mtime = mtime
+        logger.info("Compiled %s translation bundles for %s", len(bundles), ', '.join(translations))
+
+    def refresh(self, force=False):
+        """Reload if the file changed; cheap enough to call on every request"""
+        self._ensure_loaded()
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + RELOAD_CHECK_SECONDS
+        try:
+            if os.stat(self.path).st_mtime_ns != self._mtime:
+                self.reload()
+        except (OSError, ValueError) as e:
+            # Keep serving the last good catalog
+            logger.error("Could not reload translations: %s", e)
+
+    def has_language(self, lang):
+        self._ensure_loaded()
+        return lang in self.translations
+
+    def get(self, lang):
+        """Translations for a language, falling back to English"""
+        self.refresh()
+        return self.translations.get(lang) or self.translations[DEFAULT_LANGUAGE]
+
+    def bundle(self, lang, page):
+        self._ensure_loaded()
+        bundles = self._bundles
+        return bundles.get((lang, page)) or bundles.get((DEFAULT_LANGUAGE, page))
+
+    def bundle_path(self, lang, page):
+        """Fingerprinted path of a page bundle, e.g. i18n/hu/index.3f2a9c1b7d4e.js"""
+        bundle = self.bundle(lang, page)
+        if bundle is None:
+            return None
+        if lang not in self.translations:
+            lang = DEFAULT_LANGUAGE
+        return f"i18n/{lang}/{page}.{bundle.fingerprint}.js"
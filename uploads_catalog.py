@@ -0,0 +1,115 @@
+"""
+In-memory catalogue of the uploads folder.
+
+The dashboard used to list uploads/ (one listdir plus one stat per file) on every
+render and embed the whole list in the page. The catalogue keeps a sorted list of
+file names instead. /upload adds to it directly, and a watcher thread re-scans the
+folder only when the folder's own mtime changes (one stat per poll), so files
+copied in over SSH or Samba still appear. The file picker pages through it with
+the /uploads JSON endpoint.
+"""
+import bisect
+import logging
+import os
+import threading
+
+logger = logging.getLogger('audio_scheduler')
+
+MAX_PER_PAGE = 200
+
+
+class UploadsCatalog:
+    def __init__(self, folder, poll_interval=5.0):
+        self.folder = folder
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._names = []  # Sorted case-insensitively
+        self._keys = []  # Lowercased names, parallel to _names
+        self._mtime = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Initial scan plus the background watcher; called lazily on first use"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._watch, daemon=True, name="UploadsWatcher")
+        self._rescan_if_changed()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._rescan_if_changed()
+            except Exception as e:
+                logger.error("Uploads watcher error: %s", e, exc_info=True)
+
+    def _rescan_if_changed(self):
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        names = []
+        if mtime is not None:
+            with os.scandir(self.folder) as entries:
+                # DirEntry.is_file() uses the d_type from the directory listing - no stat per file
+                names = [entry.name for entry in entries if entry.is_file() and not entry.name.startswith('.')]
+        names.sort(key=str.lower)
+        with self._lock:
+            self._names = names
+            self._keys = [name.lower() for name in names]
+            self._mtime = mtime
+        logger.info("Uploads catalogue rescanned: %s files", len(names))
+
+    def add(self, name):
+        """Record a file saved by /upload without waiting for the watcher"""
+        self.start()
+        key = name.lower()
+        with self._lock:
+            index = bisect.bisect_left(self._keys, key)
+            while index < len(self._names) and self._keys[index] == key:
+                if self._names[index] == name:
+                    return
+                index += 1
+            # Copy on write: query() iterates the current lists without holding the lock
+            self._names = self._names[:index] + [name] + self._names[index:]
+            self._keys = self._keys[:index] + [key] + self._keys[index:]
+
+    def __len__(self):
+        self.start()
+        return len(self._names)
+
+    def __contains__(self, name):
+        self.start()
+        key = name.lower()
+        with self._lock:
+            index = bisect.bisect_left(self._keys, key)
+            while index < len(self._names) and self._keys[index] == key:
+                if self._names[index] == name:
+                    return True
+                index += 1
+        return False
+
+    def query(self, q='', page=1, per_page=50):
+        """Case-insensitive substring search, paginated"""
+        self.start()
+        per_page = max(1, min(per_page, MAX_PER_PAGE))
+        page = max(1, page)
+        with self._lock:
+            names, keys = self._names, self._keys
+        if q:
+            q = q.lower()
+            names = [name for name, key in zip(names, keys) if q in key]
+        start = (page - 1) * per_page
+        return {
+            'files': names[start:start + per_page],
+            'total': len(names),
+            'page': page,
+            'per_page': per_page
+        }
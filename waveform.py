@@ -0,0 +1,103 @@
+"""
+Waveform peaks for drawing audio in the dashboard.
+
+Previewing a bell used to mean downloading it through /audio/<path>; a picture of
+it - and of where silence trimming cuts it - needs far less. When silence.py
+analyses a blob it also summarises its samples here: the decoded frames are cut
+into buckets of BASE_FRAMES and the lowest and highest sample of each bucket (over
+all channels) is kept, in one vectorised NumPy pass. Coarser zoom levels merge
+LEVEL_FACTOR peaks of the level below, down to fewer than MIN_PEAKS. Each
+peak is a pair of signed bytes (the top 8 bits of the 16-bit samples), so a
+7 second bell costs about 1.5 KB for all levels together and an hour of music stays
+under a megabyte.
+
+The peaks are stored with the rest of the blob's analysis (AudioAnalysis.peaks)
+in this little-endian layout, which /waveform/<path> serves as is or cut down to
+the one level that suits the width being drawn:
+
+    header   4s magic "PEAK", B version, B level count, H reserved, I sample rate, I frames
+    levels   I frames per peak, I peak count       (per level, finest first)
+    peaks    b min, b max                          (per peak, level after level)
+"""
+import struct
+
+try:
+    import numpy
+except ImportError:  # Optional; nothing is analysed without it
+    numpy = None
+
+MAGIC = b'PEAK'
+VERSION = 1
+BASE_FRAMES = 512  # Frames per peak of the finest level (~12 ms at 44.1 kHz)
+LEVEL_FACTOR = 4
+MIN_PEAKS = 512  # Stop adding coarser levels once one has fewer peaks than this
+
+_HEADER = struct.Struct('<4sBBHII')
+_LEVEL = struct.Struct('<II')
+
+
+def compute(samples, frequency):
+    """Encoded peaks of int16 samples shaped (frames, channels)"""
+    frames = len(samples)
+    if frames == 0:
+        return encode(frequency, frames, [])
+    buckets = -(-frames // BASE_FRAMES)
+    flat = samples.reshape(frames, -1)
+    # Pad the last bucket with its own final frame, so padding never widens a peak
+    padded = numpy.concatenate([flat, numpy.repeat(flat[-1:], buckets * BASE_FRAMES - frames, axis=0)])
+    blocks = padded.reshape(buckets, -1)
+    lows, highs = blocks.min(axis=1), blocks.max(axis=1)
+
+    levels = []
+    frames_per_peak = BASE_FRAMES
+    while True:
+        levels.append((frames_per_peak, lows, highs))
+        if len(lows) < MIN_PEAKS:
+            break
+        count = -(-len(lows) // LEVEL_FACTOR)
+        pad = count * LEVEL_FACTOR - len(lows)
+        lows = numpy.pad(lows, (0, pad), mode='edge').reshape(count, LEVEL_FACTOR).min(axis=1)
+        highs = numpy.pad(highs, (0, pad), mode='edge').reshape(count, LEVEL_FACTOR).max(axis=1)
+        frames_per_peak *= LEVEL_FACTOR
+    return encode(frequency, frames, levels)
+
+
+def encode(frequency, frames, levels):
+    """Bytes of (frames per peak, int16 lows, int16 highs) levels"""
+    parts = [_HEADER.pack(MAGIC, VERSION, len(levels), 0, frequency, frames)]
+    parts.extend(_LEVEL.pack(frames_per_peak, len(lows)) for frames_per_peak, lows, _ in levels)
+    for _, lows, highs in levels:
+        pairs = numpy.empty((len(lows), 2), dtype=numpy.int8)
+        pairs[:, 0] = lows.astype(numpy.int16) >> 8  # Floor, so quiet dips still show
+        pairs[:, 1] = numpy.minimum(-(-highs.astype(numpy.int32) >> 8), 127)  # Ceiling
+        parts.append(pairs.tobytes())
+    return b''.join(parts)
+
+
+def levels(data):
+    """(sample rate, frames, [(frames per peak, peak count, offset of its pairs)]) of encoded peaks"""
+    magic, version, count, _, frequency, frames = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not waveform peaks")
+    result = []
+    offset = _HEADER.size + count * _LEVEL.size
+    for n in range(count):
+        frames_per_peak, peaks = _LEVEL.unpack_from(data, _HEADER.size + n * _LEVEL.size)
+        result.append((frames_per_peak, peaks, offset))
+        offset += peaks * 2
+    return frequency, frames, result
+
+
+def for_width(data, width):
+    """The encoded peaks cut down to the coarsest level with at least width peaks (the finest if none has)"""
+    frequency, frames, all_levels = levels(data)
+    if not all_levels:
+        return data
+    chosen = all_levels[0]
+    for level in all_levels:
+        if level[1] >= width:
+            chosen = level
+    frames_per_peak, peaks, offset = chosen
+    return b''.join([_HEADER.pack(MAGIC, VERSION, 1, 0, frequency, frames),
+                     _LEVEL.pack(frames_per_peak, peaks),
+                     data[offset:offset + peaks * 2]])
@@ -12,7 +12,14 @@ APP_ROOT = Path(__file__).resolve().parent
 if str(APP_ROOT) not in sys.path:
     sys.path.insert(0, str(APP_ROOT))
 
-from app import app, logger, db, init_schedules
+# Fire bells from the compiled schedule snapshot while the app below is still loading
+from snapshot import start_fast_path
+fast_path = start_fast_path()
+
+from app import create_app, logger, db, init_schedules
+
+# Start logging, audio and the scheduler; importing app alone has no side effects
+app = create_app(fast_path=fast_path)
 
 # Initialize database and schedules when Gunicorn loads the application
 with app.app_context():
@@ -23,8 +30,7 @@ with app.app_context():
 init_schedules()
 logger.info("Schedules initialized from database (Gunicorn startup)")
 
-# For Gunicorn, we need to ensure the scheduler is initialized
-# The app module already handles this based on WERKZEUG_RUN_MAIN
+# create_app() decides whether this process runs the scheduler, based on WERKZEUG_RUN_MAIN
 # In production (Gunicorn), WERKZEUG_RUN_MAIN will be None, so scheduler initializes
 logger.info("WSGI application ready for Gunicorn")
 
@@ -0,0 +1,218 @@
+"""
+Multi-zone output routing.
+
+pygame has a single mixer per process, so every zone gets its own worker process
+with its own mixer opened on the zone's output (a PulseAudio sink, or SDL's
+dummy/disk driver for testing). Each engine has an independent command queue, so
+simultaneous bells in different zones play in parallel instead of fighting over
+one pygame.mixer.music stream. Schedules without zones keep using the in-process mixer.
+Sounds overlapping within one zone are arbitrated by the engine's own Arbiter
+(see arbitration.py), from the request the scheduler sends with each command.
+"""
+import logging
+import multiprocessing
+import os
+import pathlib
+import re
+import threading
+
+logger = logging.getLogger('audio_scheduler.audio')
+
+# 'spawn' gives each worker a fresh interpreter: SDL must not inherit the parent's audio state
+_mp_context = multiprocessing.get_context('spawn')
+
+DRIVERS = ('pulseaudio', 'alsa', 'dummy', 'disk')
+SINK_NAME = re.compile(r'[A-Za-z0-9_.:,@-]{1,255}')  # e.g. alsa_output.pci-0000_00_1b.0.analog-stereo, hw:1,0
+DISK_FOLDER = pathlib.Path(__file__).resolve().parent / 'instance'
+
+
+def check_output(driver, sink):
+    """
+    The (driver, sink) to store for a zone. Raises ValueError for an unknown driver,
+    a sink that isn't a plain device name, or - for the disk driver, which writes raw
+    samples to its sink - a file outside instance/ or without the .raw extension.
+    """
+    if driver not in DRIVERS:
+        raise ValueError(f"unknown audio driver: {driver!r} (use one of {', '.join(DRIVERS)})")
+    if sink is not None and not isinstance(sink, str):
+        raise ValueError("sink must be a string")
+    if not sink or driver == 'dummy':
+        return driver, None
+    if driver == 'disk':
+        folder = DISK_FOLDER.resolve()
+        path = (folder / sink).resolve()
+        if not path.is_relative_to(folder) or path.suffix != '.raw':
+            raise ValueError("the disk driver's sink must be a .raw file inside instance/")
+        return driver, str(path)
+    if not SINK_NAME.fullmatch(sink):
+        raise ValueError(f"invalid sink name: {sink!r}")
+    return driver, sink
+
+
+def _zone_worker(zone_name, driver, sink, commands):
+    """Worker process entry point: open the zone's output and execute commands until 'shutdown'"""
+    try:
+        driver, sink = check_output(driver, sink)  # Zones stored before outputs were validated
+    except ValueError as e:
+        logger.error("Zone %s: %s", zone_name, e)
+        return
+    os.environ['SDL_AUDIODRIVER'] = driver
+    if sink:
+        if driver == 'disk':
+            os.environ['SDL_DISKAUDIOFILE'] = sink
+        else:
+            os.environ['PULSE_SINK'] = sink
+
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - %(levelname)s - [zone {zone_name}] %(message)s')
+
+    import pygame
+    import metrics
+    import playback
+    from arbitration import Arbiter
+
+    try:
+        # The main module may have been re-imported here and opened the default device already
+        if pygame.mixer.get_init():
+            pygame.mixer.quit()
+        pygame.mixer.init()
+    except Exception as e:
+        logger.error("Zone %s: audio output not available (%s, sink=%s): %s", zone_name, driver, sink, e)
+        return
+    logger.info("Zone %s: audio output ready (%s, sink=%s)", zone_name, driver, sink)
+    arbiter = Arbiter(zone_name, playback.MixerOutput())
+    # Playback metrics of the zone, merged into /metrics by the process serving it
+    exporter = metrics.Exporter(metrics.registry, {'process': 'zone', 'zone': zone_name})
+    exporter.start()
+
+    def start(target, *args, **kwargs):
+        threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True, name=f"Playback-{zone_name}").start()
+
+    while True:
+        command, args = commands.get()
+        try:
+            if command == 'shutdown':
+                break
+            elif command == 'play':
+                file_path, volume, start_at, request = args
+                if request is None:
+                    playback.play_file(file_path, volume, start_at)
+                    continue
+                claim = arbiter.request(*request)
+                if claim.decision != 'skip':
+                    start(playback.play_claimed, arbiter, claim, file_path, volume, start_at)
+            elif command == 'playlist':
+                files, *options, request = args
+                claim = arbiter.request(*request) if request is not None else None
+                if claim is None or claim.decision != 'skip':
+                    start(playback.run_playlist, [pathlib.Path(f) for f in files], *options, arbiter=arbiter, claim=claim)
+            elif command == 'stop':
+                arbiter.stop_all()
+        except Exception as e:
+            logger.error("Zone %s: error executing %s: %s", zone_name, command, e)
+
+    exporter.stop()
+    pygame.mixer.quit()
+
+
+class ZoneEngine:
+    """Handle to one zone's worker process and its command queue"""
+
+    def __init__(self, zone_id, name, driver, sink):
+        self.zone_id = zone_id
+        self.name = name
+        self.driver = driver
+        self.sink = sink
+        self.commands = _mp_context.Queue()
+        self.process = _mp_context.Process(
+            target=_zone_worker,
+            args=(name, driver, sink, self.commands),
+            daemon=True,
+            name=f"Zone-{name}"
+        )
+        self.process.start()
+        logger.info("Started zone engine %s (pid %s)", name, self.process.pid)
+
+    @property
+    def config(self):
+        return (self.name, self.driver, self.sink)
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def send(self, command, *args):
+        self.commands.put((command, args))
+
+    def shutdown(self, timeout=5):
+        if self.process.is_alive():
+            self.send('shutdown')
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        logger.info("Stopped zone engine %s", self.name)
+
+
+class ZoneManager:
+    """Lazily starts one ZoneEngine per zone and restarts engines that died or were reconfigured"""
+
+    def __init__(self):
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _zone_driver(zone):
+        # AUDIO_SCHEDULER_ZONE_DRIVER forces every zone onto one driver, e.g. 'dummy' in tests
+        return os.environ.get('AUDIO_SCHEDULER_ZONE_DRIVER') or zone.driver or 'pulseaudio'
+
+    def engine_for(self, zone):
+        config = (zone.name, self._zone_driver(zone), zone.sink)
+        stale = None
+        with self._lock:
+            engine = self._engines.get(zone.id)
+            if engine is not None and (engine.config != config or not engine.is_alive()):
+                stale, engine = engine, None
+            if engine is None:
+                engine = ZoneEngine(zone.id, *config)
+                self._engines[zone.id] = engine
+        # Outside the lock: shutting down can take seconds, and other zones must not wait for it
+        if stale is not None:
+            stale.shutdown()
+        return engine
+
+    def play(self, zone, file_path, volume=1.0, start=0.0, request=None):
+        """request: arbitration.request_for(schedule); without one the file just takes the output"""
+        self.engine_for(zone).send('play', str(file_path), volume, start, request)
+
+    def play_playlist(self, zone, audio_files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume=1.0, trims=None,
+                      request=None):
+        files = [str(f) for f in audio_files]
+        self.engine_for(zone).send('playlist', files, duration_minutes, track_interval_seconds, max_tracks, shuffle_mode, volume, trims,
+                                   request)
+
+    def stop(self, zone):
+        with self._lock:
+            engine = self._engines.get(zone.id)
+        if engine is not None:
+            engine.send('stop')
+
+    def status(self, zone_id):
+        with self._lock:
+            engine = self._engines.get(zone_id)
+        if engine is None:
+            return 'idle'
+        return 'running' if engine.is_alive() else 'stopped'
+
+    def remove(self, zone_id):
+        with self._lock:
+            engine = self._engines.pop(zone_id, None)
+        if engine is not None:
+            engine.shutdown()
+
+    def shutdown_all(self):
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+        for engine in engines:
+            engine.shutdown()
+
+
+zone_manager = ZoneManager()